@@ -0,0 +1,45 @@
+"""
+An interactive query made while a burst of background queries is queued for 4 slots on the local
+mock server: with every call in one lane it waits behind the burst, in its own lane it goes next.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from lim import lim
+from lim import limadmit
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class InteractiveUnderLoad(object):
+    params = ['interactive', 'batch']  # lane of the burst
+    burst = 40
+
+    def setup(self, burst_lane):
+        self.server = MockLimServer(latency=0.02).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        limadmit.configure(self.server.url, max_in_flight=4)
+        self.pool = ThreadPoolExecutor(self.burst)
+
+    def teardown(self, burst_lane):
+        limsession.set_session(None)
+        limadmit.reset(self.server.url)
+        self.pool.shutdown()
+        self.server.stop()
+
+    def track_interactive_latency(self, burst_lane):
+        def background(i):
+            with limadmit.lane(burst_lane):
+                return lim.query('Show \r\nB{}: FB'.format(i))
+        calls = [self.pool.submit(background, i) for i in range(self.burst)]
+        time.sleep(0.01)
+        start = time.perf_counter()
+        lim.query('Show \r\nFP: FP')
+        latency = time.perf_counter() - start
+        for x in calls:
+            x.result()
+        return round(latency, 3)
+
+
+if __name__ == '__main__':
+    common.run(InteractiveUnderLoad)
@@ -0,0 +1,41 @@
+"""
+Hundreds of outstanding series calls against the local mock server: on one event loop through limasync,
+against the blocking client in a thread pool.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from lim import lim
+from lim import limasync
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class ConcurrentSeries(object):
+    calls = 200
+    threads = 32
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.02, pending_polls=1).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password', pool_maxsize=self.threads))
+        self.symbols = ['S{}'.format(i) for i in range(self.calls)]
+
+    def teardown(self):
+        limsession.set_session(None)
+        self.server.stop()
+
+    def time_event_loop(self):
+        async def run():
+            try:
+                await asyncio.gather(*[limasync.aseries(x) for x in self.symbols])
+            finally:
+                await limasync.close_sessions()
+        asyncio.run(run())
+
+    def time_thread_pool(self):
+        with ThreadPoolExecutor(self.threads) as pool:
+            list(pool.map(lim.series, self.symbols))
+
+
+if __name__ == '__main__':
+    common.run(ConcurrentSeries)
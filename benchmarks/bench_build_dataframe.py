@@ -0,0 +1,68 @@
+"""
+Response bytes to DataFrame on a synthetic 10k dates x 50 columns payload: the original list-of-lists
+build_dataframe against the numpy fast path and the streaming parser. Every variant starts from the
+raw bytes, as query does.
+"""
+import pandas as pd
+from lxml import etree
+from lim import lim
+from lim import limparser
+from benchmarks import common
+
+
+def alternate_col_val(values, noCols):
+    for x in range(0, len(values), noCols):
+        yield values[x:x + noCols]
+
+
+def build_dataframe_lists(reports):
+    # implementation prior to the numpy fast path
+    columns = [x.text for x in reports.iter(tag='ColumnHeadings')]
+    dates = [x.text for x in reports.iter(tag='RowDates')]
+    if len(columns) == 0 or len(dates) == 0:
+        return
+
+    values = [float(x.text) for x in reports.iter(tag='Values')]
+    values = list(alternate_col_val(values, len(columns)))
+
+    df = pd.DataFrame(values, columns=columns, index=pd.to_datetime(dates))
+    return df
+
+
+class BuildDataframe(object):
+    rows, cols = 10000, 50
+
+    def setup(self):
+        self.xml = common.datarequest_xml(self.rows, self.cols)
+
+    def lists(self):
+        return build_dataframe_lists(etree.fromstring(self.xml)[0])
+
+    def numpy(self):
+        return lim.build_dataframe(etree.fromstring(self.xml)[0])
+
+    def streaming(self):
+        xml, size = self.xml, limparser.chunk_size
+        return limparser.parse_datarequest(xml[i:i + size] for i in range(0, len(xml), size)).dataframe()
+
+    def time_lists(self):
+        self.lists()
+
+    def time_numpy(self):
+        self.numpy()
+
+    def time_streaming(self):
+        self.streaming()
+
+    def peakmem_lists(self):
+        self.lists()
+
+    def peakmem_numpy(self):
+        self.numpy()
+
+    def peakmem_streaming(self):
+        self.streaming()
+
+
+if __name__ == '__main__':
+    common.run(BuildDataframe)
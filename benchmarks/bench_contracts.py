@@ -0,0 +1,48 @@
+"""
+Contract list lookups against the local mock server: fetching and regex filtering the relations tree,
+as every new process used to, against a lookup in the persistent contract index.
+"""
+import re
+import tempfile
+from lim import lim
+from lim import limcache
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class ContractLookup(object):
+    roots = ['R{}'.format(i) for i in range(20)]
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.002, contracts=dict((x, (1990, 2030)) for x in self.roots)).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(self.tmp.name))
+        lim.prefetch_contracts(self.roots)
+
+    def teardown(self):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def time_fetch_and_filter(self):
+        for root in self.roots:
+            contracts = [x[0] for x in lim.fetch_symbol_contracts(root)]
+            contracts = [x for x in contracts if re.search(r'\d\d\d\d[A-Z]$', x)]
+            [x for x in contracts if 2020 <= int(x.split('_')[-1][:4]) <= 2022]
+
+    def time_index_lookup(self):
+        server = limsession.get_session().server
+        for root in self.roots:
+            lim.get_symbol_contract_list(root)
+            limcache.get_contract_index().contracts(server, root, start_year=2020, end_year=2022)
+
+    def time_prefetch_cold(self):
+        lim.invalidate_contracts()
+        lim.prefetch_contracts(self.roots)
+
+
+if __name__ == '__main__':
+    common.run(ContractLookup)
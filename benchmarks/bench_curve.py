@@ -0,0 +1,55 @@
+"""
+Daily refresh of a 250 date curve history against the local mock server: the full history query that
+curve sends, against curve_cached with every date but the newest already in the curve store. The mock
+server answers in constant time, so the time_ figures show the local assembly cost; track_ figures
+count the curve dates the server has to compute.
+"""
+import tempfile
+import pandas as pd
+from lim import lim
+from lim import limcache
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class CurveHistory(object):
+    dates = list(pd.bdate_range('2019-01-01', periods=250))
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.002).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = limcache.CurveStore(self.tmp.name)
+        lim.curve_cached('FB', curve_dates=self.dates[:-1], store=self.store)
+
+    def teardown(self):
+        limsession.set_session(None)
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def time_full_history(self):
+        lim.curve('FB', curve_dates=self.dates)
+
+    def time_cached_refresh(self):
+        lim.curve_cached('FB', curve_dates=self.dates, store=self.store)
+
+    def requested(self, queries):
+        return sum(x.count('forward_curve(') for x in self.server.queries[queries:])
+
+    def track_curve_dates_full_history(self):
+        queries = len(self.server.queries)
+        lim.curve('FB', curve_dates=self.dates)
+        return self.requested(queries)
+
+    def track_curve_dates_cached_refresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = limcache.CurveStore(root)
+            lim.curve_cached('FB', curve_dates=self.dates[:-1], store=store)
+            queries = len(self.server.queries)
+            lim.curve_cached('FB', curve_dates=self.dates, store=store)
+            return self.requested(queries)
+
+
+if __name__ == '__main__':
+    common.run(CurveHistory)
@@ -0,0 +1,38 @@
+"""
+Throughput of decoding large DataRequest replies: eight concurrent callers parsing inline in threads,
+against the same replies decoded by a process pool of 1..N workers into shared memory.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from lim import limdecode
+from lim import limparser
+from benchmarks import common
+
+
+class ProcessDecode(object):
+    params = [0] + sorted(set([1, 2, 4, os.cpu_count() or 1]))
+    callers = 8
+
+    def setup(self, processes):
+        self.body = common.datarequest_xml(rows=5000, cols=50)
+        self.pool = ThreadPoolExecutor(self.callers)
+        self.decoder = limdecode.ProcessDecoder(processes, threshold=0) if processes else None
+        if self.decoder is not None:
+            self.decoder.decode(self.body)  # start the workers
+
+    def teardown(self, processes):
+        self.pool.shutdown()
+        if self.decoder is not None:
+            self.decoder.close()
+
+    def parse(self, _):
+        if self.decoder is None:
+            return limparser.parse_datarequest([self.body]).dataframe()
+        return self.decoder.decode(self.body).dataframe()
+
+    def time_decode(self, processes):
+        list(self.pool.map(self.parse, range(self.callers)))
+
+
+if __name__ == '__main__':
+    common.run(ProcessDecode)
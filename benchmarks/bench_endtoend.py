@@ -0,0 +1,76 @@
+"""
+End to end latency of the public calls against the local mock server (lim.mockserver), including the
+http round trips, request id polling and parsing. track_ methods report latency percentiles in
+milliseconds and throughput in calls per second over `samples` sequential calls.
+"""
+import tempfile
+import time
+import numpy as np
+from lim import lim
+from lim import limcache
+from lim import limsession
+from lim import limuploader
+from lim.mockserver import MockLimServer
+from benchmarks import common
+from benchmarks.bench_upload_xml import upload_frame
+
+
+class EndToEnd(object):
+    params = ['query', 'series', 'curve', 'query_cached', 'upload_series']
+    samples = 20
+    latency = 0.002
+    pending_polls = 1
+
+    def setup(self, call):
+        self.server = MockLimServer(latency=self.latency, pending_polls=self.pending_polls, upload_polls=self.pending_polls,
+                                    start='2000-01-01', end='2020-12-31').start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = limcache.SQLiteCache(self.tmp.name)
+        self.frame = upload_frame(500, 10)
+        self.call = getattr(self, 'call_' + call)
+
+        self.times = []
+        for i in range(self.samples):
+            start = time.perf_counter()
+            self.call()
+            self.times.append(time.perf_counter() - start)
+
+    def teardown(self, call):
+        limsession.set_session(None)
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def call_query(self):
+        lim.query('Show \r\nFB: FB FP: FP when date is after 2010')
+
+    def call_series(self):
+        lim.series(['FB_2020{}'.format(x) for x in 'FGHJKMNQUVXZ'], batch_size=4)
+
+    def call_curve(self):
+        lim.curve({'FB': 'Brent', 'FP': 'GO'})
+
+    def call_query_cached(self):
+        lim.query_cached('Show \r\nFB: FB FP: FP', backend=self.backend)
+
+    def call_upload_series(self):
+        limuploader.upload_series(self.frame, {'description': 'benchmark'}, max_cells=2000)
+
+    def time_call(self, call):
+        self.call()
+
+    def track_p50_ms(self, call):
+        return round(np.percentile(self.times, 50) * 1000, 1)
+
+    def track_p95_ms(self, call):
+        return round(np.percentile(self.times, 95) * 1000, 1)
+
+    def track_p99_ms(self, call):
+        return round(np.percentile(self.times, 99) * 1000, 1)
+
+    def track_calls_per_second(self, call):
+        return round(len(self.times) / sum(self.times), 1)
+
+
+if __name__ == '__main__':
+    common.run(EndToEnd)
@@ -0,0 +1,44 @@
+"""
+Import cost of the lim modules in a fresh interpreter, from python -X importtime. Importing must stay
+cheap: pandas, numpy, lxml and requests are deferred to first use (lim.limlazy).
+"""
+import os
+import re
+import subprocess
+import sys
+from benchmarks import common
+
+
+def import_times(module):
+    """
+    Cumulative import time of every module loaded by `import module`, in microseconds
+    :return: dict of module name to microseconds
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.getcwd(), os.environ.get('PYTHONPATH', '')]))
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                         env=env, stderr=subprocess.PIPE, check=True).stderr.decode()
+    times = {}
+    for line in out.splitlines():
+        m = re.match(r'import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)', line)
+        if m:
+            times[m.group(2)] = int(m.group(1))
+    return times
+
+
+class ImportTime(object):
+    params = ['lim.lim', 'lim.limuploader']
+
+    def time_import(self, module):
+        import_times(module)
+
+    def track_import_ms(self, module):
+        times = import_times(module)
+        return round((times.get('lim', 0) + times[module]) / 1000.0, 1)
+
+    def track_heavy_modules_loaded(self, module):
+        times = import_times(module)
+        return len([x for x in ('pandas', 'numpy', 'lxml.etree', 'requests') if x in times])
+
+
+if __name__ == '__main__':
+    common.run(ImportTime)
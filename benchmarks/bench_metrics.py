@@ -0,0 +1,42 @@
+"""
+Cost of instrumentation: 100k spans and counter increments with no collector (the default), against
+the same loop uninstrumented and with a MemoryCollector recording.
+"""
+from lim import limmetrics
+from benchmarks import common
+
+
+class Instrumentation(object):
+    params = ['bare', 'disabled', 'memory']
+    calls = 100000
+
+    def setup(self, mode):
+        limmetrics.disable()
+        if mode == 'memory':
+            limmetrics.enable()
+
+    def teardown(self, mode):
+        limmetrics.disable()
+
+    def time_span(self, mode):
+        if mode == 'bare':
+            for i in range(self.calls):
+                pass
+        else:
+            span = limmetrics.span
+            for i in range(self.calls):
+                with span('query'):
+                    pass
+
+    def time_count(self, mode):
+        if mode == 'bare':
+            for i in range(self.calls):
+                pass
+        else:
+            count = limmetrics.count
+            for i in range(self.calls):
+                count('query.polls')
+
+
+if __name__ == '__main__':
+    common.run(Instrumentation)
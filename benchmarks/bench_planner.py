@@ -0,0 +1,56 @@
+"""
+Many concurrent small series and continuous futures calls against the local mock server, each sending
+its own DataRequest, against the same calls coalesced by limplanner into a few merged requests.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from lim import lim
+from lim import limplanner
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class Coalescing(object):
+    callers = 16
+    roots = ['FB', 'FP', 'CL', 'NG']
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.02, pending_polls=1).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.pool = ThreadPoolExecutor(self.callers)
+
+    def teardown(self):
+        limplanner.disable()
+        limsession.set_session(None)
+        self.pool.shutdown()
+        self.server.stop()
+
+    def calls(self):
+        # overlapping symbol lists, as from several dashboards refreshing at once
+        for i in range(self.callers):
+            root = self.roots[i % len(self.roots)]
+            if i % 2:
+                yield lambda root=root: lim.continuous_futures_rollover(root, months=['M1', 'M2'], after_date=2019)
+            else:
+                yield lambda root=root, i=i: lim.series([root, self.roots[(i + 1) % len(self.roots)]])
+
+    def run_calls(self):
+        for x in [self.pool.submit(x) for x in self.calls()]:
+            x.result()
+
+    def time_separate(self):
+        limplanner.disable()
+        self.run_calls()
+
+    def time_coalesced(self):
+        limplanner.enable(window=0.01)
+        self.run_calls()
+
+    def track_datarequests_coalesced(self):
+        coalescer = limplanner.enable(window=0.01)
+        self.run_calls()
+        return coalescer.stats()['datarequests']
+
+
+if __name__ == '__main__':
+    common.run(Coalescing)
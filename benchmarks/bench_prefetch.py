@@ -0,0 +1,46 @@
+"""
+First foreground calls of a session on a watchlist against the local mock server: cold, against after a
+Prefetcher has refreshed the watchlist in the background.
+"""
+import tempfile
+from lim import lim
+from lim import limcache
+from lim import limprefetch
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class PrefetchWatchlist(object):
+    params = ['cold', 'warm']
+    symbols = ['FB', 'FP', 'CL', 'HO', 'NG', 'RB']
+
+    def setup(self, state):
+        self.server = MockLimServer(latency=0.05).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(self.tmp.name))
+        self.prefetcher = limprefetch.Prefetcher(backend=limcache.SQLiteCache(self.tmp.name))
+        self.prefetcher.add_series(self.symbols)
+        self.prefetcher.add_curve(self.symbols[:2])
+        self.prefetcher.add_contracts('FB', 2019, 2020)
+        if state == 'warm':
+            self.prefetcher.refresh_all()
+
+    def teardown(self, state):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        limcache.disable_result_cache()
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def time_foreground(self, state):
+        if state == 'cold':
+            limcache.disable_result_cache()
+        lim.series(self.symbols)
+        lim.curve(self.symbols[:2])
+        lim.futures_contracts('FB', 2019, 2020)
+
+
+if __name__ == '__main__':
+    common.run(PrefetchWatchlist)
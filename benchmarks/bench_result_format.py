@@ -0,0 +1,51 @@
+"""
+Memory of a futures strip result (30 years of monthly contracts, each trading for three years) in the
+formats series can return, and the cost of converting back to the wide frame.
+"""
+import numpy as np
+import pandas as pd
+from lim import limframe
+from benchmarks import common
+
+
+def futures_strip(years=30, life=750, seed=1):
+    rng = np.random.RandomState(seed)
+    index = pd.bdate_range('1990-01-01', periods=years * 260)
+    contracts = years * 12
+    values = np.full((len(index), contracts), np.nan)
+    for i in range(contracts):
+        start = min(i * 260 // 12, len(index) - 1)
+        values[start:start + life, i] = np.round(rng.uniform(10, 100, size=len(values[start:start + life, i])), 2)
+    return pd.DataFrame(values, index=index, columns=['FB_{}{}'.format(1990 + i // 12, 'FGHJKMNQUVXZ'[i % 12]) for i in range(contracts)])
+
+
+def nbytes(res):
+    if isinstance(res, limframe.CompactFrame):
+        return res.memory_usage()
+    return int(res.memory_usage(index=True, deep=True).sum())
+
+
+class ResultFormat(object):
+    params = ['wide', 'wide-float32', 'compact', 'compact-float32', 'long', 'sparse']
+
+    def setup(self, kind):
+        self.df = futures_strip()
+        fmt, _, dtype = kind.partition('-')
+        self.res = limframe.convert(self.df, fmt, np.float32 if dtype else None)
+
+    def track_megabytes(self, kind):
+        return round(nbytes(self.res) / 1e6, 2)
+
+    def time_convert(self, kind):
+        fmt, _, dtype = kind.partition('-')
+        limframe.convert(self.df, fmt, np.float32 if dtype else None)
+
+    def time_to_wide(self, kind):
+        if isinstance(self.res, limframe.CompactFrame):
+            self.res.to_wide()
+        elif kind == 'sparse':
+            self.res.sparse.to_dense()
+
+
+if __name__ == '__main__':
+    common.run(ResultFormat)
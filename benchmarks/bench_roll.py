@@ -0,0 +1,41 @@
+"""
+A sweep over roll rules and nearby months: one continuous_futures_rollover query per rule against the
+local mock server, against the local roll engine over contract prices fetched once.
+"""
+import tempfile
+from datetime import date
+from lim import lim
+from lim import limcache
+from lim import limroll
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class RollSweep(object):
+    rules = ['{} days before expiration day'.format(x) for x in range(1, 11)]
+    months = ['M{}'.format(x) for x in range(1, 7)]
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.02, end='2024-12-31', contracts={'FB': (2015, 2030)}).start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+        self.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(self.tmp.name))
+        self.prices, self.expiries = limroll.contract_data('FB', 2019, date.today().year + 3)
+
+    def teardown(self):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def time_server_queries(self):
+        for rule in self.rules:
+            lim.continuous_futures_rollover('FB', self.months, rule, after_date=2019)
+
+    def time_local_engine(self):
+        limroll.roll_sweep(self.prices, self.expiries, self.rules, self.months)
+
+
+if __name__ == '__main__':
+    common.run(RollSweep)
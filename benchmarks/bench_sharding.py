@@ -0,0 +1,34 @@
+"""
+A thirty year backfill against the local mock server: one DataRequest for the whole history, against
+date windows fetched concurrently.
+"""
+from lim import lim
+from lim import limsession
+from lim.mockserver import MockLimServer
+from benchmarks import common
+
+
+class LongHistory(object):
+    symbols = ['FB_{}'.format(i) for i in range(20)]
+    start = '1990-01-01'
+
+    def setup(self):
+        self.server = MockLimServer(latency=0.02, row_latency=0.0001, start=self.start, end='2020-12-31').start()
+        limsession.set_session(limsession.LimSession(self.server.url, 'user', 'password'))
+
+    def teardown(self):
+        limsession.set_session(None)
+        self.server.stop()
+
+    def time_single_request(self):
+        lim.series(self.symbols, start=self.start)
+
+    def time_windows_1y(self):
+        lim.series(self.symbols, start=self.start, shard_years=1)
+
+    def time_windows_5y(self):
+        lim.series(self.symbols, start=self.start, shard_years=5)
+
+
+if __name__ == '__main__':
+    common.run(LongHistory)
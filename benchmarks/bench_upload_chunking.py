@@ -0,0 +1,65 @@
+"""
+upload_series chunking: the row-count heuristic it used to apply against the cell/byte budget, on dense,
+sparse, tall and wide frames. track_ methods report the number of upload requests, time_ methods the
+time to build every chunk's XML.
+"""
+from lim import limuploader
+from benchmarks import common
+from benchmarks.bench_upload_xml import upload_frame
+
+
+shapes = {
+    'dense': (2000, 20, 0.0),
+    'sparse': (2000, 20, 0.9),
+    'tall': (100000, 1, 0.0),
+    'wide': (10, 200, 0.0),
+}
+
+
+def heuristic_bounds(df):
+    # chunk sizes upload_series picked before the cell budget
+    if len(df.columns) == 1:
+        chunksize = int(len(df) / 1000)
+        if chunksize < 100:
+            chunksize = 100
+    else:
+        total_count = len(df) * len(df.columns)
+        chunksize = int(round(total_count / len(df.columns) / 1000, 0))
+        if chunksize == 0:
+            chunksize = 1
+    return [(i, min(i + chunksize, len(df))) for i in range(0, len(df), chunksize)]
+
+
+class UploadChunking(object):
+    params = list(shapes)
+    dfmeta = {'description': 'benchmark'}
+
+    def setup(self, kind):
+        rows, cols, nan_fraction = shapes[kind]
+        self.df = upload_frame(rows, cols, nan_fraction)
+
+    def build(self, bounds):
+        for start, end in bounds:
+            limuploader.build_upload_xml(self.df.iloc[start:end], self.dfmeta)
+
+    def track_requests_heuristic(self, kind):
+        return len(heuristic_bounds(self.df))
+
+    def track_requests_budget(self, kind):
+        return len(limuploader.chunk_bounds(self.df, self.dfmeta))
+
+    def track_cells_per_request_heuristic(self, kind):
+        return int(self.df.count().sum()) / float(len(heuristic_bounds(self.df)))
+
+    def track_cells_per_request_budget(self, kind):
+        return int(self.df.count().sum()) / float(len(limuploader.chunk_bounds(self.df, self.dfmeta)))
+
+    def time_build_heuristic(self, kind):
+        self.build(heuristic_bounds(self.df))
+
+    def time_build_budget(self, kind):
+        self.build(limuploader.chunk_bounds(self.df, self.dfmeta))
+
+
+if __name__ == '__main__':
+    common.run(UploadChunking)
@@ -0,0 +1,49 @@
+"""
+Peak memory of producing every upload body for an input read in pieces: concatenating the pieces and
+building one document per chunk with upload_series' path, against upload_stream's lazily generated bodies.
+"""
+import pandas as pd
+from lim import limuploader
+from benchmarks import common
+from benchmarks.bench_upload_xml import upload_frame
+
+
+class UploadStream(object):
+    params = [10, 40]
+    pieces, rows, cols = None, 500, 20
+    dfmeta = {'description': 'benchmark'}
+
+    def setup(self, pieces):
+        self.pieces = pieces
+
+    def frames(self):
+        for i in range(self.pieces):
+            df = upload_frame(self.rows, self.cols, seed=i)
+            df.index = df.index + pd.Timedelta(days=1000 * i)
+            yield df
+
+    def in_memory(self):
+        df = pd.concat(list(self.frames()))
+        return [limuploader.build_upload_xml(df.iloc[start:end], self.dfmeta)
+                for start, end in limuploader.chunk_bounds(df, self.dfmeta)]
+
+    def streamed(self):
+        for body, rows, cells in limuploader.stream_bodies(self.frames(), self.dfmeta):
+            for block in body:
+                pass
+
+    def time_in_memory(self, pieces):
+        self.in_memory()
+
+    def time_streamed(self, pieces):
+        self.streamed()
+
+    def peakmem_in_memory(self, pieces):
+        self.in_memory()
+
+    def peakmem_streamed(self, pieces):
+        self.streamed()
+
+
+if __name__ == '__main__':
+    common.run(UploadStream)
@@ -0,0 +1,79 @@
+"""
+build_upload_xml: the original iterrows/ElementMaker implementation against the columnar one,
+on dense and sparse frames.
+"""
+from datetime import datetime
+import lxml.builder
+import numpy as np
+import pandas as pd
+from lim import limuploader
+from benchmarks import common
+
+
+def build_upload_xml_iterrows(df, dfmeta):
+    # implementation prior to the columnar writer (Series.items instead of the removed iteritems)
+    E = lxml.builder.ElementMaker()
+    ROOT = E.ExcelData
+    ROWS = E.Rows
+    xROW = E.Row
+    xCOL = E.Col
+    xCOLS = E.Cols
+
+    entries = []
+    count = 1
+    for irow, row in df.iterrows():
+        for col, val in row.items():
+            if pd.isna(val):
+                continue
+            tokens = col.split(';')
+            treepath = tokens[0]
+            column = limuploader.default_column if len(tokens) == 1 else tokens[1]
+            desc = dfmeta.get('description', '')
+            if isinstance(irow, pd.Timestamp):
+                irow = irow.date()
+            erow = xROW(
+                xCOLS(
+                    xCOL(treepath, num="1"),
+                    xCOL(column, num="2"),
+                    xCOL(str((irow - datetime(1899, 12, 30).date()).days), num="3"),
+                    xCOL(str(val), num="4"),
+                    xCOL(desc, num="5"),
+                ),
+                num=str(count)
+            )
+            count = count + 1
+            entries.append(erow)
+
+    irow = ROOT()
+    xROWS = ROWS()
+    [xROWS.append(x) for x in entries]
+    irow.append(xROWS)
+
+    return lxml.etree.tostring(irow, pretty_print=True)
+
+
+def upload_frame(rows, cols, nan_fraction=0.0, seed=1):
+    rng = np.random.RandomState(seed)
+    values = np.round(rng.uniform(10, 1000, size=(rows, cols)), 2)
+    values[rng.uniform(size=values.shape) < nan_fraction] = np.nan
+    columns = ['TopRelation:Bench:S{0};TopColumn:Price:Close'.format(i) if i % 2 else 'TopRelation:Bench:S{0}'.format(i)
+               for i in range(cols)]
+    return pd.DataFrame(values, index=pd.bdate_range('2000-01-01', periods=rows), columns=columns)
+
+
+class BuildUploadXml(object):
+    params = ['dense', 'sparse']
+    dfmeta = {'description': 'benchmark'}
+
+    def setup(self, kind):
+        self.df = upload_frame(2000, 20, 0.0 if kind == 'dense' else 0.8)
+
+    def time_iterrows(self, kind):
+        build_upload_xml_iterrows(self.df, self.dfmeta)
+
+    def time_columnar(self, kind):
+        limuploader.build_upload_xml(self.df, self.dfmeta)
+
+
+if __name__ == '__main__':
+    common.run(BuildUploadXml)
@@ -0,0 +1,67 @@
+"""
+Helpers shared by the benchmarks. Benchmark modules follow the asv layout (classes with setup and
+time_/peakmem_ methods) and can also be run directly: python -m benchmarks.bench_build_dataframe
+"""
+import timeit
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+
+def datarequest_xml(rows=10000, cols=50, nan_fraction=0.0, seed=1):
+    """
+    Synthetic DataRequest response
+    :param rows: number of dates
+    :param cols: number of columns
+    :param nan_fraction: share of cells sent as NaN
+    :return: bytes
+    """
+    rng = np.random.RandomState(seed)
+    values = np.round(rng.uniform(10, 1000, size=(rows, cols)), 2).astype(str)
+    if nan_fraction > 0:
+        values[rng.uniform(size=values.shape) < nan_fraction] = 'NaN'
+    dates = pd.bdate_range('1990-01-01', periods=rows).strftime('%Y-%m-%dT%H:%M:%S')
+
+    out = ['<DataRequest id="1" status="100"><Reports><Report>']
+    out.extend('<ColumnHeadings>C{}</ColumnHeadings>'.format(i) for i in range(cols))
+    out.append('<Rows>')
+    for d, row in zip(dates, values):
+        out.append('<Row><RowDates>{}</RowDates><Values>{}</Values></Row>'.format(d, '</Values><Values>'.join(row)))
+    out.append('</Rows></Report></Reports></DataRequest>')
+    return ''.join(out).encode('utf-8')
+
+
+def _label(cls, name, args):
+    return '{}.{}{}'.format(cls.__name__, name, '({})'.format(', '.join(map(str, args))) if args else '')
+
+
+def run(*classes, number=3):
+    """
+    Minimal stand-in for asv: call setup, then report the best of `number` runs of every time_ method
+    and the value of every track_ method, and the traced peak allocation of every peakmem_ method (python allocations only, libxml2 trees
+    are not traced)
+    """
+    for cls in classes:
+        params = getattr(cls, 'params', None)
+        param_sets = [()] if params is None else [(p,) for p in params]
+        for args in param_sets:
+            bench = cls()
+            if hasattr(bench, 'setup'):
+                bench.setup(*args)
+            for name in sorted(dir(bench)):
+                if name.startswith('time_'):
+                    method = getattr(bench, name)
+                    best = min(timeit.repeat(lambda: method(*args), number=1, repeat=number))
+                    label = _label(cls, name, args)
+                    print('{:<60} {:>10.4f}s'.format(label, best))
+                elif name.startswith('track_'):
+                    print('{:<60} {:>10}'.format(_label(cls, name, args), getattr(bench, name)(*args)))
+                elif name.startswith('peakmem_'):
+                    tracemalloc.start()
+                    getattr(bench, name)(*args)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    label = _label(cls, name, args)
+                    print('{:<60} {:>10.1f}MB'.format(label, peak / 1e6))
+            if hasattr(bench, 'teardown'):
+                bench.teardown(*args)
@@ -1,35 +1,58 @@
-import pandas as pd
-import os
 import re
-import time
-from lxml import etree
-import requests
-from functools import lru_cache
+import warnings
+from datetime import date, timedelta
 import logging
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from lim import limsession
+from lim import limpoll
+from lim import limparser
+from lim import limcache
+from lim import limmetrics
+from lim import limframe
+from lim import limplanner
+from lim import limdecode
+from lim import limadmit
+from lim.limlazy import lazy_import
 
+pd = lazy_import('pandas')
+etree = lazy_import('lxml.etree')
 
-limServer = os.environ['LIMSERVER'].replace('"', '')
-limUserName = os.environ['LIMUSERNAME'].replace('"', '')
-limPassword = os.environ['LIMPASSWORD'].replace('"', '')
 
-lim_datarequests_url = '{}/rs/api/datarequests'.format(limServer)
-lim_schema_futurues_url = '{}/rs/api/schema/relations/<SYMBOL>?showChildren=true&desc=true&showColumns=false&dateRange=true'.format(limServer)
+lim_datarequests_path = '/rs/api/datarequests'
+lim_schema_futurues_path = '/rs/api/schema/relations/<SYMBOL>?showChildren=true&desc=true&showColumns=false&dateRange=true'
 
-calltries = 50
-sleep = 2.5
-
-curyear = pd.datetime.now().year
-prevyear = curyear - 1
+series_batch_size = 100
+curve_batch_size = 20
+shard_retries = 2  # extra attempts for a failed date window
 
 headers = {
     'Content-Type': 'application/xml',
 }
 
-proxies = {
-    'http': os.getenv('http_proxy'),
-    'https': os.getenv('https_proxy')
-}
+datarequest_xml = '<DataRequest><Query><Text>{}</Text></Query></DataRequest>'
+
+
+def __getattr__(name):
+    # curyear and prevyear used to be computed at import, they now follow the clock
+    if name == 'curyear':
+        return date.today().year
+    if name == 'prevyear':
+        return date.today().year - 1
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+class LimBatchError(Exception):
+    """
+    Some batches of a split query failed. errors maps each failed batch (tuple of symbols) to its
+    exception, results holds the joined frame of the batches that succeeded.
+    """
+
+    def __init__(self, errors, results):
+        self.errors = errors
+        self.results = results
+        super(LimBatchError, self).__init__('{} batch(es) failed: {}'.format(
+            len(errors), '; '.join('{}..{}: {}'.format(k[0], k[-1], v) for k, v in errors.items())))
 
 
 def alternate_col_val(values, noCols):
@@ -37,10 +60,11 @@ def alternate_col_val(values, noCols):
         yield values[x:x + noCols]
 
 
-def query_hash(query):
+def query_hash(query, server=None):
+    if server is not None:
+        query = '{}\n{}'.format(server, query)
     r = hashlib.md5(query.encode()).hexdigest()
-    rf = '{}.h5'.format(r)
-    return rf
+    return r
 
 
 def build_dataframe(reports):
@@ -49,69 +73,323 @@ def build_dataframe(reports):
     if len(columns) == 0 or len(dates) == 0:
         return # no data, return`1
 
-    values = [float(x.text) for x in reports.iter(tag='Values')]
-    values = list(alternate_col_val(values, len(columns)))
+    with limmetrics.span('build_dataframe'):
+        values = limparser.to_float(limparser.value_texts(reports))
+        values = values.reshape(len(dates), len(columns))
 
-    df = pd.DataFrame(values, columns=columns, index=pd.to_datetime(dates))
+        df = pd.DataFrame(values, columns=columns, index=limparser.parse_dates(dates), copy=False)
     return df
 
 
-def query_cached(q):
-    qmod = q
-    res_cache = None
-    rf = query_hash(q)
-    if os.path.exists(rf):
-        res_cache = pd.read_hdf(rf, mode='r')
-        if res_cache is not None and 'date is after' not in q:
-            cutdate = (res_cache.iloc[-1].name + pd.DateOffset(-5)).strftime('%m/%d/%Y')
-            qmod += ' when date is after {}'.format(cutdate)
-
-    res = query(qmod)
-    hdf = pd.HDFStore(rf)
-    if res_cache is None:
-        hdf.put('d', res, format='table', data_columns=True)
-        hdf.close()
-    else:
-        res = pd.concat([res_cache, res], sort=True).drop_duplicates()
-        hdf.put('d', res, format='table', data_columns=True)
-        hdf.close()
+def query_cached(q, start=None, end=None, backend=None):
+    """
+    Run a query incrementally against the local cache: only dates after the last cached one (less a few
+    days to pick up revisions) are requested and appended
+    :param q: query text
+    :param start: first date to return
+    :param end: last date to return
+    :param backend: limcache.CacheBackend, defaults to limcache.get_backend()
+    :return:
+    """
+    if backend is None:
+        backend = limcache.get_backend()
+    key = query_hash(q, limsession.get_session().server)
+
+    with limmetrics.span('query_cached'):
+        lock = backend.lock(key)
+        with limmetrics.span('query_cached.lock'):
+            lock.acquire()
+        try:
+            qmod = q
+            last = backend.last_date(key)
+            if last is not None and 'date is after' not in q:
+                cutdate = (last + pd.DateOffset(-5)).strftime('%m/%d/%Y')
+                qmod += ' when date is after {}'.format(cutdate)
+
+            # straight to the server: the result cache would answer a repeated 'date is after' query
+            res = _query(qmod, None, limpoll.deadline, None)
+            with limmetrics.span('query_cached.append'):
+                backend.append(key, res)
+        finally:
+            lock.release()
+
+        with limmetrics.span('query_cached.read'):
+            return backend.read(key, start, end)
+
+
+def datarequest(q, id=None):
+    """
+    Submit a query, or poll an existing request id, and parse the reply
+    :param q: query text
+    :param id: request id returned by a previous incomplete call
+    :return: (request id, complete, result)
+    """
+    session = limsession.get_session()
+    with limmetrics.span('datarequest.request'):
+        if id is None:
+            r = datarequest_xml.format(q)
+            resp = session.post(session.url(lim_datarequests_path), headers=headers, data=r, stream=True)
+        else:
+            uri = '{}/{}'.format(session.url(lim_datarequests_path), id)
+            resp = session.get(uri, headers=headers, stream=True)
+    with resp:
+        status = resp.status_code
+        if status != 200:
+            logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
+            raise limadmit.LimHTTPError(resp.status_code, resp.text)
 
-    return res
+        with limmetrics.span('datarequest.parse'):
+            chunks = resp.iter_content(chunk_size=limparser.chunk_size)
+            decoder = limdecode.decoder
+            parser = limparser.parse_datarequest(chunks) if decoder is None else decoder.parse(chunks)
+
+    return datarequest_result(parser)
+
+
+def datarequest_result(parser):
+    """
+    Read a parsed DataRequest reply
+    :param parser: closed limparser.DataRequestParser
+    :return: (request id, complete, result)
+    """
+    reqStatus = parser.status
+    if reqStatus == 100:
+        with limmetrics.span('build_dataframe'):
+            res = parser.dataframe()
+        return None, True, res
+    elif reqStatus == 130:
+        logging.info('No data')
+        return None, True, None
+    elif reqStatus == 200:
+        logging.debug('Not complete')
+        limmetrics.count('datarequest.pending')
+        reqId = int(parser.id)
+        return reqId, False, None
+    else:
+        raise limadmit.LimError(parser.statusMsg)
 
 
-def query(q, id=None, tries=calltries, cache_inc=False):
+def query(q, id=None, tries=None, cache_inc=False, deadline=limpoll.deadline, poller=None):
+    """
+    Run a query, polling with backoff until the server completes it. Served from the in-memory result
+    cache when limcache.enable_result_cache() is on, and merged with concurrent queries when
+    limplanner.enable() is on.
+    :param q: query text
+    :param id: resume polling an existing request id
+    :param tries: ignored, deprecated in favour of deadline
+    :param cache_inc: use the incremental local cache
+    :param deadline: seconds to wait for the server before raising PollTimeout
+    :param poller: PollScheduler to use, read its polls and elapsed afterwards for the wait stats
+    :return:
+    """
+    if tries is not None:
+        warnings.warn('query tries is ignored, polling is bounded by deadline', DeprecationWarning, stacklevel=2)
     if cache_inc:
         return query_cached(q)
 
-    r = '<DataRequest><Query><Text>{}</Text></Query></DataRequest>'.format(q)
+    if id is not None:
+        return _query(q, id, deadline, poller)
 
-    if tries == 0:
-        raise Exception('Run out of tries')
-
-    if id is None:
-        resp = requests.request("POST", lim_datarequests_url, headers=headers, data=r, auth=(limUserName, limPassword), proxies=proxies)
-    else:
-        uri = '{}/{}'.format(lim_datarequests_url, id)
-        resp = requests.get(uri, headers=headers, auth=(limUserName, limPassword), proxies=proxies)
-    status = resp.status_code
-    if status == 200:
-        root = etree.fromstring(resp.text.encode('utf-8'))
-        reqStatus = int(root.attrib['status'])
-        if reqStatus == 100:
-            res = build_dataframe(root[0])
-            return res
-        elif reqStatus == 130:
-            logging.info('No data')
-        elif reqStatus == 200:
-            logging.debug('Not complete')
-            reqId = int(root.attrib['id'])
-            time.sleep(sleep)
-            return query(q, reqId, tries - 1)
-        else:
-            raise Exception(root.attrib['statusMsg'])
+    coalescer = limplanner.coalescer
+    if coalescer is not None:
+        run = lambda: coalescer.query(q, lambda text: _query(text, None, deadline, poller))
     else:
-        logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
-        raise Exception(resp.text)
+        run = lambda: _query(q, None, deadline, poller)
+
+    cache = limcache.result_cache
+    if cache is not None:
+        return cache.get_or_call(limcache.result_key(limsession.get_session().server, q), run)
+    return run()
+
+
+def _query(q, id, deadline, poller):
+    if poller is None:
+        poller = limpoll.PollScheduler(deadline)
+
+    with limmetrics.span('query'):
+        reqId, complete, res = datarequest(q, id)
+        while not complete:
+            poller.wait()
+            reqId, complete, res = datarequest(q, reqId)
+
+    limmetrics.count('query.polls', poller.polls)
+    logging.debug('Query complete after {} polls in {:.2f}s'.format(poller.polls, poller.elapsed))
+    return res
+
+
+def query_many(queries, max_workers=8, deadline=limpoll.deadline):
+    """
+    Run several queries concurrently. All DataRequests are submitted up front, then the outstanding
+    request ids are polled together until every query completes or fails.
+    :param queries: list of query texts
+    :param max_workers: maximum number of http calls in flight
+    :param deadline: seconds to wait for the whole batch
+    :return: list of results in input order, holding the Exception for any query that failed
+    """
+    results = [None] * len(queries)
+    cache = limcache.result_cache
+    server = limsession.get_session().server
+    todo = range(len(queries))
+    if cache is not None:
+        todo = []
+        for i, q in enumerate(queries):
+            found, results[i] = cache.get(limcache.result_key(server, q))
+            if not found:
+                todo.append(i)
+
+    poller = limpoll.PollScheduler(deadline)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        submit = limadmit.bind(datarequest)
+        calls = {i: pool.submit(submit, queries[i]) for i in todo}
+        while len(calls) > 0:
+            pending = {}
+            for i, call in calls.items():
+                try:
+                    reqId, complete, res = call.result()
+                except Exception as e:
+                    logging.error('Query {} failed: {}'.format(i, e))
+                    results[i] = e
+                    continue
+                if complete:
+                    results[i] = res
+                    if cache is not None:
+                        cache.put(limcache.result_key(server, queries[i]), res if res is None else res.copy())
+                else:
+                    pending[i] = reqId
+
+            if len(pending) == 0:
+                break
+
+            try:
+                poller.wait()
+            except limpoll.PollTimeout as e:
+                for i in pending:
+                    results[i] = e
+                break
+            calls = {i: pool.submit(submit, queries[i], reqId) for i, reqId in pending.items()}
+
+    logging.debug('{} queries complete after {} polls in {:.2f}s'.format(len(queries), poller.polls, poller.elapsed))
+    limmetrics.observe('query_many', poller.elapsed)
+    limmetrics.count('query.polls', poller.polls)
+    return results
+
+
+def _after_date(q):
+    # first date excluded by a 'date is after' clause of q, None without one
+    m = re.search(r'\bdate\s+is\s+after\s+([0-9/\-]+)', q, re.I)
+    if m is None:
+        return None
+    text = m.group(1)
+    return date(int(text), 12, 31) if re.match(r'^\d{4}$', text) else pd.Timestamp(text).date()
+
+
+def date_windows(start, end=None, years=1):
+    """
+    Split a date range into calendar windows of years years
+    :param start: dates after start are included
+    :param end: dates before end are included, None for no end
+    :return: list of (after, before) date pairs, before is None for an open last window
+    """
+    start = pd.Timestamp(start).date()
+    end = None if end is None else pd.Timestamp(end).date()
+    windows, after = [], start
+    while True:
+        first_year = after.year + 1 if (after.month, after.day) == (12, 31) else after.year
+        before = date(first_year + years, 1, 1)
+        if (end is not None and before >= end) or before > date.today():
+            windows.append((after, end))
+            return windows
+        windows.append((after, before))
+        after = before - timedelta(days=1)
+
+
+def window_query(q, after=None, before=None):
+    """
+    q restricted to dates after after and before before, both excluded
+    """
+    conditions = []
+    if after is not None:
+        conditions.append('date is after {:%m/%d/%Y}'.format(after))
+    if before is not None:
+        conditions.append('date is before {:%m/%d/%Y}'.format(before))
+    if len(conditions) == 0:
+        return q
+    conditions = ' and '.join(conditions)
+    whens = list(re.finditer(r'\bwhen\b', q, re.I))
+    if len(whens) == 0:
+        return '{}\nWHEN\n{}\n'.format(q.rstrip(), conditions)
+    when = whens[-1]
+    return '{}WHEN\n({}) and {}\n'.format(q[:when.start()], q[when.end():].strip(), conditions)
+
+
+def fetch_windows(queries, max_workers=8, retries=None, deadline=limpoll.deadline):
+    """
+    query_many, retrying each failed query on its own up to retries times
+    :param retries: defaults to shard_retries
+    :return: list of results in input order, holding the Exception of any query that kept failing
+    """
+    if retries is None:
+        retries = shard_retries
+    results = query_many(queries, max_workers=max_workers, deadline=deadline)
+    for attempt in range(retries):
+        failed = [i for i, x in enumerate(results) if isinstance(x, Exception)]
+        if len(failed) == 0:
+            break
+        logging.warning('Retrying {} failed window(s), attempt {}'.format(len(failed), attempt + 1))
+        limmetrics.count('query.window.retries', len(failed))
+        for i, res in zip(failed, query_many([queries[i] for i in failed], max_workers=max_workers, deadline=deadline)):
+            results[i] = res
+    return results
+
+
+def concat_windows(windows, results):
+    """
+    Join the results of consecutive date windows, dropping dates repeated at a boundary
+    :raise LimBatchError: if any window failed, with the windows that did not
+    """
+    frames, failed = [], {}
+    for window, res in zip(windows, results):
+        if isinstance(res, Exception):
+            failed[window] = res
+        elif res is not None:
+            frames.append(res)
+
+    res = None
+    if len(frames) > 0:
+        res = pd.concat(frames, sort=False) if len(frames) > 1 else frames[0]
+        res = res[~res.index.duplicated(keep='last')].sort_index()
+    if len(failed) > 0:
+        raise LimBatchError(failed, res)
+    return res
+
+
+def query_sharded(q, start=None, end=None, years=1, max_workers=8, retries=None, deadline=limpoll.deadline):
+    """
+    Run a long history query as one DataRequest per window of years years, fetched concurrently. A
+    failed window is retried on its own.
+    :param start: first date, defaults to the day after the 'date is after' date of q
+    :param end: last date, None for everything up to the latest
+    :raise LimBatchError: if a window still fails after retries
+    """
+    windows = _shard_windows(q, start, end, years)
+    return concat_windows(windows, fetch_windows([window_query(q, *x) for x in windows], max_workers, retries, deadline))
+
+
+def _date_bounds(start, end):
+    # inclusive start and end as the excluded dates of a when clause
+    after = None if start is None else pd.Timestamp(start).date() - timedelta(days=1)
+    before = None if end is None else pd.Timestamp(end).date() + timedelta(days=1)
+    return after, before
+
+
+def _shard_windows(q, start, end, years):
+    after, before = _date_bounds(start, end)
+    own = _after_date(q)
+    if own is not None:
+        after = own if after is None else max(after, own)
+    if after is None:
+        raise ValueError('Sharding needs a start date, pass start or a query with a date is after clause')
+    return date_windows(after, before, years)
 
 
 def check_pra_symbol(symbol):
@@ -144,19 +422,92 @@ def build_series_query(symbols):
     return q
 
 
-def series(symbols):
+def series(symbols, batch_size=None, max_workers=8, errors='raise', format='wide', dtype=None, start=None, end=None,
+           shard_years=None):
+    """
+    Price history for a list of symbols. Long lists are split into batches that are queried
+    concurrently and outer-joined on date.
+    :param symbols: symbol, list of symbols or dict of symbol to column name
+    :param batch_size: symbols per query, defaults to series_batch_size
+    :param max_workers: batches (or windows) in flight
+    :param errors: 'raise' a LimBatchError when any batch fails, or 'ignore' to log and return the rest
+    :param format: 'wide' frame, or 'compact', 'long' or 'sparse' (see limframe.convert) for sparse strips
+    :param dtype: value dtype, e.g. np.float32
+    :param start: first date, None for the whole history
+    :param end: last date, None for up to the latest
+    :param shard_years: split the history of every batch into windows of this many years, fetched
+        concurrently and retried on their own (see query_sharded); needs start
+    :return:
+    """
     scall = symbols
     if isinstance(scall, str):
         scall = [scall]
     if isinstance(scall, dict):
         scall = list(scall.keys())
 
-    q = build_series_query(scall)
-    res = query(q)
+    if batch_size is None:
+        batch_size = series_batch_size
 
-    if isinstance(symbols, dict):
+    if shard_years is None and len(scall) <= batch_size:
+        q = window_query(build_series_query(scall), *_date_bounds(start, end))
+        res = query(q)
+    else:
+        batches = [scall[i:i + batch_size] for i in range(0, len(scall), batch_size)]
+        if shard_years is None:
+            results = query_many([window_query(build_series_query(x), *_date_bounds(start, end)) for x in batches], max_workers=max_workers)
+        else:
+            results = _series_sharded(batches, start, end, shard_years, max_workers)
+        if format != 'wide':
+            # compact each batch as it comes, so the batches are never joined into one wide frame
+            for i, x in enumerate(results):
+                if x is not None and not isinstance(x, Exception):
+                    results[i] = limframe.CompactFrame.from_frame(x, dtype)
+        res = join_batches(batches, results, errors)
+
+    if isinstance(symbols, dict) and res is not None:
         res = res.rename(columns=symbols)
 
+    return limframe.convert(res, format, dtype)
+
+
+def _series_sharded(batches, start, end, years, max_workers):
+    # every window of every batch in one go, then the windows of each batch joined
+    windows = _shard_windows('', start, end, years)
+    queries = [window_query(build_series_query(x), *w) for x in batches for w in windows]
+    results = fetch_windows(queries, max_workers=max_workers)
+    joined = []
+    for i in range(len(batches)):
+        try:
+            joined.append(concat_windows(windows, results[i * len(windows):(i + 1) * len(windows)]))
+        except LimBatchError as e:
+            joined.append(e)
+    return joined
+
+
+def join_batches(batches, results, errors='raise'):
+    """
+    Outer join batch results on date, in batch order
+    :param batches: list of symbol lists
+    :param results: query_many results for each batch
+    :param errors: 'raise' or 'ignore' failed batches
+    :return:
+    """
+    frames, failed = [], {}
+    for batch, res in zip(batches, results):
+        if isinstance(res, Exception):
+            logging.error('Batch {}..{} ({} symbols) failed: {}'.format(batch[0], batch[-1], len(batch), res))
+            failed[tuple(batch)] = res
+        elif res is not None:
+            frames.append(res)
+
+    if len(frames) == 0:
+        res = None
+    elif isinstance(frames[0], limframe.CompactFrame):
+        res = limframe.CompactFrame.concat(frames)
+    else:
+        res = pd.concat(frames, axis=1, join='outer', sort=True)
+    if len(failed) > 0 and errors == 'raise':
+        raise LimBatchError(failed, res)
     return res
 
 
@@ -207,7 +558,17 @@ def build_curve_query(symbols, column='Close', curve_date=None):
     return build_let_show_when_helper(lets, shows, whens)
 
 
-def curve(symbols, column='Close', curve_dates=None):
+def curve(symbols, column='Close', curve_dates=None, cache_inc=False):
+    """
+    Forward curves from the current month, at month starts
+    :param symbols: symbol, list of symbols or dict of symbol to column name
+    :param curve_dates: None for the latest curve, a date, or a list of dates for the curve history of one symbol
+    :param cache_inc: keep curve dates in the local curve store and only request the ones it lacks
+    :return:
+    """
+    if cache_inc and curve_dates is not None:
+        return curve_cached(symbols, column, curve_dates)
+
     scall = symbols
     if isinstance(scall, str):
         scall = [scall]
@@ -219,19 +580,95 @@ def curve(symbols, column='Close', curve_dates=None):
     else:
         q = build_curve_query(scall, column, curve_dates)
     res = query(q)
+    return _trim_curve(res, symbols)
+
+
+def _trim_curve(res, symbols):
+    if res is None or len(res) == 0:
+        return None
 
     if isinstance(symbols, dict):
         res = res.rename(columns=symbols)
 
     # only keep the current forward curve, discard history
-    if res is not None and len(res) > 0:
-        res = res['{}-{}'.format(pd.datetime.now().year, pd.datetime.now().month):]
-        # reindex dates to start of month
-        res = res.resample('MS').mean()
-        return res
+    today = date.today()
+    res = res['{}-{}'.format(today.year, today.month):]
+    # reindex dates to start of month
+    res = res.resample('MS').mean()
+    return res
+
 
+def curve_cached(symbols, column='Close', curve_dates=None, store=None, batch_size=None, max_workers=8):
+    """
+    curve assembled from the local curve store. Only the curve dates it does not hold are requested,
+    batch_size dates per query with the queries run concurrently. Curve dates from today on are always
+    requested and never stored, as they may still change, and so are past dates the server had no curve for.
+    :param store: limcache.CurveStore, defaults to limcache.get_curve_store()
+    :param batch_size: curve dates per query, defaults to curve_batch_size
+    :return:
+    """
+    if curve_dates is None:
+        return curve(symbols, column)
+    if store is None:
+        store = limcache.get_curve_store()
+    if batch_size is None:
+        batch_size = curve_batch_size
+
+    scall = symbols
+    if isinstance(scall, str):
+        scall = [scall]
+    if isinstance(scall, dict):
+        scall = list(scall.keys())
 
-def build_continuous_futures_rollover_query(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=prevyear):
+    history = isinstance(curve_dates, list) and len(curve_dates) > 1
+    if history:
+        scall = scall[:1]
+    dates = [pd.Timestamp(x).normalize() for x in (curve_dates if isinstance(curve_dates, list) else [curve_dates])]
+    server = limsession.get_session().server
+    today = pd.Timestamp.today().normalize()
+    past = [x for x in dates if x < today]
+
+    batches = []
+    for symbol in scall:
+        missing = store.missing(server, symbol, column, past) + [x for x in dates if x >= today]
+        batches.extend((symbol, missing[i:i + batch_size]) for i in range(0, len(missing), batch_size))
+    results = query_many([build_curve_history_query([symbol], column, chunk) for symbol, chunk in batches], max_workers=max_workers)
+
+    fetched = dict((symbol, {}) for symbol in scall)
+    failed = {}
+    for (symbol, chunk), res in zip(batches, results):
+        if isinstance(res, Exception):
+            logging.error('Curve of {} for {} date(s) from {:%Y-%m-%d} failed: {}'.format(symbol, len(chunk), chunk[0], res))
+            failed[(symbol,) + tuple(chunk)] = res
+            continue
+        curves = {}
+        for curve_date in chunk:
+            label = curve_date.strftime('%Y/%m/%d')
+            curves[curve_date] = res[label] if res is not None and label in res.columns else None
+        # a date without a curve in the reply may be published late, it is asked for again next time
+        store.store(server, symbol, column, dict((k, v) for k, v in curves.items() if v is not None and k < today))
+        fetched[symbol].update((k, v) for k, v in curves.items() if v is not None and k >= today)
+    if len(failed) > 0:
+        raise LimBatchError(failed, None)
+
+    columns = []
+    for symbol in scall:
+        frame = store.read(server, symbol, column, past)
+        if len(fetched[symbol]) > 0:
+            frame = pd.concat([frame, pd.DataFrame(fetched[symbol])], axis=1, sort=True)
+        if history:
+            columns.extend((x.strftime('%Y/%m/%d'), frame[x]) for x in dates if x in frame.columns)
+        elif dates[0] in frame.columns:
+            columns.append((symbol, frame[dates[0]]))
+    if len(columns) == 0:
+        return None
+    res = pd.concat([x[1] for x in columns], axis=1, keys=[x[0] for x in columns], sort=True)
+    return _trim_curve(res, symbols)
+
+
+def build_continuous_futures_rollover_query(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=None):
+    if after_date is None:
+        after_date = date.today().year - 1
     lets, shows, whens = '', '', 'Date is after {}\n'.format(after_date)
     for month in months:
         m = int(month[1:])
@@ -245,36 +682,116 @@ def build_continuous_futures_rollover_query(symbol, months=['M1'], rollover_date
     return build_let_show_when_helper(lets, shows, whens)
 
 
-def continuous_futures_rollover(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=prevyear):
+def continuous_futures_rollover(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=None,
+                                format='wide', dtype=None, shard_years=None):
+    """
+    :param shard_years: fetch the history since after_date in windows of this many years, see query_sharded
+    """
     q = build_continuous_futures_rollover_query(symbol, months=months, rollover_date=rollover_date, after_date=after_date)
-    res = query(q)
-    return res
+    res = query(q) if shard_years is None else query_sharded(q, years=shard_years)
+    return limframe.convert(res, format, dtype)
 
 
-@lru_cache(maxsize=None)
-def futures_contracts(symbol, start_year=curyear, end_year=curyear+2):
-    contracts = get_symbol_contract_list(symbol, monthly_contracts_only=True)
-    contracts = [x for x in contracts if start_year <= int(x.split('_')[-1][:4]) <= end_year]
-    df = series(contracts)
-    return df
+def futures_contracts(symbol, start_year=None, end_year=None, format='wide', dtype=None):
+    """
+    Price history of the monthly contracts of symbol expiring between start_year and end_year
+    :param start_year: defaults to the current year
+    :param end_year: defaults to two years after the current year
+    :param format: see series
+    :param dtype: see series
+    """
+    year = date.today().year
+    start_year = year if start_year is None else start_year
+    end_year = year + 2 if end_year is None else end_year
+    contracts = _contract_index(symbol).contracts(limsession.get_session().server, symbol, start_year=start_year, end_year=end_year)
+    return series(contracts, format=format, dtype=dtype)
 
 
-@lru_cache(maxsize=None)
-def get_symbol_contract_list(symbol, monthly_contracts_only=False):
+def fetch_symbol_contracts(symbol):
     """
-    Given a symbol pull all futurues contracts related to it
-    :param symbol:
-    :return:
+    Contracts of a root symbol from the schema relations endpoint
+    :return: list of (name, start date, end date)
     """
-    uri = lim_schema_futurues_url.replace('<SYMBOL>', symbol)
-    resp = requests.get(uri, headers=headers, auth=(limUserName, limPassword), proxies=proxies)
+    session = limsession.get_session()
+    uri = session.url(lim_schema_futurues_path.replace('<SYMBOL>', symbol))
+    with limmetrics.span('contract_list'):
+        resp = session.get(uri, headers=headers)
 
     if resp.status_code == 200:
-        root = etree.fromstring(resp.text.encode('utf-8'))
-        contracts = [x.attrib['name'] for x in root[0][0]]
-        if monthly_contracts_only:
-            contracts = [x for x in contracts if re.findall('\d\d\d\d\w', x) ]
-        return contracts
+        return parse_contracts(resp.text)
     else:
         logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
-        raise Exception(resp.text)
+        raise limadmit.LimHTTPError(resp.status_code, resp.text)
+
+
+def parse_contracts(text):
+    """
+    :param text: schema relations reply
+    :return: list of (name, start date, end date)
+    """
+    root = etree.fromstring(text.encode('utf-8'))
+    return [(x.attrib['name'], x.attrib.get('startDate'), x.attrib.get('endDate')) for x in root[0][0]]
+
+
+def _contract_index(symbol, refresh=False):
+    # contract index with symbol stored and fresh, a stale copy is kept if refetching fails
+    return _update_contract_index(symbol, refresh, fetch_symbol_contracts)
+
+
+def _update_contract_index(symbol, refresh, fetch):
+    index = limcache.get_contract_index()
+    server = limsession.get_session().server
+    if refresh or not index.fresh(server, symbol):
+        try:
+            contracts = fetch(symbol)
+        except Exception:
+            if index.fetched(server, symbol) is None:
+                raise
+            logging.warning('Could not refresh contracts of {}, using the stored list'.format(symbol))
+        else:
+            index.store(server, symbol, contracts)
+    return index
+
+
+def get_symbol_contract_list(symbol, monthly_contracts_only=False):
+    """
+    Given a symbol pull all futurues contracts related to it. Lists are kept in the contract index
+    (limcache.get_contract_index) for limcache.contract_ttl seconds.
+    :param symbol:
+    :param monthly_contracts_only: only contracts with a year and month code, e.g. FB_2020Z
+    :return:
+    """
+    return _contract_index(symbol).contracts(limsession.get_session().server, symbol, monthly=monthly_contracts_only)
+
+
+def contract_metadata(symbol):
+    """
+    Contracts of symbol with their year, month code and start/end dates
+    :return: DataFrame
+    """
+    return _contract_index(symbol).metadata(limsession.get_session().server, symbol)
+
+
+def prefetch_contracts(symbols, max_workers=8, refresh=False):
+    """
+    Fetch the contract lists of several root symbols concurrently, skipping those already fresh in the index
+    :param refresh: refetch even fresh ones
+    :return: list in input order of the number of contracts, or the Exception for a symbol that failed
+    """
+    def fetch(symbol):
+        try:
+            return len(_contract_index(symbol, refresh).contracts(server, symbol))
+        except Exception as e:
+            logging.error('Contracts of {} failed: {}'.format(symbol, e))
+            return e
+
+    server = limsession.get_session().server
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(limadmit.bind(fetch), symbols))
+
+
+def invalidate_contracts(symbol=None):
+    """
+    Drop the stored contract lists of symbol, or of every symbol, for the current server
+    """
+    limcache.get_contract_index().invalidate(limsession.get_session().server, symbol)
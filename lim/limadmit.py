@@ -0,0 +1,389 @@
+"""
+Client side admission control. Every http call a LimSession makes to a server first passes that
+server's Admission: a limit on requests in flight, an optional token bucket on the request rate, and
+a circuit breaker that fails calls fast while the server keeps answering with 5xx, 429 or no
+connection. Waiting requests are let through by lane, interactive before batch before upload, and
+in arrival order within a lane.
+
+    limadmit.configure(server, max_in_flight=8, rate=20, burst=40)
+    with limadmit.lane('batch'):
+        lim.series(symbols)
+    limadmit.get_admission(server).stats()
+
+lim calls run in the 'interactive' lane unless the caller picks another, limuploader uploads in the
+'upload' lane and limprefetch refreshes in the 'batch' lane. A request that waits longer than
+queue_timeout is rejected with LimRejected; one made while the circuit is open fails at once with
+CircuitOpen. A slot is held until the response is read, for streamed replies until it is closed.
+limasync coroutines wait for their slots on the event loop (acquire_async), in the same queue as
+threads.
+
+Errors of the lim package derive from LimError: LimHTTPError for a non-200 reply, LimRejected and
+CircuitOpen from here.
+"""
+import time
+import heapq
+import logging
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+from lim import limmetrics
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+lanes = ('interactive', 'batch', 'upload')  # in order of priority
+max_in_flight = 20  # requests in flight per server
+rate = None  # requests per second per server, None for no limit
+burst = 20  # requests the token bucket lets through at once
+queue_timeout = 300  # seconds a request may wait for admission
+failure_threshold = 5  # consecutive failures opening the circuit
+reset_timeout = 30  # seconds the circuit stays open before a trial request
+
+
+class LimError(Exception):
+    pass
+
+
+class LimHTTPError(LimError):
+    """
+    The server answered with a status other than 200, text is the body of the reply
+    """
+
+    def __init__(self, status, text):
+        self.status = status
+        self.text = text
+        super(LimHTTPError, self).__init__(text)
+
+    @property
+    def transient(self):
+        return failure_status(self.status)
+
+
+class LimRejected(LimError):
+    """
+    A request was not admitted within queue_timeout
+    """
+    pass
+
+
+class CircuitOpen(LimRejected):
+    """
+    The server is failing, requests are refused until reset_timeout has passed
+    """
+    pass
+
+
+def failure_status(status):
+    """
+    Whether a reply status counts against the circuit breaker
+    """
+    return status >= 500 or status == 429
+
+
+_lane = contextvars.ContextVar('lim_lane', default=lanes[0])  # per thread, and per asyncio task
+
+
+def current_lane():
+    return _lane.get()
+
+
+@contextmanager
+def lane(name):
+    """
+    Run the enclosed lim calls of this thread, or asyncio task, in lane name
+    """
+    if name not in lanes:
+        raise ValueError('Unknown lane {!r}, expected one of {}'.format(name, ', '.join(lanes)))
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def bind(func):
+    """
+    func running in the caller's lane, for work handed to a thread pool
+    """
+    name = current_lane()
+
+    def call(*args, **kwargs):
+        with lane(name):
+            return func(*args, **kwargs)
+    return call
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TokenBucket(object):
+    """
+    rate tokens a second, holding at most burst. Not thread safe, Admission calls it under its lock.
+    """
+
+    def __init__(self, rate, burst=burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def delay(self, now):
+        """
+        :return: seconds until a token is available, 0 if one is now
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class CircuitBreaker(object):
+    """
+    Opens after failure_threshold consecutive failures. Once reset_timeout has passed a single trial
+    request is let through (half open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=failure_threshold, reset_timeout=reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = None
+        self.opens = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Raise CircuitOpen unless a request may go to the server now
+        :return: whether the request is the trial of a half open circuit
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return False
+            if self.state == 'open' and time.monotonic() - self.opened >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            raise CircuitOpen('Circuit open after {} failures, retry in {:.1f}s'.format(
+                self.failures, max(0.0, self.reset_timeout - (time.monotonic() - self.opened))))
+
+    def record(self, ok, trial=False):
+        """
+        :param ok: outcome of an allowed request, None if it says nothing about the server
+        :param trial: what allow returned for it
+        """
+        with self._lock:
+            if trial:
+                self._trial = False
+            if ok is None:
+                return
+            if ok:
+                self.state, self.failures = 'closed', 0
+                return
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                logging.warning('Circuit opened after {} failures'.format(self.failures))
+                self.state, self.opened = 'open', time.monotonic()
+                self.opens += 1
+                limmetrics.count('admission.opened')
+
+
+class Admission(object):
+    """
+    Admission of the requests to one server
+    :param max_in_flight: requests in flight at once
+    :param rate: requests per second, None for no limit
+    :param burst: requests let through at once by the rate limit
+    :param queue_timeout: seconds a request may wait before LimRejected
+    :param failure_threshold: consecutive failures opening the circuit
+    :param reset_timeout: seconds the circuit stays open
+    """
+
+    def __init__(self, max_in_flight=max_in_flight, rate=rate, burst=burst, queue_timeout=queue_timeout,
+                 failure_threshold=failure_threshold, reset_timeout=reset_timeout):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.in_flight = 0
+        self._waiting = []  # heap of (lane priority, arrival)
+        self._arrivals = itertools.count()
+        self._cond = threading.Condition()
+        self._waits = dict((x, deque(maxlen=10000)) for x in lanes)
+        self._admitted = dict((x, 0) for x in lanes)
+        self._rejected = dict((x, 0) for x in lanes)
+        self._short_circuited = 0
+        self._async_waiters = []  # (event loop, future) of coroutines waiting for a slot
+
+    def _enter(self, name):
+        # circuit check and queue ticket, shared by acquire and acquire_async
+        try:
+            trial = self.breaker.allow()
+        except CircuitOpen:
+            with self._cond:
+                self._short_circuited += 1
+            limmetrics.count('admission.short_circuited', lane=name)
+            raise
+        ticket = (lanes.index(name), next(self._arrivals))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        return trial, ticket, time.monotonic()
+
+    def _admit(self, ticket, name, start, trial):
+        # under the lock: True once ticket is admitted, else the seconds to wait (None until notified)
+        now = time.monotonic()
+        delay = None
+        if self._waiting[0] == ticket and self.in_flight < self.max_in_flight:
+            delay = self.bucket.delay(now) if self.bucket is not None else 0.0
+            if delay == 0:
+                if self.bucket is not None:
+                    self.bucket.take()
+                self.in_flight += 1
+                self._admitted[name] += 1
+                self._waits[name].append(now - start)
+                return True
+        remaining = start + self.queue_timeout - now
+        if remaining <= 0:
+            self._rejected[name] += 1
+            limmetrics.count('admission.rejected', lane=name)
+            self.breaker.record(None, trial)
+            raise LimRejected('Not admitted within {}s: {} in flight, {} waiting'.format(
+                self.queue_timeout, self.in_flight, len(self._waiting)))
+        return remaining if delay is None else min(delay, remaining)
+
+    def _leave(self, ticket):
+        # under the lock
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._notify()
+
+    def _notify(self):
+        # under the lock: wake the waiting threads and event loops
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._async_waiters.clear()
+
+    def acquire(self, name=None):
+        """
+        Wait for a slot in lane name, defaults to current_lane(). Raises LimRejected or CircuitOpen.
+        :return: trial flag to hand back to release
+        """
+        name = name or current_lane()
+        trial, ticket, start = self._enter(name)
+        with self._cond:
+            try:
+                while True:
+                    wait = self._admit(ticket, name, start, trial)
+                    if wait is True:
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._leave(ticket)
+        limmetrics.observe('admission.wait', time.monotonic() - start, lane=name)
+        return trial
+
+    async def acquire_async(self, name=None):
+        """
+        acquire for a coroutine: waits on the event loop, in the same queue and counters as the threads
+        """
+        import asyncio
+        name = name or current_lane()
+        trial, ticket, start = self._enter(name)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                future = loop.create_future()
+                with self._cond:
+                    wait = self._admit(ticket, name, start, trial)
+                    if wait is True:
+                        break
+                    self._async_waiters.append((loop, future))
+                try:
+                    await asyncio.wait_for(future, wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._leave(ticket)
+        limmetrics.observe('admission.wait', time.monotonic() - start, lane=name)
+        return trial
+
+    def release(self, ok, trial=False):
+        """
+        :param ok: whether the server answered healthily, None if the request says nothing about it
+        :param trial: what acquire returned
+        """
+        self.breaker.record(ok, trial)
+        with self._cond:
+            self.in_flight -= 1
+            self._notify()
+
+    def stats(self):
+        """
+        state of the circuit, in_flight, waiting, opened (times the circuit opened), short_circuited
+        (requests refused while open), and per lane admitted, rejected and wait_p50/p95 in seconds
+        """
+        with self._cond:
+            res = {
+                'state': self.breaker.state,
+                'in_flight': self.in_flight,
+                'waiting': len(self._waiting),
+                'opened': self.breaker.opens,
+                'short_circuited': self._short_circuited,
+            }
+            waits = dict((x, list(self._waits[x])) for x in lanes)
+            for x in lanes:
+                res['{}.admitted'.format(x)] = self._admitted[x]
+                res['{}.rejected'.format(x)] = self._rejected[x]
+        for x in lanes:
+            p50, p95 = np.percentile(waits[x], [50, 95]).tolist() if waits[x] else (None, None)
+            res['{}.wait_p50'.format(x)], res['{}.wait_p95'.format(x)] = p50, p95
+        return res
+
+
+_admissions = {}
+_lock = threading.Lock()
+
+
+def get_admission(server):
+    """
+    Shared Admission of a server url, created with the module defaults on first use
+    """
+    admission = _admissions.get(server)
+    if admission is None:
+        with _lock:
+            admission = _admissions.setdefault(server, Admission())
+    return admission
+
+
+def configure(server, **kwargs):
+    """
+    Replace the Admission of a server, requests already admitted finish under the old one
+    :param kwargs: passed through to Admission
+    :return: the new Admission
+    """
+    admission = Admission(**kwargs)
+    with _lock:
+        _admissions[server] = admission
+    return admission
+
+
+def reset(server=None):
+    """
+    Forget the Admission of server, or of every server, going back to the module defaults
+    """
+    with _lock:
+        if server is None:
+            _admissions.clear()
+        else:
+            _admissions.pop(server, None)
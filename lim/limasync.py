@@ -0,0 +1,372 @@
+"""
+asyncio client: aquery, aseries, acurve, acontinuous_futures_rollover, afutures_contracts and
+aupload_series mirror their blocking counterparts in lim and limuploader, over aiohttp with
+asyncio.sleep polling, so thousands of outstanding requests can share one event loop.
+
+    async with limasync.AsyncLimSession.from_session() as session:
+        df = await limasync.aseries(['FB', 'FP'], session=session)
+
+Without a session argument each event loop gets a shared AsyncLimSession per profile, built from
+the same settings as limsession.get_session(); close them with close_sessions(). Calls can be cancelled
+or bounded with asyncio.wait_for, and deadline still bounds the polling of every request. Needs the
+aiohttp package (pip install lim[async]).
+"""
+import time
+import base64
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from datetime import date
+from lim import lim
+from lim import limsession
+from lim import limpoll
+from lim import limparser
+from lim import limcache
+from lim import limmetrics
+from lim import limframe
+from lim import limuploader
+from lim import limadmit
+from lim.limlazy import lazy_import
+
+aiohttp = lazy_import('aiohttp')
+
+
+limit = 100  # connections per session, further requests wait for a free one
+
+
+class AsyncLimSession(object):
+    """
+    Pooled aiohttp session for a LIM server, the asyncio counterpart of limsession.LimSession. Must be
+    created and used inside one running event loop.
+    """
+
+    def __init__(self, server, username, password, proxies=None, timeout=limsession.timeout, limit=limit):
+        self.server = server.replace('"', '').rstrip('/')
+        self.username = username.replace('"', '')
+        credentials = '{}:{}'.format(self.username, password.replace('"', '')).encode('latin1')
+        self.proxies = proxies or {}
+        connect, read = timeout
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit), timeout=self.timeout,
+                                              headers={'Authorization': 'Basic ' + base64.b64encode(credentials).decode('ascii')})
+
+    @classmethod
+    def from_session(cls, session=None, **kwargs):
+        """
+        Session for the server, credentials, proxies and timeout of a LimSession
+        :param session: LimSession, defaults to limsession.get_session()
+        :param kwargs: passed through to AsyncLimSession
+        """
+        if session is None:
+            session = limsession.get_session()
+        kwargs.setdefault('proxies', session.proxies)
+        kwargs.setdefault('timeout', session.timeout)
+        return cls(session.server, session.auth[0], session.auth[1], **kwargs)
+
+    def url(self, path):
+        return '{}{}'.format(self.server, path)
+
+    @asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        """
+        Context manager of the response, use with async with. Waits for a slot of the server's
+        limadmit.Admission in the task's lane, shared with the blocking sessions, and holds it until
+        the block exits, so while the body is read.
+        """
+        kwargs.setdefault('proxy', self.proxies.get('https' if url.startswith('https') else 'http'))
+        admission = limadmit.get_admission(self.server)
+        trial = await admission.acquire_async()
+        ok = None
+        try:
+            async with self._session.request(method, url, **kwargs) as resp:
+                ok = not limadmit.failure_status(resp.status)
+                yield resp
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            ok = False
+            raise
+        finally:
+            admission.release(ok, trial)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    async def close(self):
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+_sessions = weakref.WeakKeyDictionary()  # event loop -> {profile: AsyncLimSession}
+
+
+def get_session(profile=None):
+    """
+    Shared AsyncLimSession of a profile for the running event loop
+    :param profile: profile name, defaults to limsession.active_profile()
+    """
+    if profile is None:
+        profile = limsession.active_profile()
+    sessions = _sessions.setdefault(asyncio.get_running_loop(), {})
+    session = sessions.get(profile)
+    if session is None:
+        session = sessions[profile] = AsyncLimSession.from_session(limsession.get_session(profile))
+    return session
+
+
+async def close_sessions():
+    """
+    Close the shared sessions of the running event loop
+    """
+    sessions = _sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+async def _error(resp):
+    text = await resp.text()
+    logging.error('Received response: Code: {} Msg: {}'.format(resp.status, text))
+    return limadmit.LimHTTPError(resp.status, text)
+
+
+async def datarequest(q, id=None, session=None):
+    """
+    Submit a query, or poll an existing request id, and parse the reply as it arrives
+    :return: (request id, complete, result)
+    """
+    if session is None:
+        session = get_session()
+    if id is None:
+        call = session.post(session.url(lim.lim_datarequests_path), headers=lim.headers, data=lim.datarequest_xml.format(q))
+    else:
+        call = session.get('{}/{}'.format(session.url(lim.lim_datarequests_path), id), headers=lim.headers)
+
+    start = time.perf_counter()
+    async with call as resp:
+        limmetrics.observe('datarequest.request', time.perf_counter() - start)
+        if resp.status != 200:
+            raise await _error(resp)
+        start = time.perf_counter()
+        parser = limparser.DataRequestParser()
+        async for chunk in resp.content.iter_chunked(limparser.chunk_size):
+            parser.feed(chunk)
+        parser.close()
+        limmetrics.observe('datarequest.parse', time.perf_counter() - start)
+    return lim.datarequest_result(parser)
+
+
+async def aquery(q, id=None, deadline=limpoll.deadline, poller=None, session=None):
+    """
+    lim.query without blocking: polls with asyncio.sleep. Served from the in-memory result cache when
+    limcache.enable_result_cache() is on.
+    :param session: AsyncLimSession, defaults to get_session()
+    """
+    if session is None:
+        session = get_session()
+    cache = limcache.result_cache
+    key = limcache.result_key(session.server, q)
+    if cache is not None and id is None:
+        found, res = cache.get(key)
+        if found:
+            return res
+
+    if poller is None:
+        poller = limpoll.PollScheduler(deadline)
+    with limmetrics.span('query'):
+        reqId, complete, res = await datarequest(q, id, session)
+        while not complete:
+            await asyncio.sleep(poller.next_delay())
+            reqId, complete, res = await datarequest(q, reqId, session)
+    limmetrics.count('query.polls', poller.polls)
+    logging.debug('Query complete after {} polls in {:.2f}s'.format(poller.polls, poller.elapsed))
+
+    if cache is not None and id is None:
+        cache.put(key, res if res is None else res.copy())
+    return res
+
+
+async def aquery_many(queries, deadline=limpoll.deadline, session=None):
+    """
+    Run queries concurrently
+    :return: list of results in input order, holding the Exception for any query that failed
+    """
+    return await asyncio.gather(*[aquery(q, deadline=deadline, session=session) for q in queries], return_exceptions=True)
+
+
+async def aseries(symbols, batch_size=None, errors='raise', format='wide', dtype=None, session=None):
+    """
+    lim.series without blocking, batches run concurrently
+    """
+    scall = symbols
+    if isinstance(scall, str):
+        scall = [scall]
+    if isinstance(scall, dict):
+        scall = list(scall.keys())
+    if batch_size is None:
+        batch_size = lim.series_batch_size
+
+    if len(scall) <= batch_size:
+        res = await aquery(lim.build_series_query(scall), session=session)
+    else:
+        batches = [scall[i:i + batch_size] for i in range(0, len(scall), batch_size)]
+        results = await aquery_many([lim.build_series_query(x) for x in batches], session=session)
+        for i, x in enumerate(results):
+            if isinstance(x, asyncio.CancelledError):
+                raise x
+            if format != 'wide' and x is not None and not isinstance(x, BaseException):
+                results[i] = limframe.CompactFrame.from_frame(x, dtype)
+        res = lim.join_batches(batches, results, errors)
+
+    if isinstance(symbols, dict) and res is not None:
+        res = res.rename(columns=symbols)
+    return limframe.convert(res, format, dtype)
+
+
+async def acurve(symbols, column='Close', curve_dates=None, session=None):
+    """
+    lim.curve without blocking (no cache_inc)
+    """
+    scall = symbols
+    if isinstance(scall, str):
+        scall = [scall]
+    if isinstance(scall, dict):
+        scall = list(scall.keys())
+
+    if curve_dates is not None and isinstance(curve_dates, list) and len(curve_dates) > 1:
+        q = lim.build_curve_history_query(scall, column, curve_dates)
+    else:
+        q = lim.build_curve_query(scall, column, curve_dates)
+    return lim._trim_curve(await aquery(q, session=session), symbols)
+
+
+async def acontinuous_futures_rollover(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=None,
+                                       format='wide', dtype=None, session=None):
+    q = lim.build_continuous_futures_rollover_query(symbol, months=months, rollover_date=rollover_date, after_date=after_date)
+    return limframe.convert(await aquery(q, session=session), format, dtype)
+
+
+async def afetch_symbol_contracts(symbol, session=None):
+    """
+    lim.fetch_symbol_contracts without blocking
+    :return: list of (name, start date, end date)
+    """
+    if session is None:
+        session = get_session()
+    uri = session.url(lim.lim_schema_futurues_path.replace('<SYMBOL>', symbol))
+    with limmetrics.span('contract_list'):
+        async with session.get(uri, headers=lim.headers) as resp:
+            if resp.status != 200:
+                raise await _error(resp)
+            return lim.parse_contracts(await resp.text())
+
+
+async def afutures_contracts(symbol, start_year=None, end_year=None, format='wide', dtype=None, session=None):
+    """
+    lim.futures_contracts without blocking. The contract list comes from the contract index, fetched
+    when it is not fresh there.
+    """
+    year = date.today().year
+    start_year = year if start_year is None else start_year
+    end_year = year + 2 if end_year is None else end_year
+
+    if session is None:
+        session = get_session()
+    server = session.server
+    index = limcache.get_contract_index()
+    if not index.fresh(server, symbol):
+        try:
+            contracts = await afetch_symbol_contracts(symbol, session)
+        except Exception:
+            if index.fetched(server, symbol) is None:
+                raise
+            logging.warning('Could not refresh contracts of {}, using the stored list'.format(symbol))
+        else:
+            index.store(server, symbol, contracts)
+    contracts = index.contracts(server, symbol, start_year=start_year, end_year=end_year)
+    return await aseries(contracts, format=format, dtype=dtype, session=session)
+
+
+async def submit_chunk(body, session=None):
+    """
+    limuploader.submit_chunk without blocking
+    :return: (jobid, intStatus)
+    """
+    if session is None:
+        session = get_session()
+    url = '{}&parsername=DefaultParser'.format(session.url(limuploader.lim_upload_default_parser_path.format(session.username)))
+    with limmetrics.span('upload.submit'), limadmit.lane('upload'):
+        async with session.post(url, headers=limuploader.headers, data=body) as resp:
+            if resp.status != 200:
+                raise await _error(resp)
+            return limuploader.parse_submit(await resp.text())
+
+
+async def check_upload_status(jobid, session=None):
+    """
+    limuploader.check_upload_status without blocking
+    :return: (code, msg)
+    """
+    if session is None:
+        session = get_session()
+    url = '{}{}'.format(session.url(limuploader.lim_upload_status_path), jobid)
+    with limmetrics.span('upload.status'), limadmit.lane('upload'):
+        async with session.get(url, headers=lim.headers) as resp:
+            if resp.status != 200:
+                raise await _error(resp)
+            return limuploader.parse_upload_status(jobid, await resp.text())
+
+
+async def _upload_chunk(i, body, rows, cells, slots, deadline, session):
+    started = time.monotonic()
+    jobid, code, msg = None, None, None
+    try:
+        jobid, code = await submit_chunk(body, session)
+        if jobid is None:
+            raise Exception('Upload not accepted: intStatus {}'.format(code))
+        poller = limpoll.PollScheduler(deadline)
+        while True:
+            try:
+                code, msg = await check_upload_status(jobid, session) or (None, None)
+            except Exception as e:
+                if not limuploader._transient(e):
+                    raise
+                logging.warning('Status of jobid {} failed: {}'.format(jobid, e))
+                code, msg = None, None
+            if code in limuploader.done_codes:
+                limmetrics.count('upload.polls', poller.polls)
+                break
+            await asyncio.sleep(poller.next_delay())
+    except Exception as e:
+        return limuploader.ChunkReport(i, jobid, rows, cells, code, msg, time.monotonic() - started, e)
+    finally:
+        slots.release()
+    return limuploader.ChunkReport(i, jobid, rows, cells, code, msg, time.monotonic() - started, None)
+
+
+async def aupload_series(df, dfmeta, max_cells=None, max_bytes=None, max_in_flight=4, deadline=limpoll.deadline,
+                         errors='raise', session=None):
+    """
+    limuploader.upload_series without blocking: up to max_in_flight chunks are submitted and polled at once,
+    in the 'upload' admission lane
+    :return: list of ChunkReport in chunk order
+    """
+    slots = asyncio.Semaphore(max_in_flight)
+    jobs = []
+    try:
+        # the next body is only built once a slot is free, so at most max_in_flight + 1 are held
+        for i, (body, rows, cells) in enumerate(limuploader.frame_bodies(df, dfmeta, max_cells, max_bytes)):
+            await slots.acquire()
+            jobs.append(asyncio.ensure_future(_upload_chunk(i, body, rows, cells, slots, deadline, session)))
+        reports = await asyncio.gather(*jobs)
+    except BaseException:
+        for job in jobs:
+            job.cancel()
+        raise
+    return limuploader.finish_reports(list(reports), errors)
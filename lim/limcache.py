@@ -0,0 +1,733 @@
+"""
+Local stores for query results.
+
+A backend keeps date indexed frames under a key. append upserts cells (the last non-null write for a
+date and column wins) without rewriting what is already stored, read can be limited to a date range,
+and lock(key) gives an exclusive cross-process lock so several workers can share one cache root.
+
+ResultCache is an in-memory LRU/TTL cache for repeated identical queries within a process.
+
+ContractIndex persists the futures contracts of root symbols, with parsed year and month code, for
+contract_ttl seconds. CurveStore keeps forward curves by (symbol, column, curve date).
+"""
+import os
+import re
+import glob
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+lock_timeout = 600
+contract_ttl = 24 * 3600  # seconds before a root's contract list is fetched again
+contract_pattern = re.compile(r'_(\d{4})([FGHJKMNQUVXZ])$')
+
+
+def default_root():
+    """
+    Directory of the local stores: LIMCACHEDIR, else ~/.cache/lim
+    """
+    return os.getenv('LIMCACHEDIR') or os.path.join(os.path.expanduser('~'), '.cache', 'lim')
+
+
+class FileLock(object):
+    """
+    Exclusive lock on a file, shared between threads and processes (flock on posix, msvcrt on windows)
+    """
+
+    def __init__(self, path, timeout=lock_timeout, poll=0.05):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self._fh = None
+
+    def _try_lock(self):
+        if os.name == 'nt':
+            import msvcrt
+            try:
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                return False
+        else:
+            import fcntl
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except (IOError, OSError):
+                return False
+
+    def acquire(self):
+        self._fh = open(self.path, 'a+b')
+        started = time.monotonic()
+        while not self._try_lock():
+            if time.monotonic() - started > self.timeout:
+                self._fh.close()
+                self._fh = None
+                raise TimeoutError('Could not lock {} within {}s'.format(self.path, self.timeout))
+            time.sleep(self.poll)
+        return self
+
+    def release(self):
+        if self._fh is None:
+            return
+        if os.name == 'nt':
+            import msvcrt
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _last_wins(frames, columns):
+    res = pd.concat(frames, sort=False)
+    res = res.groupby(level=0, sort=True).last()
+    return res.reindex(columns=columns)
+
+
+def _slice(df, start, end):
+    if df is None:
+        return None
+    if start is not None or end is not None:
+        df = df.loc[start:end]
+    return df
+
+
+class CacheBackend(object):
+    """
+    Interface for incremental result stores
+    """
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else default_root()
+        os.makedirs(self.root, exist_ok=True)
+
+    def lock(self, key):
+        return FileLock(os.path.join(self.root, '{}.lock'.format(key)))
+
+    def read(self, key, start=None, end=None):
+        """
+        Stored frame for key, or None
+        :param start: first date to return
+        :param end: last date to return
+        """
+        raise NotImplementedError
+
+    def append(self, key, df):
+        """
+        Upsert the rows of df, a frame with a DatetimeIndex
+        """
+        raise NotImplementedError
+
+    def last_date(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ParquetCache(CacheBackend):
+    """
+    Directory of parquet files per key. Every append writes one new part named after its sequence number
+    and date range, so date range reads only open the parts that overlap and last_date only opens the newest one.
+    """
+    part_pattern = re.compile(r'^part-(\d+)-(\d{8})-(\d{8})\.parquet$')
+
+    def __init__(self, root=None):
+        if not has_pyarrow():
+            raise ImportError('ParquetCache requires pyarrow: pip install pyarrow')
+        super(ParquetCache, self).__init__(root)
+
+    def _parts(self, key):
+        parts = []
+        for path in glob.glob(os.path.join(self.root, key, 'part-*.parquet')):
+            m = self.part_pattern.match(os.path.basename(path))
+            if m:
+                seq, first, last = m.groups()
+                parts.append((int(seq), pd.Timestamp(first), pd.Timestamp(last), path))
+        return sorted(parts)
+
+    def read(self, key, start=None, end=None):
+        parts = self._parts(key)
+        if start is not None:
+            parts = [x for x in parts if x[2] >= pd.Timestamp(start).normalize()]
+        if end is not None:
+            parts = [x for x in parts if x[1] <= pd.Timestamp(end)]
+        if len(parts) == 0:
+            return None
+
+        frames = [pd.read_parquet(x[3]) for x in parts]
+        columns = list(dict.fromkeys(c for f in frames for c in f.columns))
+        return _slice(_last_wins(frames, columns), start, end)
+
+    def append(self, key, df):
+        if df is None or len(df) == 0:
+            return
+        os.makedirs(os.path.join(self.root, key), exist_ok=True)
+        parts = self._parts(key)
+        seq = parts[-1][0] + 1 if len(parts) > 0 else 0
+        name = 'part-{:06d}-{:%Y%m%d}-{:%Y%m%d}.parquet'.format(seq, df.index.min(), df.index.max())
+        path = os.path.join(self.root, key, name)
+        df.to_parquet(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def last_date(self, key):
+        parts = self._parts(key)
+        if len(parts) == 0:
+            return None
+        return self.read(key, start=max(x[2] for x in parts)).index[-1]
+
+    def compact(self, key):
+        """
+        Rewrite all parts of key into one
+        """
+        parts = self._parts(key)
+        if len(parts) < 2:
+            return
+        df = self.read(key)
+        self.append(key, df)
+        for part in parts:
+            os.remove(part[3])
+
+    def delete(self, key):
+        for part in self._parts(key):
+            os.remove(part[3])
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Single sqlite file holding every key in long format, one row per (key, date, column), indexed by date
+    """
+
+    def __init__(self, root=None, filename='lim_cache.sqlite'):
+        super(SQLiteCache, self).__init__(root)
+        self.path = os.path.join(self.root, filename)
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS cells (key TEXT, date INTEGER, col INTEGER, value REAL, '
+                        'PRIMARY KEY (key, date, col)) WITHOUT ROWID')
+            con.execute('CREATE TABLE IF NOT EXISTS columns (key TEXT, col INTEGER, name TEXT, '
+                        'PRIMARY KEY (key, col))')
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=lock_timeout)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def _columns(self, con, key):
+        return dict(con.execute('SELECT name, col FROM columns WHERE key = ? ORDER BY col', (key,)).fetchall())
+
+    def read(self, key, start=None, end=None):
+        sql = 'SELECT date, col, value FROM cells WHERE key = ?'
+        args = [key]
+        if start is not None:
+            sql += ' AND date >= ?'
+            args.append(int(pd.Timestamp(start).value))
+        if end is not None:
+            sql += ' AND date <= ?'
+            args.append(int(pd.Timestamp(end).value))
+
+        con = self._connect()
+        columns = self._columns(con, key)
+        rows = con.execute(sql, args).fetchall()
+        if len(rows) == 0:
+            return None
+
+        dates, cols, cells = zip(*rows)
+        dates, rowids = np.unique(np.array(dates, dtype=np.int64), return_inverse=True)
+        values = np.full((len(dates), len(columns)), np.nan)
+        values[rowids, np.array(cols, dtype=np.int64)] = np.array(cells, dtype=np.float64)
+        return pd.DataFrame(values, columns=list(columns), index=pd.to_datetime(dates), copy=False)
+
+    def append(self, key, df):
+        if df is None or len(df) == 0:
+            return
+        con = self._connect()
+        with con:
+            columns = self._columns(con, key)
+            for name in df.columns:
+                if name not in columns:
+                    columns[name] = len(columns)
+                    con.execute('INSERT INTO columns VALUES (?, ?, ?)', (key, columns[name], name))
+
+            values = df.to_numpy(dtype=np.float64)
+            rows, cols = np.nonzero(~np.isnan(values))
+            dates = df.index.values.astype('datetime64[ns]').astype(np.int64)
+            colids = np.array([columns[x] for x in df.columns])
+            con.executemany('INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)',
+                            zip([key] * len(rows), dates[rows].tolist(), colids[cols].tolist(), values[rows, cols].tolist()))
+
+    def last_date(self, key):
+        last = self._connect().execute('SELECT MAX(date) FROM cells WHERE key = ?', (key,)).fetchone()[0]
+        return None if last is None else pd.Timestamp(last)
+
+    def delete(self, key):
+        con = self._connect()
+        with con:
+            con.execute('DELETE FROM cells WHERE key = ?', (key,))
+            con.execute('DELETE FROM columns WHERE key = ?', (key,))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Cache backend used by query_cached, a SQLiteCache under default_root() by default
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = SQLiteCache()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def parse_contract(name):
+    """
+    Year and month code of a monthly contract name such as FB_2020Z
+    :return: (year, month code), or (None, None) for other contracts
+    """
+    m = contract_pattern.search(name)
+    if m is None:
+        return None, None
+    return int(m.group(1)), m.group(2)
+
+
+class ContractIndex(object):
+    """
+    Contract lists of root symbols per server in a sqlite file, with the parsed year and month code of
+    monthly contracts stored next to the names. A root is stale ttl seconds after it was stored.
+    """
+
+    def __init__(self, root=None, filename='lim_contracts.sqlite', ttl=contract_ttl):
+        self.root = root if root is not None else default_root()
+        os.makedirs(self.root, exist_ok=True)
+        self.path = os.path.join(self.root, filename)
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS roots (server TEXT, symbol TEXT, fetched REAL, '
+                        'PRIMARY KEY (server, symbol))')
+            con.execute('CREATE TABLE IF NOT EXISTS contracts (server TEXT, symbol TEXT, pos INTEGER, name TEXT, '
+                        'year INTEGER, month TEXT, start_date TEXT, end_date TEXT, PRIMARY KEY (server, symbol, pos))')
+            con.execute('CREATE INDEX IF NOT EXISTS contracts_year ON contracts (server, symbol, year)')
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=lock_timeout)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def fetched(self, server, symbol):
+        """
+        time.time() when symbol was stored, or None
+        """
+        row = self._connect().execute('SELECT fetched FROM roots WHERE server = ? AND symbol = ?', (server, symbol)).fetchone()
+        return None if row is None else row[0]
+
+    def fresh(self, server, symbol):
+        fetched = self.fetched(server, symbol)
+        return fetched is not None and time.time() - fetched < self.ttl
+
+    def store(self, server, symbol, contracts):
+        """
+        Replace the contracts of symbol
+        :param contracts: list of (name, start date, end date), dates as text or None
+        """
+        rows = []
+        for pos, (name, start, end) in enumerate(contracts):
+            year, month = parse_contract(name)
+            rows.append((server, symbol, pos, name, year, month, start, end))
+        con = self._connect()
+        with con:
+            con.execute('DELETE FROM contracts WHERE server = ? AND symbol = ?', (server, symbol))
+            con.executemany('INSERT INTO contracts VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            con.execute('INSERT OR REPLACE INTO roots VALUES (?, ?, ?)', (server, symbol, time.time()))
+
+    def contracts(self, server, symbol, monthly=False, start_year=None, end_year=None):
+        """
+        Contract names of symbol in stored order
+        :param monthly: only contracts with a year and month code
+        :param start_year: first expiry year, implies monthly
+        :param end_year: last expiry year, implies monthly
+        """
+        sql = 'SELECT name FROM contracts WHERE server = ? AND symbol = ?'
+        args = [server, symbol]
+        if monthly or start_year is not None or end_year is not None:
+            sql += ' AND year IS NOT NULL'
+        if start_year is not None:
+            sql += ' AND year >= ?'
+            args.append(int(start_year))
+        if end_year is not None:
+            sql += ' AND year <= ?'
+            args.append(int(end_year))
+        return [x[0] for x in self._connect().execute(sql + ' ORDER BY pos', args).fetchall()]
+
+    def metadata(self, server, symbol):
+        """
+        DataFrame of name, year, month, start_date and end_date for every contract of symbol
+        """
+        rows = self._connect().execute('SELECT name, year, month, start_date, end_date FROM contracts '
+                                       'WHERE server = ? AND symbol = ? ORDER BY pos', (server, symbol)).fetchall()
+        df = pd.DataFrame(rows, columns=['name', 'year', 'month', 'start_date', 'end_date'])
+        df['year'] = df['year'].astype('Int64')
+        for col in ('start_date', 'end_date'):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        return df
+
+    def invalidate(self, server=None, symbol=None):
+        """
+        Drop stored contracts, of one symbol and/or server, or all of them
+        """
+        where, args = [], []
+        if server is not None:
+            where.append('server = ?')
+            args.append(server)
+        if symbol is not None:
+            where.append('symbol = ?')
+            args.append(symbol)
+        sql = ' WHERE ' + ' AND '.join(where) if where else ''
+        con = self._connect()
+        with con:
+            con.execute('DELETE FROM contracts' + sql, args)
+            con.execute('DELETE FROM roots' + sql, args)
+
+
+_contract_index = None
+
+
+def get_contract_index():
+    """
+    ContractIndex used by lim.get_symbol_contract_list, under default_root() by default
+    """
+    global _contract_index
+    if _contract_index is None:
+        with _backend_lock:
+            if _contract_index is None:
+                _contract_index = ContractIndex()
+    return _contract_index
+
+
+def set_contract_index(index):
+    global _contract_index
+    with _backend_lock:
+        _contract_index = index
+
+
+class CurveStore(object):
+    """
+    Forward curves in a sqlite file, one per (server, symbol, column, curve date). A curve date is
+    stored once fetched, so it is not asked for again; storing None records a date known to have no curve.
+    """
+
+    def __init__(self, root=None, filename='lim_curves.sqlite'):
+        self.root = root if root is not None else default_root()
+        os.makedirs(self.root, exist_ok=True)
+        self.path = os.path.join(self.root, filename)
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS curve_dates (server TEXT, symbol TEXT, col TEXT, curve_date INTEGER, '
+                        'PRIMARY KEY (server, symbol, col, curve_date)) WITHOUT ROWID')
+            con.execute('CREATE TABLE IF NOT EXISTS curves (server TEXT, symbol TEXT, col TEXT, curve_date INTEGER, '
+                        'date INTEGER, value REAL, PRIMARY KEY (server, symbol, col, curve_date, date)) WITHOUT ROWID')
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=lock_timeout)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def missing(self, server, symbol, column, curve_dates):
+        """
+        Curve dates not stored yet, in the given order
+        """
+        con = self._connect()
+        stored = set(x[0] for x in con.execute('SELECT curve_date FROM curve_dates WHERE server = ? AND symbol = ? AND col = ?',
+                                               (server, symbol, column)).fetchall())
+        return [x for x in curve_dates if pd.Timestamp(x).value not in stored]
+
+    def store(self, server, symbol, column, curves):
+        """
+        :param curves: {curve date: Series of values by delivery date, or None for no curve}
+        """
+        rows, dates = [], []
+        for curve_date, values in curves.items():
+            cd = pd.Timestamp(curve_date).value
+            dates.append((server, symbol, column, cd))
+            if values is not None:
+                values = values.dropna()
+                rows.extend(zip([cd] * len(values), values.index.values.astype('datetime64[ns]').astype(np.int64).tolist(),
+                                values.to_numpy(dtype=np.float64).tolist()))
+        con = self._connect()
+        with con:
+            con.executemany('INSERT OR REPLACE INTO curve_dates VALUES (?, ?, ?, ?)', dates)
+            con.executemany('INSERT OR REPLACE INTO curves VALUES (?, ?, ?, ?, ?, ?)',
+                            [(server, symbol, column, cd, d, v) for cd, d, v in rows])
+
+    def read(self, server, symbol, column, curve_dates):
+        """
+        Stored curves among curve_dates that have points
+        :return: DataFrame indexed by delivery date with a column per curve date, in curve date order
+        """
+        keys = sorted(set(pd.Timestamp(x).value for x in curve_dates))
+        con = self._connect()
+        rows = []
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows.extend(con.execute('SELECT curve_date, date, value FROM curves WHERE server = ? AND symbol = ? AND col = ? '
+                                    'AND curve_date IN ({})'.format(','.join('?' * len(part))),
+                                    [server, symbol, column] + part).fetchall())
+        if len(rows) == 0:
+            return pd.DataFrame()
+
+        cds, dates, cells = zip(*rows)
+        cds, colids = np.unique(np.array(cds, dtype=np.int64), return_inverse=True)
+        dates, rowids = np.unique(np.array(dates, dtype=np.int64), return_inverse=True)
+        values = np.full((len(dates), len(cds)), np.nan)
+        values[rowids, colids] = np.array(cells, dtype=np.float64)
+        return pd.DataFrame(values, columns=pd.to_datetime(cds), index=pd.to_datetime(dates), copy=False)
+
+    def invalidate(self, server=None, symbol=None):
+        where, args = [], []
+        if server is not None:
+            where.append('server = ?')
+            args.append(server)
+        if symbol is not None:
+            where.append('symbol = ?')
+            args.append(symbol)
+        sql = ' WHERE ' + ' AND '.join(where) if where else ''
+        con = self._connect()
+        with con:
+            con.execute('DELETE FROM curves' + sql, args)
+            con.execute('DELETE FROM curve_dates' + sql, args)
+
+
+_curve_store = None
+
+
+def get_curve_store():
+    """
+    CurveStore used by lim.curve_cached, under default_root() by default
+    """
+    global _curve_store
+    if _curve_store is None:
+        with _backend_lock:
+            if _curve_store is None:
+                _curve_store = CurveStore()
+    return _curve_store
+
+
+def set_curve_store(store):
+    global _curve_store
+    with _backend_lock:
+        _curve_store = store
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 0
+
+
+def _copy(value):
+    return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResultCache(object):
+    """
+    In-memory LRU cache of query results bounded by total size, with a time to live per entry.
+    Concurrent misses on the same key collapse into a single call (single-flight).
+    Callers always get a copy, so mutating a result does not change the cached one.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.collapsed = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, size, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            self.bytes -= size
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key):
+        """
+        :return: (found, copy of the value)
+        """
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found, _copy(value)
+
+    def put(self, key, value, ttl=None):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size, expires)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def get_or_call(self, key, fn, ttl=None):
+        """
+        Cached value for key, otherwise the result of fn(). Only one caller runs fn for a key at a time,
+        the others wait for its result.
+        """
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                self.hits += 1
+                return _copy(value)
+            self.misses += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            call.result = fn()
+            self.put(key, call.result, ttl)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+        return _copy(call.result)
+
+    def invalidate(self, key=None):
+        """
+        Drop one key, or everything
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.bytes -= old[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'collapsed': self.collapsed,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+            }
+
+
+result_cache = None
+
+
+def enable_result_cache(max_bytes=256 * 1024 ** 2, ttl=300):
+    """
+    Turn on the process level result cache used by lim.query and everything built on it
+    :param max_bytes: memory budget for cached frames
+    :param ttl: seconds an entry stays valid
+    :return: ResultCache
+    """
+    global result_cache
+    result_cache = ResultCache(max_bytes, ttl)
+    return result_cache
+
+
+def disable_result_cache():
+    global result_cache
+    result_cache = None
+
+
+def normalize_query(q):
+    return ' '.join(q.split())
+
+
+def result_key(server, q):
+    """
+    Result cache key of a query on a server
+    """
+    return server, normalize_query(q)
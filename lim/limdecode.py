@@ -0,0 +1,155 @@
+"""
+Decoding of large DataRequest replies in a process pool. With a ProcessDecoder enabled, lim.datarequest
+buffers a reply and, once it passes threshold bytes, hands the body to a worker process instead of
+parsing it inline. The worker parses it into a float64 array in a multiprocessing.shared_memory segment,
+and the parent wraps that segment as the DataFrame's values without copying. Smaller replies keep the
+inline streaming parse.
+
+    limdecode.enable(processes=4)
+    df = lim.futures_contracts('FB', 2000, 2030)
+
+Where POSIX shared memory shows up as files (shm_dir, as on Linux) the parent maps the segment directly
+and it is freed with the last array viewing it; elsewhere the values are copied out once.
+"""
+import os
+import logging
+from lim import limparser
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+threshold = 4 * 1024 ** 2  # reply bytes from which decoding goes to the pool
+shm_dir = '/dev/shm'
+
+decoder = None
+
+
+def _shared_memory(size):
+    from multiprocessing import shared_memory, resource_tracker
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        # the parent takes the segment over and unlinks it, this process must not clean it up at exit
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def decode(body):
+    """
+    Worker side: parse a DataRequest reply into a shared memory segment
+    :param body: reply bytes
+    :return: (status, id, statusMsg, columns, dates as datetime64, segment name or None, shape)
+    """
+    parser = limparser.parse_datarequest([body])
+    if parser.status != 100 or len(parser.columns) == 0 or len(parser.dates) == 0:
+        return parser.status, parser.id, parser.statusMsg, [], None, None, (0, 0)
+
+    values = parser.values()
+    shm = _shared_memory(values.nbytes)
+    np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+    name = shm.name
+    shm.close()
+    return parser.status, parser.id, parser.statusMsg, parser.columns, limparser.parse_dates(parser.dates).values, name, values.shape
+
+
+def attach(name, shape):
+    """
+    Parent side: the float64 array in a segment made by decode, which is unlinked
+    """
+    path = os.path.join(shm_dir, name.lstrip('/'))
+    if os.path.exists(path):
+        # the mapping outlives the unlinked name and is released with the last view of the array
+        values = np.memmap(path, dtype=np.float64, mode='r+', shape=shape)
+        os.unlink(path)
+        return values.view(np.ndarray)
+
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class DecodedReply(object):
+    """
+    A reply decoded by a worker, read like a limparser.DataRequestParser by lim.datarequest_result
+    """
+
+    def __init__(self, status, id, statusMsg, columns, dates, name, shape):
+        self.status = status
+        self.id = id
+        self.statusMsg = statusMsg
+        self.columns = columns
+        self.dates = dates
+        self._values = attach(name, shape) if name is not None else None
+
+    def values(self):
+        return self._values
+
+    def dataframe(self):
+        if self._values is None:
+            return  # no data
+        return pd.DataFrame(self._values, columns=self.columns, index=pd.DatetimeIndex(self.dates), copy=False)
+
+
+class ProcessDecoder(object):
+    """
+    :param processes: worker processes, defaults to the number of cpus
+    :param threshold: reply bytes from which decoding goes to the pool
+    """
+
+    def __init__(self, processes=None, threshold=threshold):
+        self.processes = processes or os.cpu_count()
+        self.threshold = threshold
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawned, as forking a process with live connection pools and threads is unsafe
+        self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+
+    def decode(self, body):
+        """
+        :return: DecodedReply
+        """
+        return DecodedReply(*self._pool.submit(decode, body).result())
+
+    def parse(self, chunks):
+        """
+        Parse a reply arriving in chunks: inline if it stays under threshold bytes, in the pool otherwise
+        :return: DataRequestParser or DecodedReply
+        """
+        head, size = [], 0
+        chunks = iter(chunks)
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.threshold:
+                head.extend(chunks)
+                logging.debug('Decoding {} byte reply in the process pool'.format(sum(len(x) for x in head)))
+                return self.decode(b''.join(head))
+        return limparser.parse_datarequest(head)
+
+    def close(self):
+        self._pool.shutdown()
+
+
+def enable(processes=None, threshold=threshold):
+    """
+    Decode large replies of lim queries in a process pool from now on
+    :return: the ProcessDecoder
+    """
+    global decoder
+    disable()
+    decoder = ProcessDecoder(processes, threshold)
+    return decoder
+
+
+def disable():
+    global decoder
+    previous, decoder = decoder, None
+    if previous is not None:
+        previous.close()
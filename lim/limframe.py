@@ -0,0 +1,145 @@
+"""
+Compact result formats for wide, mostly empty frames such as futures strips, where every contract
+only has prices for the few years it trades.
+
+CompactFrame keeps only the non-null points: one values array and one dates array holding the points
+of every symbol back to back, with offsets marking where each symbol's run starts, so a symbol's
+series is a slice of both. to_wide() rebuilds the usual frame, to_long() gives a tidy frame with a
+categorical symbol column.
+"""
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+formats = ('wide', 'compact', 'long', 'sparse')
+
+
+class CompactFrame(object):
+    """
+    :param symbols: symbol names, in column order
+    :param offsets: start of each symbol's points in dates/values, plus the total length
+    :param dates: datetime64[ns] per point, ascending within each symbol
+    :param values: float per point
+    """
+
+    def __init__(self, symbols, offsets, dates, values):
+        self.symbols = pd.Index(symbols)
+        self.offsets = offsets
+        self.dates = dates
+        self.values = values
+
+    @classmethod
+    def from_frame(cls, df, dtype=None):
+        """
+        :param df: date indexed frame, one column per symbol
+        :param dtype: dtype of the stored values, float64 by default or float32 to halve them
+        """
+        dtype = np.float64 if dtype is None else dtype
+        values = df.to_numpy(dtype=np.float64)
+        mask = ~np.isnan(values)
+        cols, rows = np.nonzero(mask.T)
+        offsets = np.zeros(len(df.columns) + 1, dtype=np.int64)
+        np.cumsum(mask.sum(axis=0), out=offsets[1:])
+        dates = df.index.values.astype('datetime64[ns]')[rows]
+        return cls(df.columns, offsets, dates, values[rows, cols].astype(dtype, copy=False))
+
+    @classmethod
+    def concat(cls, frames):
+        """
+        Join frames holding different symbols
+        """
+        frames = [x for x in frames if x is not None]
+        symbols = [s for x in frames for s in x.symbols]
+        if len(set(symbols)) != len(symbols):
+            raise ValueError('CompactFrame.concat needs distinct symbols')
+        if len(frames) == 0:
+            return cls([], np.zeros(1, dtype=np.int64), np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.float64))
+        starts = np.cumsum([0] + [len(x.values) for x in frames[:-1]])
+        offsets = np.concatenate([x.offsets[:-1] + start for x, start in zip(frames, starts)] + [[sum(len(x.values) for x in frames)]])
+        return cls(symbols, offsets.astype(np.int64), np.concatenate([x.dates for x in frames]),
+                   np.concatenate([x.values for x in frames]))
+
+    @property
+    def columns(self):
+        return self.symbols
+
+    @property
+    def codes(self):
+        """
+        Symbol position of every point
+        """
+        codes_dtype = np.int16 if len(self.symbols) < 2 ** 15 else np.int32
+        return np.repeat(np.arange(len(self.symbols), dtype=codes_dtype), np.diff(self.offsets))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    def __getitem__(self, symbol):
+        i = self.symbols.get_loc(symbol)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return pd.Series(self.values[start:end], index=pd.DatetimeIndex(self.dates[start:end]), name=symbol, copy=False)
+
+    def __repr__(self):
+        return '<CompactFrame {} symbols, {} points, {}>'.format(len(self.symbols), len(self.values), self.values.dtype)
+
+    def rename(self, columns):
+        """
+        :param columns: dict of symbol to new name
+        """
+        return CompactFrame([columns.get(x, x) for x in self.symbols], self.offsets, self.dates, self.values)
+
+    def memory_usage(self):
+        """
+        Bytes held by the arrays
+        """
+        return int(self.offsets.nbytes + self.dates.nbytes + self.values.nbytes)
+
+    def to_wide(self, dtype=None):
+        """
+        The usual frame: union of dates by symbol, NaN where a symbol has no point
+        :param dtype: value dtype, float64 when None
+        """
+        dtype = np.float64 if dtype is None else dtype
+        index, rows = np.unique(self.dates, return_inverse=True)
+        values = np.full((len(index), len(self.symbols)), np.nan, dtype=dtype)
+        values[rows, self.codes] = self.values
+        return pd.DataFrame(values, index=pd.DatetimeIndex(index), columns=self.symbols, copy=False)
+
+    def to_long(self):
+        """
+        Tidy frame of date, symbol (categorical over symbols) and value, one row per point
+        """
+        symbol = pd.Categorical.from_codes(self.codes, categories=self.symbols)
+        return pd.DataFrame({'date': self.dates, 'symbol': symbol, 'value': self.values})
+
+
+def convert(df, format='wide', dtype=None):
+    """
+    Convert a wide result frame
+    :param format: 'wide', 'compact' (CompactFrame), 'long' (CompactFrame.to_long) or 'sparse'
+        (frame of pandas sparse columns)
+    :param dtype: value dtype, e.g. np.float32; unchanged for 'wide' and float64 otherwise when None
+    :return:
+    """
+    if format not in formats:
+        raise ValueError('format must be one of {}'.format(', '.join(formats)))
+    if df is None or isinstance(df, CompactFrame):
+        return df if format == 'compact' or df is None else _from_compact(df, format, dtype)
+    if format == 'wide':
+        return df if dtype is None else df.astype(dtype)
+    if format == 'sparse':
+        return df.astype(pd.SparseDtype(np.float64 if dtype is None else dtype, np.nan))
+    compact = CompactFrame.from_frame(df, dtype)
+    return compact if format == 'compact' else compact.to_long()
+
+
+def _from_compact(compact, format, dtype):
+    if format == 'long':
+        return compact.to_long()
+    df = compact.to_wide(np.float64 if dtype is None else dtype)
+    return df if format == 'wide' else convert(df, format, dtype)
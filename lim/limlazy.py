@@ -0,0 +1,46 @@
+"""
+Deferred imports. pandas, numpy, lxml and requests take most of a second to import, so the lim modules
+bind them to LazyModule stand-ins that import on first attribute access. Processes that only build
+query texts never load them.
+"""
+import importlib
+
+
+class LazyModule(object):
+    """
+    Stand-in for a module, imported on first attribute access
+    :param name: dotted module name
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        # import_module holds the import lock, concurrent first uses get the same module
+        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attr)
+
+    def __dir__(self):
+        return dir(self._module if self._module is not None else self._load())
+
+    def __repr__(self):
+        return '<lazy module {!r}{}>'.format(self._name, '' if self._module is None else ' (loaded)')
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+
+def lazy_import(name):
+    """
+    :param name: dotted module name
+    :return: LazyModule
+    """
+    return LazyModule(name)
@@ -0,0 +1,269 @@
+"""
+Timing spans and counters for the query and upload hot paths.
+
+Instrumented code calls span(name) around a phase and count(name) for events. Nothing is recorded
+until a collector is added: with none, span returns a shared no-op context manager and count returns
+immediately. MemoryCollector keeps recent durations per span for percentiles, and can be exported as
+Prometheus text; OpenTelemetryCollector forwards to an OpenTelemetry meter.
+
+    collector = limmetrics.enable()
+    lim.query(q)
+    print(collector.summary())
+
+Spans: query, query_many, datarequest.request (until the response headers), datarequest.parse (body download and
+parsing), build_dataframe, query_cached, query_cached.lock, query_cached.append, query_cached.read,
+contract_list, upload.chunk, upload.build_xml, upload.submit, upload.status, admission.wait.
+Counters: query.polls, query.coalesced, query.window.retries, datarequest.pending, upload.polls, upload.cells,
+admission.rejected, admission.short_circuited, admission.opened, <span>.errors.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+max_samples = 10000  # durations kept per span by MemoryCollector
+quantiles = (0.5, 0.9, 0.99)
+
+_collectors = []
+_null = nullcontext()
+
+
+class _Span(object):
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            count('{}.errors'.format(self.name), **self.labels)
+        return False
+
+
+def span(name, **labels):
+    """
+    Context manager timing the enclosed block
+    :param name: phase name
+    :param labels: extra dimensions, e.g. status
+    """
+    if not _collectors:
+        return _null
+    return _Span(name, labels)
+
+
+def observe(name, seconds, **labels):
+    """
+    Record a duration measured elsewhere
+    """
+    for collector in _collectors:
+        collector.observe(name, seconds, labels)
+
+
+def count(name, value=1, **labels):
+    """
+    Add value to a counter
+    """
+    if not _collectors:
+        return
+    for collector in _collectors:
+        collector.count(name, value, labels)
+
+
+def enabled():
+    return len(_collectors) > 0
+
+
+def add_collector(collector):
+    global _collectors
+    # replaced rather than mutated so threads iterating the old list are unaffected
+    _collectors = _collectors + [collector]
+    return collector
+
+
+def remove_collector(collector):
+    global _collectors
+    _collectors = [x for x in _collectors if x is not collector]
+
+
+def enable(collector=None):
+    """
+    Start recording, by default into a new MemoryCollector
+    :return: the collector
+    """
+    return add_collector(MemoryCollector() if collector is None else collector)
+
+
+def disable():
+    """
+    Stop recording and drop every collector
+    """
+    global _collectors
+    _collectors = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+class Collector(object):
+    """
+    Receives every span duration and counter increment
+    """
+
+    def observe(self, name, seconds, labels):
+        raise NotImplementedError
+
+    def count(self, name, value, labels):
+        raise NotImplementedError
+
+
+class MemoryCollector(Collector):
+    """
+    Keeps the last max_samples durations of every span (and label set) and the running totals of
+    every counter
+    """
+
+    def __init__(self, max_samples=max_samples):
+        self.max_samples = max_samples
+        self._durations = {}
+        self._totals = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels):
+        key = _key(name, labels)
+        with self._lock:
+            samples = self._durations.get(key)
+            if samples is None:
+                samples = self._durations[key] = deque(maxlen=self.max_samples)
+                self._totals[key] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[key]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, name, value, labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+            self._counters.clear()
+
+    def durations(self, name, **labels):
+        with self._lock:
+            return list(self._durations.get(_key(name, labels), ()))
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def summary(self):
+        """
+        Per span count, total and mean seconds and the seconds at each of quantiles (over the kept
+        samples), plus counter values
+        :return: {'spans': {(name, labels): {...}}, 'counters': {(name, labels): value}}
+        """
+        with self._lock:
+            durations = dict((k, list(v)) for k, v in self._durations.items())
+            totals = dict((k, tuple(v)) for k, v in self._totals.items())
+            counters = dict(self._counters)
+
+        spans = {}
+        for key, samples in durations.items():
+            n, total = totals[key]
+            stats = {'count': n, 'total': total, 'mean': total / n}
+            for q, v in zip(quantiles, np.quantile(samples, quantiles)):
+                stats['p{:g}'.format(q * 100)] = float(v)
+            stats['max'] = max(samples)
+            spans[key] = stats
+        return {'spans': spans, 'counters': counters}
+
+    def to_frame(self):
+        """
+        Span summary as a DataFrame indexed by span name and labels
+        """
+        spans = self.summary()['spans']
+        index = ['{}{}'.format(name, _prometheus_labels(labels)) for name, labels in spans]
+        return pd.DataFrame(list(spans.values()), index=index).sort_index()
+
+    def prometheus(self, prefix='lim'):
+        """
+        Prometheus text exposition: a summary per span in seconds, a counter per counter
+        """
+        report = self.summary()
+        out = []
+        for name in sorted(set(k[0] for k in report['spans'])):
+            metric = _metric_name(prefix, name) + '_seconds'
+            out.append('# TYPE {} summary'.format(metric))
+            for key in sorted(k for k in report['spans'] if k[0] == name):
+                stats = report['spans'][key]
+                for q in quantiles:
+                    out.append('{}{} {!r}'.format(metric, _prometheus_labels(key[1] + (('quantile', str(q)),)),
+                                                  stats['p{:g}'.format(q * 100)]))
+                out.append('{}_sum{} {!r}'.format(metric, _prometheus_labels(key[1]), stats['total']))
+                out.append('{}_count{} {}'.format(metric, _prometheus_labels(key[1]), stats['count']))
+        for name in sorted(set(k[0] for k in report['counters'])):
+            metric = _metric_name(prefix, name) + '_total'
+            out.append('# TYPE {} counter'.format(metric))
+            for key in sorted(k for k in report['counters'] if k[0] == name):
+                out.append('{}{} {}'.format(metric, _prometheus_labels(key[1]), report['counters'][key]))
+        return '\n'.join(out) + '\n'
+
+
+def _metric_name(prefix, name):
+    return '{}_{}'.format(prefix, name).replace('.', '_').replace('-', '_')
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                    for k, v in labels))
+
+
+class OpenTelemetryCollector(Collector):
+    """
+    Forward spans to OpenTelemetry histograms (seconds) and counters. Needs the opentelemetry-api
+    package; instruments are created on first use.
+    :param meter: opentelemetry Meter, defaults to the global meter provider's 'lim' meter
+    """
+
+    def __init__(self, meter=None, prefix='lim'):
+        if meter is None:
+            from opentelemetry import metrics
+            meter = metrics.get_meter('lim')
+        self.meter = meter
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _instrument(self, cache, factory, name, unit):
+        instrument = cache.get(name)
+        if instrument is None:
+            with self._lock:
+                instrument = cache.get(name)
+                if instrument is None:
+                    instrument = cache[name] = factory(_metric_name(self.prefix, name), unit=unit)
+        return instrument
+
+    def observe(self, name, seconds, labels):
+        self._instrument(self._histograms, self.meter.create_histogram, name, 's').record(seconds, attributes=labels or None)
+
+    def count(self, name, value, labels):
+        self._instrument(self._counters, self.meter.create_counter, name, '1').add(value, attributes=labels or None)
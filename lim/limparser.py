@@ -0,0 +1,163 @@
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+etree = lazy_import('lxml.etree')
+
+
+chunk_size = 64 * 1024
+rowdate_format = '%Y-%m-%dT%H:%M:%S'
+
+
+def parse_dates(dates):
+    """
+    Convert RowDates texts to a DatetimeIndex in one pass, using the LIM format and falling back to inference
+    :param dates: list of strings
+    :return:
+    """
+    try:
+        return pd.to_datetime(dates, format=rowdate_format)
+    except (ValueError, TypeError):
+        return pd.to_datetime(dates)
+
+
+def to_float(texts):
+    """
+    Convert value texts to a float64 array, missing or non-numeric cells become NaN
+    :param texts: list of strings
+    :return:
+    """
+    try:
+        return np.array(texts, dtype=np.float64)
+    except (ValueError, TypeError):
+        return pd.to_numeric(pd.Series(texts, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+
+
+_xpaths = {}
+
+
+def _xpath(expr, **kwargs):
+    # compiled once, on first use
+    xpath = _xpaths.get(expr)
+    if xpath is None:
+        xpath = _xpaths[expr] = etree.XPath(expr, **kwargs)
+    return xpath
+
+
+def _column_headings(node):
+    return _xpath('descendant::ColumnHeadings/text()', smart_strings=False)(node)
+
+
+def _row_dates(node):
+    return _xpath('descendant::RowDates/text()', smart_strings=False)(node)
+
+
+def _values(node):
+    return _xpath('descendant::Values/text()', smart_strings=False)(node)
+
+
+def _count_values(node):
+    return _xpath('count(descendant::Values)')(node)
+
+
+def value_texts(node):
+    """
+    Texts of every Values element below node, in document order
+    :param node: lxml element
+    :return: list of strings, None for empty elements
+    """
+    texts = _values(node)
+    if len(texts) != _count_values(node):
+        texts = [x.text for x in node.iter(tag='Values')]  # some Values are empty
+    return texts
+
+
+class DataRequestParser(object):
+    """
+    Incremental parser for DataRequest responses. Feed it the body chunk by chunk: finished elements are
+    cut out of the partial tree after every chunk, their values converted in one go and written straight
+    into a float64 buffer, allocated with the first values and reshaped to (dates, columns) at the end, so
+    the full XML tree is never held in memory.
+    """
+
+    def __init__(self, capacity=64 * 1024):
+        self.status = None
+        self.id = None
+        self.statusMsg = None
+        self.columns = []
+        self.dates = []
+        self._parser = etree.XMLPullParser(events=('start',), tag='DataRequest')
+        self._root = None
+        self._capacity = capacity
+        self._values = None  # status replies carry no values and never allocate
+        self._count = 0
+
+    def _reserve(self, size):
+        if self._values is None:
+            self._values = np.full(max(size, self._capacity), np.nan)
+        elif size > len(self._values):
+            grown = np.full(max(size, 2 * len(self._values)), np.nan)
+            grown[:self._count] = self._values[:self._count]
+            self._values = grown
+
+    def _write(self, texts):
+        values = to_float(texts)
+        end = self._count + len(values)
+        self._reserve(end)
+        self._values[self._count:end] = values
+        self._count = end
+
+    def _drain(self, node, complete):
+        # move every finished subtree out of the partial tree and read it in one xpath call per tag.
+        # the last child on each level may still be open, so it waits for the next chunk unless complete
+        done = etree.Element('done')
+        while node is not None and len(node) > 0:
+            last = node[-1]
+            done.extend(node[:] if complete else node[:-1])
+            node = None if complete else last
+
+        self.columns.extend(_column_headings(done))
+        self.dates.extend(_row_dates(done))
+        texts = value_texts(done)
+        if len(texts) > 0:
+            self._write(texts)
+
+    def feed(self, data):
+        self._parser.feed(data)
+        for event, el in self._parser.read_events():
+            self._root = el
+        if self._root is not None:
+            self._drain(self._root, False)
+
+    def close(self):
+        root = self._parser.close()
+        self._drain(root, True)
+        self.status = int(root.attrib['status'])
+        self.id = root.attrib.get('id')
+        self.statusMsg = root.attrib.get('statusMsg')
+
+    def values(self):
+        rows, cols = len(self.dates), len(self.columns)
+        size = rows * cols
+        if self._count != size:
+            raise ValueError('Malformed reply: {} values for {} dates and {} columns'.format(self._count, rows, cols))
+        self._reserve(size)
+        return self._values[:size].reshape(rows, cols)
+
+    def dataframe(self):
+        if len(self.columns) == 0 or len(self.dates) == 0:
+            return  # no data
+        return pd.DataFrame(self.values(), columns=self.columns, index=parse_dates(self.dates), copy=False)
+
+
+def parse_datarequest(chunks):
+    """
+    Parse a DataRequest response from an iterable of byte chunks
+    :param chunks: e.g. resp.iter_content(chunk_size)
+    :return: DataRequestParser
+    """
+    parser = DataRequestParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return parser
@@ -0,0 +1,331 @@
+"""
+Query coalescing. With a Coalescer enabled, query() holds every query it can parse (the SHOW, LET and
+WHEN forms the lim query builders produce) for a short window. Queries with the same WHEN clause are
+merged into one DataRequest, with duplicate LET definitions and SHOW expressions sent once, and the
+result is split back out per caller.
+
+    limplanner.enable(window=0.02)
+    # concurrent series / curve / continuous_futures_rollover calls now share DataRequests
+    limplanner.coalescer.stats()
+
+A caller gets the rows where at least one of its columns has a value, which is what LIM returns for
+the query on its own. If a merged request fails, its queries are retried one by one so a bad symbol
+only fails its own caller.
+"""
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from lim import limmetrics
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+window = 0.02  # seconds a query waits for others to merge with
+max_shows = 500  # SHOW columns per merged query
+
+coalescer = None
+
+_sections = re.compile(r'^\s*(LET|SHOW|WHEN)\b', re.I | re.M)
+_let = re.compile(r'^(ATTR\s+)?([A-Za-z_]\w*)\s*=\s*(.+?)\s*$', re.I)
+_show = re.compile(r'^([^:\s][^:]*?)\s*:\s*([^:]+?)\s*$')
+_defined = re.compile(r'^([A-Za-z_]\w*)\s+is\s+DEFINED(\s+OR)?$', re.I)
+_row_filter = re.compile(r'^date\s+is\s+(after|before)\s+\S+$', re.I)
+
+
+class QuerySpec(object):
+    """
+    Parsed query: lets as (attr, name, definition), shows as (label, expression), and either defined
+    (names in a WHEN x is DEFINED OR ... clause) or a row filter WHEN clause
+    """
+
+    def __init__(self, lets, shows, defined, row_filter):
+        self.lets = lets
+        self.shows = shows
+        self.defined = defined
+        self.row_filter = row_filter
+
+    @property
+    def key(self):
+        # queries merge when they share this
+        if self.defined:
+            return 'defined'
+        return 'when ' + ' '.join(self.row_filter.lower().split()) if self.row_filter else 'show'
+
+
+def _shadows(lets):
+    # a LET name also used as a symbol, as in FP = FP(...) or FP_M2 = FP(...): merging renames LET names
+    # in later definitions, which would turn the symbol into the renamed series
+    names = [x[1] for x in lets]
+    for _, name, definition in lets:
+        if re.search(r'\b{}\b'.format(re.escape(name)), definition):
+            return True
+        if any(re.search(r'\b{}\s*\('.format(re.escape(x)), definition) for x in names):
+            return True
+    return False
+
+
+def parse_query(q):
+    """
+    :return: QuerySpec, or None when q is not in a form that can be merged, which includes LET names
+             shadowing symbols
+    """
+    parts = _sections.split(q)
+    if parts[0].strip() or len(parts) < 3:
+        return None
+    sections = {}
+    for keyword, body in zip(parts[1::2], parts[2::2]):
+        keyword = keyword.upper()
+        if keyword in sections:
+            return None
+        sections[keyword] = [x.strip() for x in body.strip().splitlines() if x.strip()]
+    if not sections.get('SHOW'):
+        return None
+
+    lets = []
+    for line in sections.get('LET', []):
+        m = _let.match(line)
+        if m is None:
+            return None
+        lets.append(((m.group(1) or '').strip(), m.group(2), m.group(3)))
+    if _shadows(lets):
+        return None
+
+    shows = []
+    for line in sections['SHOW']:
+        m = _show.match(line)
+        if m is None:
+            return None
+        shows.append((m.group(1), m.group(2)))
+    if len(set(x[0] for x in shows)) != len(shows):
+        return None
+
+    defined, row_filter = [], None
+    whens = sections.get('WHEN', [])
+    if len(whens) > 0:
+        matches = [_defined.match(x) for x in whens]
+        if all(m is not None for m in matches):
+            defined = [m.group(1) for m in matches]
+        elif len(whens) == 1 and _row_filter.match(whens[0]):
+            row_filter = whens[0]
+        else:
+            return None
+    return QuerySpec(lets, shows, defined, row_filter)
+
+
+def _renamer(names):
+    if not names:
+        return lambda text: text
+    pattern = re.compile(r'\b({})\b'.format('|'.join(re.escape(x) for x in sorted(names, key=len, reverse=True))))
+    return lambda text: pattern.sub(lambda m: names[m.group(1)], text)
+
+
+def merge(specs):
+    """
+    One query for several specs with the same key
+    :return: (query text, list with the {caller label: merged label} of every spec)
+    """
+    lets, shows, defined = OrderedDict(), OrderedDict(), OrderedDict()
+    mappings = []
+    for spec in specs:
+        names = {}
+        for attr, name, definition in spec.lets:
+            definition = (attr.upper(), _renamer(names)(definition))
+            if definition not in lets:
+                lets[definition] = 'QPL{}'.format(len(lets) + 1)
+            names[name] = lets[definition]
+        rename = _renamer(names)
+        mapping = OrderedDict()
+        for label, expression in spec.shows:
+            expression = rename(expression)
+            if expression not in shows:
+                shows[expression] = 'QPS{}'.format(len(shows) + 1)
+            mapping[label] = shows[expression]
+        for name in spec.defined:
+            defined[rename(name)] = True
+        mappings.append(mapping)
+
+    show_text = ''.join('{}: {}\n'.format(label, expression) for expression, label in shows.items())
+    if not lets and not defined and specs[0].row_filter is None:
+        return 'Show \n' + show_text, mappings
+
+    let_text = ''.join('{}{} = {}\n'.format(attr + ' ' if attr else '', name, definition) for (attr, definition), name in lets.items())
+    when_text = ' OR\n'.join('{} is DEFINED'.format(x) for x in defined) if defined else specs[0].row_filter
+    parts = ['LET\n' + let_text if let_text else '', 'SHOW\n' + show_text, 'WHEN\n' + when_text + '\n' if when_text else '']
+    return ''.join(parts), mappings
+
+
+def split(res, mapping):
+    """
+    A caller's columns of a merged result, under its own labels, without the rows it has no value in
+    """
+    if res is None:
+        return None
+    part = res[list(mapping.values())]
+    part.columns = list(mapping.keys())
+    part = part.dropna(how='all')
+    return part if len(part) > 0 else None
+
+
+class _Request(object):
+    def __init__(self, q, spec, run):
+        self.q = q
+        self.spec = spec
+        self.run = run
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = time.monotonic()
+
+
+class _Batch(object):
+    def __init__(self):
+        self.requests = []
+        self.shows = 0
+        self.closed = False
+
+
+class Coalescer(object):
+    """
+    Collects queries for window seconds and sends compatible ones as one DataRequest. The first query
+    of a batch waits out the window and runs the batch, the others wait for its result.
+    :param window: seconds to wait for queries to merge with
+    :param max_shows: SHOW columns per merged query, a full batch is sent at once
+    """
+
+    def __init__(self, window=window, max_shows=max_shows):
+        self.window = window
+        self.max_shows = max_shows
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._latency = deque(maxlen=10000)
+        self.requests = 0
+        self.merged = 0
+        self.datarequests = 0
+        self.fallbacks = 0
+        self.passthrough = 0
+
+    def query(self, q, run):
+        """
+        Result of q, possibly through a merged query
+        :param run: function sending a query text and returning its frame
+        """
+        spec = parse_query(q)
+        if spec is None:
+            with self._lock:
+                self.passthrough += 1
+            return run(q)
+
+        request = _Request(q, spec, run)
+        leader, full = False, None
+        with self._lock:
+            self.requests += 1
+            batch = self._batches.get(spec.key)
+            if batch is None or batch.shows + len(spec.shows) > self.max_shows:
+                batch = self._batches[spec.key] = _Batch()
+                leader = True
+            batch.requests.append(request)
+            batch.shows += len(spec.shows)
+            if batch.shows >= self.max_shows:
+                full = self._close(spec.key, batch)
+
+        if full is not None:
+            self._run(full)
+        elif leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch = self._close(spec.key, batch)
+            if batch is not None:
+                self._run(batch)
+
+        request.event.wait()
+        with self._lock:
+            self._latency.append(time.monotonic() - request.started)
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _close(self, key, batch):
+        # detach batch so no more requests join, None if another thread already did
+        if batch.closed:
+            return None
+        batch.closed = True
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        return batch
+
+    def _run(self, batch):
+        requests = batch.requests
+        try:
+            if len(requests) == 1:
+                self._finish(requests, [requests[0].run(requests[0].q)], 1)
+                return
+
+            text, mappings = merge([x.spec for x in requests])
+            try:
+                res = requests[0].run(text)
+            except Exception as e:
+                logging.warning('Merged query of {} requests failed ({}), running them one by one'.format(len(requests), e))
+                with self._lock:
+                    self.fallbacks += 1
+                    self.datarequests += 1
+                for x in requests:
+                    try:
+                        x.result = x.run(x.q)
+                    except Exception as e:
+                        x.error = e
+                self._finish(requests, [x.result for x in requests], len(requests), merged=False)
+                return
+            self._finish(requests, [split(res, m) for m in mappings], 1)
+        except Exception as e:
+            for x in requests:
+                x.error = e
+                x.event.set()
+
+    def _finish(self, requests, results, datarequests, merged=True):
+        with self._lock:
+            self.datarequests += datarequests
+            if merged and len(requests) > 1:
+                self.merged += len(requests)
+        if merged and len(requests) > 1:
+            limmetrics.count('query.coalesced', len(requests))
+        for x, res in zip(requests, results):
+            x.result = res
+            x.event.set()
+
+    def stats(self):
+        """
+        requests: queries taken, datarequests: DataRequests sent for them, merged: queries answered by a
+        shared DataRequest, hit_rate: share of requests that did not need their own DataRequest,
+        fallbacks: merged requests retried one by one, passthrough: queries that could not be parsed,
+        latency_p50/p95: seconds from query to result
+        """
+        with self._lock:
+            latency = list(self._latency)
+            res = {
+                'requests': self.requests,
+                'datarequests': self.datarequests,
+                'merged': self.merged,
+                'hit_rate': 1 - float(self.datarequests) / self.requests if self.requests else 0.0,
+                'fallbacks': self.fallbacks,
+                'passthrough': self.passthrough,
+            }
+        res['latency_p50'], res['latency_p95'] = np.percentile(latency, [50, 95]).tolist() if latency else (None, None)
+        return res
+
+
+def enable(window=window, max_shows=max_shows):
+    """
+    Coalesce queries made through lim.query from now on
+    :return: the Coalescer, read its stats()
+    """
+    global coalescer
+    coalescer = Coalescer(window, max_shows)
+    return coalescer
+
+
+def disable():
+    global coalescer
+    coalescer = None
@@ -0,0 +1,60 @@
+import random
+import time
+
+
+initial = 0.1  # first wait in seconds
+factor = 2.0
+cap = 5.0  # longest single wait
+jitter = 0.2  # +/- fraction applied to every wait
+deadline = 300  # seconds before giving up on a request
+
+
+class PollTimeout(Exception):
+    pass
+
+
+class PollScheduler(object):
+    """
+    Schedules status polls: waits start short and back off exponentially with jitter up to a cap,
+    bounded by a wall clock deadline. polls and elapsed are kept so callers can see how long the
+    server made them wait.
+    """
+
+    def __init__(self, deadline=deadline, initial=initial, factor=factor, cap=cap, jitter=jitter):
+        self.deadline = deadline
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.polls = 0
+        self.started = time.monotonic()
+        self._delay = initial
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def remaining(self):
+        return self.deadline - self.elapsed
+
+    def next_delay(self):
+        """
+        Length of the next wait, advancing the backoff
+        :return: seconds
+        """
+        remaining = self.remaining
+        if remaining <= 0:
+            raise PollTimeout('Deadline of {}s passed after {} polls'.format(self.deadline, self.polls))
+
+        delay = min(self._delay, self.cap)
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._delay = min(self._delay * self.factor, self.cap)
+        self.polls += 1
+        return min(delay, remaining)
+
+    def wait(self):
+        time.sleep(self.next_delay())
+
+    def __repr__(self):
+        return 'PollScheduler(polls={}, elapsed={:.3f}s)'.format(self.polls, self.elapsed)
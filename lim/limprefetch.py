@@ -0,0 +1,259 @@
+"""
+Background warm-up of a watchlist. A Prefetcher refreshes series, curves, futures contracts and raw
+queries on their own schedules with bounded concurrency, so the first foreground calls after settlement
+find the data local.
+
+    prefetcher = limprefetch.Prefetcher(max_workers=4)
+    prefetcher.add_series(['FB', 'FP'], every=15 * 60)
+    prefetcher.add_contracts('FB', at=['18:30'])
+    prefetcher.add_curve('FB', every=3600)
+    prefetcher.start()
+    ...
+    prefetcher.status()
+
+Histories are refreshed incrementally through lim.query_cached ('date is after' the last stored date),
+forward curves in full and curve histories through the curve store. Every refreshed result is put in
+the in-memory result cache (limcache.enable_result_cache, turned on with its defaults by the Prefetcher
+if it is off) under the exact queries
+lim.series, lim.curve and lim.futures_contracts send for the same arguments, so those calls are served
+warm. status() reports per entry when it was refreshed, its staleness and how far its data lags behind.
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from lim import lim
+from lim import limcache
+from lim import limsession
+from lim import limadmit
+from lim.limlazy import lazy_import
+
+pd = lazy_import('pandas')
+
+
+every = 15 * 60  # default refresh interval in seconds
+tick = 1.0  # seconds between schedule checks
+grace = 60  # seconds a warmed result outlives its refresh interval in the result cache
+
+_cache_lock = threading.Lock()
+
+
+class Entry(object):
+    """
+    One watchlist item: queries refreshed together on a schedule
+    :param kind: 'series', 'curve', 'curve_history', 'contracts' or 'query'
+    :param name: label in status()
+    :param every: seconds between refreshes
+    :param at: list of local 'HH:MM' times to refresh at instead of every
+    """
+
+    def __init__(self, kind, name, refresh, every=every, at=None):
+        self.kind = kind
+        self.name = name
+        self.refresh = refresh
+        self.every = every
+        self.at = [datetime.strptime(x, '%H:%M').time() for x in at] if at else None
+        self.refreshed = None
+        self.data_date = None
+        self.duration = None
+        self.error = None
+        self.refreshes = 0
+        self.failures = 0
+        self.due = datetime.now()
+
+    @property
+    def ttl(self):
+        return (self.every if self.at is None else 24 * 3600) + grace
+
+    def schedule(self, now):
+        if self.at is None:
+            self.due = now + timedelta(seconds=self.every)
+            return
+        times = [datetime.combine(now.date() + timedelta(days=d), t) for d in (0, 1) for t in self.at]
+        self.due = min(x for x in times if x > now)
+
+    def status(self, now):
+        return {
+            'kind': self.kind,
+            'refreshed': self.refreshed,
+            'staleness': (now - self.refreshed).total_seconds() if self.refreshed else None,
+            'data_date': self.data_date,
+            'lag': (now - self.data_date).total_seconds() if self.data_date is not None else None,
+            'next': self.due,
+            'duration': self.duration,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'error': None if self.error is None else str(self.error),
+        }
+
+
+def _last_date(frames):
+    dates = [x.index.max() for x in frames if x is not None and len(x) > 0]
+    return max(dates).to_pydatetime() if dates else None
+
+
+class Prefetcher(object):
+    """
+    :param max_workers: entries refreshed at once
+    :param backend: limcache.CacheBackend for incremental histories, defaults to limcache.get_backend()
+    """
+
+    def __init__(self, max_workers=4, backend=None):
+        self.max_workers = max_workers
+        self.backend = backend
+        self.entries = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        with _cache_lock:
+            if limcache.result_cache is None:
+                limcache.enable_result_cache()
+
+    def _warm(self, q, res, ttl):
+        cache = limcache.result_cache
+        if cache is None:
+            return  # turned off since
+        cache.put(limcache.result_key(limsession.get_session().server, q), res, ttl)
+
+    def _cached(self, q, ttl):
+        res = lim.query_cached(q, backend=self.backend)
+        self._warm(q, res, ttl)
+        return res
+
+    def add(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+        return entry
+
+    def add_query(self, q, every=every, at=None, name=None):
+        """
+        Keep a query's history warm, incrementally
+        """
+        def refresh(entry):
+            return [self._cached(q, entry.ttl)]
+        return self.add(Entry('query', name or ' '.join(q.split())[:60], refresh, every, at))
+
+    def add_series(self, symbols, every=every, at=None, batch_size=None):
+        """
+        Keep lim.series(symbols, batch_size) warm, batch by batch and incrementally
+        """
+        batch_size = lim.series_batch_size if batch_size is None else batch_size
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+
+        def refresh(entry):
+            return [self._cached(lim.build_series_query(x), entry.ttl) for x in batches]
+        return self.add(Entry('series', ','.join(symbols), refresh, every, at))
+
+    def add_curve(self, symbols, column='Close', curve_dates=None, every=every, at=None):
+        """
+        Keep lim.curve(symbols, column) warm, or the curve history of curve_dates in the curve store for
+        lim.curve(..., cache_inc=True)
+        """
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        if curve_dates is not None:
+            def refresh(entry):
+                return [lim.curve_cached(symbols, column, curve_dates)]
+            return self.add(Entry('curve_history', ','.join(symbols), refresh, every, at))
+
+        def refresh(entry):
+            q = lim.build_curve_query(symbols, column, None)
+            res = lim.query(q)
+            self._warm(q, res, entry.ttl)
+            return [res]
+        return self.add(Entry('curve', ','.join(symbols), refresh, every, at))
+
+    def add_contracts(self, symbol, start_year=None, end_year=None, every=every, at=None):
+        """
+        Keep the contract list of symbol and lim.futures_contracts(symbol, start_year, end_year) warm
+        """
+        def refresh(entry):
+            year = datetime.now().year
+            contracts = lim._contract_index(symbol, refresh=True).contracts(
+                limsession.get_session().server, symbol,
+                start_year=year if start_year is None else start_year, end_year=year + 2 if end_year is None else end_year)
+            batches = [contracts[i:i + lim.series_batch_size] for i in range(0, len(contracts), lim.series_batch_size)]
+            return [self._cached(lim.build_series_query(x), entry.ttl) for x in batches]
+        return self.add(Entry('contracts', symbol, refresh, every, at))
+
+    def refresh(self, entry):
+        """
+        Refresh one entry now, in the 'batch' admission lane, recording the outcome in it
+        """
+        start = time.monotonic()
+        try:
+            with limadmit.lane('batch'):
+                frames = entry.refresh(entry)
+        except Exception as e:
+            logging.error('Prefetch of {} {} failed: {}'.format(entry.kind, entry.name, e))
+            entry.error = e
+            entry.failures += 1
+        else:
+            entry.refreshed = datetime.now()
+            if entry.kind in ('series', 'contracts', 'query'):
+                # curves run into the future, only histories lag
+                entry.data_date = _last_date(frames) or entry.data_date
+            entry.error = None
+            entry.refreshes += 1
+        finally:
+            entry.duration = time.monotonic() - start
+            entry.schedule(datetime.now())
+            with self._lock:
+                self._running.discard(id(entry))
+
+    def refresh_all(self):
+        """
+        Refresh every entry now, max_workers at a time, and wait for them
+        """
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            list(pool.map(self.refresh, list(self.entries)))
+
+    def _due(self, now):
+        with self._lock:
+            due = [x for x in self.entries if x.due <= now and id(x) not in self._running]
+            self._running.update(id(x) for x in due)
+        return due
+
+    def _run(self):
+        while not self._stop.is_set():
+            for entry in self._due(datetime.now()):
+                self._pool.submit(self.refresh, entry)
+            self._stop.wait(tick)
+
+    def start(self):
+        """
+        Refresh entries in a background thread as they fall due, the first time straight away
+        """
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(self.max_workers)
+        self._thread = threading.Thread(target=self._run, name='lim-prefetch', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._pool.shutdown(wait=wait)
+        self._thread = None
+        self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def status(self):
+        """
+        DataFrame by entry of kind, last refresh, staleness (seconds since it), data date (last date
+        in the data), lag (seconds the data trails now by), next refresh, duration, counts and last error
+        """
+        now = datetime.now()
+        with self._lock:
+            entries = list(self.entries)
+        return pd.DataFrame([x.status(now) for x in entries], index=[x.name for x in entries])
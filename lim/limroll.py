@@ -0,0 +1,147 @@
+"""
+Continuous futures rolled locally from contract prices, the client side counterpart of
+lim.continuous_futures_rollover. The contract prices come from lim.futures_contracts and the expiries
+from the contract index (lim.contract_metadata); fetch them once with contract_data and sweeping roll
+rules and nearby months costs no further queries.
+
+    df = limroll.continuous_futures('FB', months=['M1', 'M2'], rollover_date='5 days before expiration day')
+    sweep = limroll.roll_sweep(prices, expiries, ['3 days before expiration day', '10 days before expiration day'])
+
+Roll rules are of the form 'N days before expiration day', N counted in business days; on and after
+a contract's roll date the next contract is the front month. Prices are stitched unadjusted, like
+LIM's 'actual prices' policy. compare_rollover checks the local series against LIM's own, with
+skip_rolls leaving out the business days around the rolls where the two may disagree.
+
+The schema relations endpoint gives no expiration day, so the endDate of each contract's date range
+(dateRange=true, contract_metadata's end_date) stands in for it. Where LIM's expiration calendar
+differs from the last traded date the roll dates, and so the series, differ around the rolls; away
+from them both take the same contract prices and agree exactly.
+"""
+import re
+from datetime import date
+from lim import lim
+from lim.limlazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+_rollover_date = re.compile(r'^\s*(?:(\d+)\s+(?:business\s+)?days?\s+before\s+)?expiration\s+day\s*$', re.I)
+
+
+def parse_rollover_date(rollover_date):
+    """
+    :param rollover_date: e.g. '5 days before expiration day'
+    :return: business days before expiry
+    """
+    m = _rollover_date.match(rollover_date)
+    if m is None:
+        raise ValueError('Unsupported rollover date {!r}, expected "N days before expiration day"'.format(rollover_date))
+    return int(m.group(1) or 0)
+
+
+def roll_dates(expiries, days):
+    """
+    :param expiries: datetime64 array of expiry dates
+    :param days: business days before expiry
+    :return: datetime64[D] array of the first date each contract is no longer the front month
+    """
+    return np.busday_offset(np.asarray(expiries, dtype='datetime64[D]'), -days, roll='backward')
+
+
+def _nearby(month):
+    return int(month[1:]) if isinstance(month, str) else int(month)
+
+
+def continuous(prices, expiries, months=['M1'], rollover_date='5 days before expiration day'):
+    """
+    Stitch continuous series out of contract prices
+    :param prices: date indexed frame, one column per contract
+    :param expiries: Series of expiry date by contract name, contracts without one are left out
+    :param months: nearby months, e.g. ['M1', 'M2']
+    :param rollover_date: roll rule, see parse_rollover_date
+    :return: frame with a column per month, without the dates where none has a price
+    """
+    expiries = pd.to_datetime(pd.Series(expiries)).dropna()
+    expiries = expiries[expiries.index.isin(prices.columns)].sort_values(kind='stable')
+    rolls = roll_dates(expiries.values, parse_rollover_date(rollover_date))
+
+    values = prices[expiries.index].to_numpy(dtype=np.float64)
+    dates = prices.index.values.astype('datetime64[D]')
+    # position of the front contract on every date
+    front = np.searchsorted(rolls, dates, side='right')
+    rows = np.arange(len(dates))
+
+    out = np.full((len(dates), len(months)), np.nan)
+    for j, month in enumerate(months):
+        k = front + _nearby(month) - 1
+        valid = k < len(rolls)
+        out[valid, j] = values[rows[valid], k[valid]]
+    res = pd.DataFrame(out, index=prices.index, columns=list(months))
+    return res.dropna(how='all')
+
+
+def roll_sweep(prices, expiries, rollover_dates, months=['M1']):
+    """
+    continuous for several roll rules over the same prices
+    :return: {rollover_date: frame}
+    """
+    return dict((x, continuous(prices, expiries, months, x)) for x in rollover_dates)
+
+
+def contract_data(symbol, start_year, end_year):
+    """
+    Prices and expiries of the monthly contracts of symbol expiring between start_year and end_year,
+    through lim.futures_contracts and the contract index
+    :return: (prices frame, Series of the contracts' endDate as a proxy for expiry)
+    """
+    prices = lim.futures_contracts(symbol, start_year, end_year)
+    meta = lim.contract_metadata(symbol)
+    expiries = meta.set_index('name')['end_date']
+    return prices, expiries[expiries.index.isin(prices.columns)]
+
+
+def continuous_futures(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=None):
+    """
+    lim.continuous_futures_rollover computed locally
+    :param after_date: year or date, only dates after it are returned; defaults to the previous year
+    """
+    after = _after(after_date)
+    furthest = max(_nearby(x) for x in months)
+    # contracts expiring from the start year up to far enough ahead for the furthest nearby month
+    prices, expiries = contract_data(symbol, after.year, date.today().year + furthest // 12 + 2)
+    if prices is None:
+        return None
+    res = continuous(prices, expiries, months, rollover_date)
+    res = res[res.index > pd.Timestamp(after)]
+    return res if len(res) > 0 else None
+
+
+def _after(after_date):
+    if after_date is None:
+        return date(date.today().year - 1, 12, 31)
+    if isinstance(after_date, int) or re.match(r'^\d{4}$', str(after_date)):
+        return date(int(after_date), 12, 31)
+    return pd.Timestamp(after_date).date()
+
+
+def compare_rollover(symbol, months=['M1'], rollover_date='5 days before expiration day', after_date=None,
+                     skip_rolls=None):
+    """
+    Local series against lim.continuous_futures_rollover for the same rule
+    :param skip_rolls: business days either side of each local roll date to leave out, None for none
+    :return: frame of local minus LIM per month, on the dates both have
+    """
+    local = continuous_futures(symbol, months, rollover_date, after_date)
+    remote = lim.continuous_futures_rollover(symbol, months, rollover_date, after_date)
+    local, remote = local.align(remote, join='inner')
+    diff = local - remote
+    if skip_rolls is not None:
+        expiries = pd.to_datetime(lim.contract_metadata(symbol)['end_date']).dropna()
+        rolls = roll_dates(expiries.values, parse_rollover_date(rollover_date))
+        dates = diff.index.values.astype('datetime64[D]')
+        near = np.zeros(len(dates), dtype=bool)
+        for offset in range(-skip_rolls, skip_rolls + 1):
+            near |= np.isin(dates, np.busday_offset(rolls, offset, roll='backward'))
+        diff = diff[~near]
+    return diff
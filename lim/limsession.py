@@ -0,0 +1,200 @@
+import os
+import threading
+from lim import limadmit
+from lim.limlazy import lazy_import
+
+requests = lazy_import('requests')
+
+
+pool_connections = 10
+pool_maxsize = 20
+timeout = (10, 300)  # (connect, read) seconds
+
+
+class LimSession(object):
+    """
+    Pooled keep-alive HTTP session for a LIM server. Holds the server url, credentials and proxies
+    so lim and limuploader share a single set of connections. Requests go through the server's
+    limadmit.Admission; a stream=True response holds its slot until it is closed.
+    """
+
+    def __init__(self, server, username, password, proxies=None, pool_connections=pool_connections,
+                 pool_maxsize=pool_maxsize, timeout=timeout, max_retries=0):
+        self.server = server.replace('"', '').rstrip('/')
+        self.username = username.replace('"', '')
+        self.auth = (self.username, password.replace('"', ''))
+        self.proxies = proxies
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @classmethod
+    def from_env(cls, profile=None, **kwargs):
+        """
+        Build a session from LIMSERVER, LIMUSERNAME, LIMPASSWORD and http(s)_proxy. A named profile
+        reads LIMSERVER_<NAME>, LIMUSERNAME_<NAME> and LIMPASSWORD_<NAME> instead.
+        :param profile: profile name, None for the default
+        :param kwargs: passed through to LimSession
+        :return:
+        """
+        kwargs.setdefault('proxies', {
+            'http': os.getenv('http_proxy'),
+            'https': os.getenv('https_proxy')
+        })
+        server, username, password = [os.environ[env_name(x, profile)] for x in ('LIMSERVER', 'LIMUSERNAME', 'LIMPASSWORD')]
+        return cls(server, username, password, **kwargs)
+
+    def url(self, path):
+        return '{}{}'.format(self.server, path)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('proxies', self.proxies)
+        admission = limadmit.get_admission(self.server)
+        trial = admission.acquire()
+        try:
+            resp = self._session.request(method, url, auth=self.auth, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            admission.release(False, trial)
+            raise
+        except BaseException:
+            admission.release(None, trial)
+            raise
+        ok = not limadmit.failure_status(resp.status_code)
+        if kwargs.get('stream'):
+            _release_on_close(resp, admission, ok, trial)
+        else:
+            admission.release(ok, trial)
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def close(self):
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _release_on_close(resp, admission, ok, trial):
+    # the body of a streamed reply is still to come, its slot is released when the response is closed
+    close = resp.close
+    released = []
+
+    def release():
+        try:
+            close()
+        finally:
+            if not released:
+                released.append(True)
+                admission.release(ok, trial)
+    resp.close = release
+
+
+default_profile = 'default'
+
+_profiles = {}
+_sessions = {}
+_active = None
+_session_lock = threading.Lock()
+
+
+def env_name(name, profile=None):
+    if profile is None or profile == default_profile:
+        return name
+    return '{}_{}'.format(name, profile.upper())
+
+
+def add_profile(name, server, username, password, **kwargs):
+    """
+    Register a named server, its session is created on first use
+    :param name: profile name
+    :param kwargs: passed through to LimSession
+    :return:
+    """
+    with _session_lock:
+        _profiles[name] = dict(server=server, username=username, password=password, **kwargs)
+        old = _sessions.pop(name, None)
+    if old is not None:
+        old.close()
+
+
+def active_profile():
+    """
+    Profile used when none is given: set by use_profile, else LIMPROFILE, else 'default'
+    """
+    if _active is not None:
+        return _active
+    return os.getenv('LIMPROFILE', default_profile)
+
+
+def use_profile(name):
+    """
+    Make name the profile of every following lim call
+    :param name: registered profile, or one configured through LIMSERVER_<NAME> etc
+    :return: the previously active profile
+    """
+    global _active
+    previous, _active = active_profile(), name
+    return previous
+
+
+def get_session(profile=None):
+    """
+    Shared session of a profile, created on first use from add_profile or the environment
+    :param profile: profile name, defaults to active_profile()
+    :return:
+    """
+    if profile is None:
+        profile = active_profile()
+    session = _sessions.get(profile)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(profile)
+            if session is None:
+                config = _profiles.get(profile)
+                session = LimSession(**config) if config is not None else LimSession.from_env(profile)
+                _sessions[profile] = session
+    return session
+
+
+def set_session(session, profile=None):
+    """
+    Replace the shared session of a profile, closing the previous one
+    :param session: LimSession, or None to recreate it on next use
+    :param profile: profile name, defaults to active_profile()
+    :return:
+    """
+    if profile is None:
+        profile = active_profile()
+    with _session_lock:
+        old = _sessions.pop(profile, None)
+        if session is not None:
+            _sessions[profile] = session
+    if old is not None and old is not session:
+        old.close()
+
+
+def configure(profile=None, **kwargs):
+    """
+    Rebuild the shared session of a profile with custom pool size, timeouts etc
+    :param profile: profile name, defaults to active_profile()
+    :param kwargs: passed through to LimSession
+    :return:
+    """
+    if profile is None:
+        profile = active_profile()
+    config = _profiles.get(profile)
+    session = LimSession(**dict(config, **kwargs)) if config is not None else LimSession.from_env(profile, **kwargs)
+    set_session(session, profile)
+    return session
@@ -1,15 +1,22 @@
-from datetime import datetime
-from lxml import etree
-import lxml.builder
 import time
-import requests
 import logging
-import pandas as pd
+from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from lim.limlazy import lazy_import
 from lim import lim
+from lim import limsession
+from lim import limpoll
+from lim import limmetrics
+from lim import limadmit
 
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+etree = lazy_import('lxml.etree')
 
-lim_upload_default_parser_url = '{}/rs/upload?username={}'.format(lim.limServer, lim.limUserName)
-lim_upload_status_url = '{}/rs/upload/jobreport/'.format(lim.limServer)
+
+lim_upload_default_parser_path = '/rs/upload?username={}'
+lim_upload_status_path = '/rs/upload/jobreport/'
 
 
 headers = {
@@ -18,29 +25,94 @@ headers = {
 
 default_column = 'TopColumn:Price:Close'
 
+upload_chunk_cells = 5000
+upload_chunk_bytes = 1024 ** 2
+row_overhead = len('<Row num="000000"><Cols><Col num="1"></Col><Col num="2"></Col><Col num="3">00000'
+                   '</Col><Col num="4">000.000000</Col><Col num="5"></Col></Cols></Row>')
+excel_epoch = datetime(1899, 12, 30)
+
+
+def escape(text):
+    # as xml.sax.saxutils.escape, which pulls in urllib.request at import
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
 
 def check_upload_status(jobid):
-    url = '{}{}'.format(lim_upload_status_url, jobid)
-    resp = requests.get(url, headers=lim.headers, auth=(lim.limUserName, lim.limPassword), proxies=lim.proxies)
+    session = limsession.get_session()
+    url = '{}{}'.format(session.url(lim_upload_status_path), jobid)
+    with limmetrics.span('upload.status'), limadmit.lane('upload'):
+        resp = session.get(url, headers=lim.headers)
 
     if resp.status_code == 200:
-
-        root = etree.fromstring(resp.text.encode('utf-8'))
-        status_el = root.find('status')
-        if status_el is not None:
-            code, msg = '', ''
-            code_el = status_el.find('code')
-            if code_el is not None:
-                code = code_el.text
-            message_el = status_el.find('message')
-            if message_el is not None:
-                msg = message_el.text
-            if code not in ['200', '201', '300', '302']:
-                logging.warning('jobid {}: code:{} msg:'.format(jobid, code, msg))
-            return code, msg
+        return parse_upload_status(jobid, resp.text)
     else:
         logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
-        raise Exception(resp.text)
+        raise limadmit.LimHTTPError(resp.status_code, resp.text)
+
+
+def parse_upload_status(jobid, text):
+    """
+    :param text: job report reply
+    :return: (code, msg), None if the report has no status
+    """
+    root = etree.fromstring(text.encode('utf-8'))
+    status_el = root.find('status')
+    if status_el is not None:
+        code, msg = '', ''
+        code_el = status_el.find('code')
+        if code_el is not None:
+            code = code_el.text
+        message_el = status_el.find('message')
+        if message_el is not None:
+            msg = message_el.text
+        if code not in ['200', '201', '300', '302']:
+            logging.warning('jobid {}: code:{} msg:'.format(jobid, code, msg))
+        return code, msg
+
+
+def excel_serials(index):
+    """
+    Excel serial day numbers for a date index
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(index)).normalize()
+    return (dates - excel_epoch).days
+
+
+def iter_upload_rows(df, dfmeta, start=1, block=10000):
+    """
+    Row elements for every non-null cell of df, row by row in column order, as blocks of bytes.
+    The treepath/column split is done once per column and the excel date once per index entry.
+    :param df: dataframe, column headings being the treepath
+    :param dfmeta: dict with an optional description
+    :param start: number of the first Row
+    :param block: Rows per yielded block
+    """
+    values = df.to_numpy()
+    rows, cols = np.nonzero(~pd.isna(values))
+    if len(rows) == 0:
+        return
+
+    serials = excel_serials(df.index).astype(str).tolist()
+    heads = []
+    for col in df.columns:
+        tokens = col.split(';')
+        column = default_column if len(tokens) == 1 else tokens[1]
+        heads.append('"><Cols><Col num="1">{}</Col><Col num="2">{}</Col><Col num="3">'.format(escape(tokens[0]), escape(column)))
+    tail = '</Col><Col num="5">{}</Col></Cols></Row>'.format(escape(dfmeta.get('description', '')))
+
+    cells = values[rows, cols].tolist()
+    rows, cols = rows.tolist(), cols.tolist()
+    for i in range(0, len(cells), block):
+        out = ['<Row num="{}{}{}</Col><Col num="4">{}{}'.format(start + n, heads[c], serials[r], v, tail)
+               for n, r, c, v in zip(range(i, i + block), rows[i:i + block], cols[i:i + block], cells[i:i + block])]
+        yield ''.join(out).encode('utf-8')
+
+
+def iter_upload_xml(df, dfmeta, block=10000):
+    yield b'<ExcelData><Rows>'
+    for x in iter_upload_rows(df, dfmeta, block=block):
+        yield x
+    yield b'</Rows></ExcelData>'
 
 
 def build_upload_xml(df, dfmeta):
@@ -50,45 +122,7 @@ def build_upload_xml(df, dfmeta):
     :param dfmeta:
     :return:
     """
-    E = lxml.builder.ElementMaker()
-    ROOT = E.ExcelData
-    ROWS = E.Rows
-    xROW = E.Row
-    xCOL = E.Col
-    xCOLS = E.Cols
-
-    entries = []
-    count = 1
-    for irow, row in df.iterrows():
-        for col, val in row.iteritems():
-            if pd.isna(val):
-                continue
-            tokens = col.split(';')
-            treepath = tokens[0]
-            column = default_column if len(tokens) == 1 else tokens[1]
-            desc = dfmeta.get('description', '')
-            if isinstance(irow, pd.Timestamp):
-                irow = irow.date()
-            erow = xROW(
-                xCOLS(
-                    xCOL(treepath, num="1"),
-                    xCOL(column, num="2"),
-                    xCOL(str((irow - datetime(1899, 12, 30).date()).days), num="3"), # excel dateformat
-                    xCOL(str(val), num="4"),
-                    xCOL(desc, num="5"),
-                ),
-                num=str(count)
-            )
-            count = count + 1
-            entries.append(erow)
-
-    irow = ROOT()
-    xROWS = ROWS()
-    [xROWS.append(x) for x in entries]
-    irow.append(xROWS)
-
-    res = (lxml.etree.tostring(irow, pretty_print=True))
-    return res
+    return b''.join(iter_upload_xml(df, dfmeta))
 
 
 def chunks(lst, n):
@@ -97,49 +131,345 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def upload_chunk(df, dfmeta):
-    url = '{}&parsername=DefaultParser'.format(lim_upload_default_parser_url)
-    res = build_upload_xml(df, dfmeta)
-    logging.info('Uploading df below to {}:\n'.format(url, df))
-    resp = requests.request("POST", url, headers=headers, data=res, auth=(lim.limUserName, lim.limPassword),
-                            proxies=lim.proxies)
+def cell_bytes(df, dfmeta):
+    """
+    Estimated XML bytes of one non-null cell, per column
+    """
+    tail = len(escape(dfmeta.get('description', '')))
+    heads = []
+    for col in df.columns:
+        tokens = col.split(';')
+        column = default_column if len(tokens) == 1 else tokens[1]
+        heads.append(len(escape(tokens[0])) + len(escape(column)))
+    return np.array(heads, dtype=np.int64) + tail + row_overhead
+
+
+def chunk_sizes(df, dfmeta, max_cells=None, max_bytes=None):
+    """
+    Row ranges of df so each chunk holds at most max_cells non-null cells and about max_bytes of XML.
+    A single row over budget gets a chunk of its own.
+    :return: list of (start, end, cells, bytes)
+    """
+    max_cells = upload_chunk_cells if max_cells is None else max_cells
+    max_bytes = upload_chunk_bytes if max_bytes is None else max_bytes
+
+    mask = df.notna().to_numpy()
+    cells = np.cumsum(mask.sum(axis=1))
+    nbytes = np.cumsum(mask.dot(cell_bytes(df, dfmeta)))
+
+    sizes = []
+    start, n = 0, len(df)
+    while start < n:
+        done_cells = cells[start - 1] if start > 0 else 0
+        done_bytes = nbytes[start - 1] if start > 0 else 0
+        end = min(np.searchsorted(cells, done_cells + max_cells, side='right'),
+                  np.searchsorted(nbytes, done_bytes + max_bytes, side='right'))
+        end = max(int(end), start + 1)
+        if cells[end - 1] > done_cells:
+            sizes.append((start, end, int(cells[end - 1] - done_cells), int(nbytes[end - 1] - done_bytes)))
+        start = end
+    return sizes
+
+
+def chunk_bounds(df, dfmeta, max_cells=None, max_bytes=None):
+    """
+    Row ranges of df so each chunk holds at most max_cells non-null cells and about max_bytes of XML.
+    A single row over budget gets a chunk of its own.
+    :return: list of (start, end) row positions
+    """
+    return [(start, end) for start, end, _, _ in chunk_sizes(df, dfmeta, max_cells, max_bytes)]
+
+
+done_codes = ['200', '201', '300', '302']
+
+ChunkReport = namedtuple('ChunkReport', ['chunk', 'jobid', 'rows', 'cells', 'code', 'msg', 'latency', 'error'])
+
+
+class LimUploadError(Exception):
+    """
+    Some chunks of an upload failed, reports holds the ChunkReport of every chunk
+    """
+
+    def __init__(self, reports):
+        self.reports = reports
+        failed = [x for x in reports if x.error is not None]
+        super(LimUploadError, self).__init__('{} of {} chunk(s) failed: {}'.format(
+            len(failed), len(reports), '; '.join('chunk {}: {}'.format(x.chunk, x.error) for x in failed)))
+
+
+def submit_chunk(body):
+    """
+    Post an upload body
+    :param body: xml bytes, or an iterable of bytes blocks sent with chunked transfer encoding
+    :return: (jobid, intStatus), jobid is None unless the server accepted the job
+    """
+    session = limsession.get_session()
+    url = '{}&parsername=DefaultParser'.format(session.url(lim_upload_default_parser_path.format(session.username)))
+    with limmetrics.span('upload.submit'), limadmit.lane('upload'):
+        resp = session.post(url, headers=headers, data=body)
 
     status = resp.status_code
     if status == 200:
-        root = etree.fromstring(resp.text.encode('utf-8'))
-        intStatus = root.attrib['intStatus']
-        if intStatus == '202':
-            jobid = root.attrib['jobID']
-            logging.debug('Submitted jobid:{}'.format(jobid))
-            for i in range(0, lim.calltries):
-                code, msg = check_upload_status(jobid)
-                if code in ['200', '201', '300', '302']:
+        return parse_submit(resp.text)
+    else:
+        logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
+        raise limadmit.LimHTTPError(resp.status_code, resp.text)
+
+
+def parse_submit(text):
+    """
+    :param text: upload reply
+    :return: (jobid, intStatus), jobid is None unless the server accepted the job
+    """
+    root = etree.fromstring(text.encode('utf-8'))
+    intStatus = root.attrib['intStatus']
+    if intStatus == '202':
+        jobid = root.attrib['jobID']
+        logging.debug('Submitted jobid:{}'.format(jobid))
+        return jobid, intStatus
+    return None, intStatus
+
+
+def upload_chunk(df, dfmeta, deadline=limpoll.deadline):
+    """
+    Upload one frame and wait for its job. Status polls failing with 5xx, rejected or connection
+    errors are polled again until the deadline, like upload_pipeline; other errors are raised.
+    :return: message of the job report
+    """
+    with limmetrics.span('upload.chunk'):
+        with limmetrics.span('upload.build_xml'):
+            res = build_upload_xml(df, dfmeta)
+        logging.debug('Uploading df of shape {}'.format(df.shape))
+        try:
+            jobid, intStatus = submit_chunk(res)
+        except Exception:
+            logging.error('For chunk head: \n{}'.format(df.head()))
+            logging.error('For chunk tail: \n{}'.format(df.tail()))
+            raise
+
+        if jobid is not None:
+            poller = limpoll.PollScheduler(deadline)
+            while True:
+                code, msg, error = _poll(jobid)
+                if error is not None and not _transient(error):
+                    raise error
+                if code in done_codes:
+                    logging.debug('jobid {} done after {} polls in {:.2f}s'.format(jobid, poller.polls, poller.elapsed))
+                    limmetrics.count('upload.polls', poller.polls)
                     return msg
 
-                time.sleep(lim.sleep)
+                poller.wait()
 
-    else:
-        logging.error('Received response: Code: {} Msg: {}'.format(resp.status_code, resp.text))
-        logging.error('For chunk head: \n{}'.format(df.head()))
-        logging.error('For chunk tail: \n{}'.format(df.tail()))
 
-        raise Exception(resp.text)
+class _Job(object):
+    def __init__(self, chunk, rows, cells, submitted):
+        self.chunk = chunk
+        self.rows = rows
+        self.cells = cells
+        self.submitted = submitted
+        self.started = time.monotonic()
+        self.jobid = None
 
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
 
-def upload_series(df, dfmeta):
-    # try to do 1000 values at a time
-    if len(df.columns) == 1:
-        chunksize = int(len(df) / 1000)
-        if chunksize < 100:
-            chunksize = 100
-    else:
-        total_count = len(df) * len(df.columns)
-        chunksize = int(round(total_count / len(df.columns) / 1000, 0))
-        if chunksize == 0:
-            chunksize = 1
+    def report(self, code=None, msg=None, error=None):
+        return ChunkReport(self.chunk, self.jobid, self.rows, self.cells, code, msg, self.elapsed, error)
+
+
+def _poll(jobid):
+    # one job's status, an error only fails that job
+    try:
+        code, msg = check_upload_status(jobid) or (None, None)
+    except Exception as e:
+        logging.warning('Status of jobid {} failed: {}'.format(jobid, e))
+        return None, None, e
+    return code, msg, None
+
+
+def _transient(error):
+    # worth polling again until the deadline
+    if isinstance(error, limadmit.LimHTTPError):
+        return error.transient
+    return isinstance(error, (limadmit.LimRejected, IOError))
+
+
+def upload_pipeline(bodies, max_in_flight=4, deadline=limpoll.deadline, errors='raise'):
+    """
+    Upload a sequence of prepared chunks with up to max_in_flight jobs outstanding. bodies is consumed
+    lazily, so the next chunk's XML is built while earlier chunks upload, and the status of every
+    outstanding job is polled together. A failed status poll only affects its own job: 5xx, rejected
+    and connection errors are polled again until the deadline, others end the job.
+    :param bodies: iterable of (xml bytes, rows, cells)
+    :param max_in_flight: jobs submitted but not yet complete
+    :param deadline: seconds each job may take
+    :param errors: 'raise' a LimUploadError once all chunks are done if any failed, or 'ignore'
+    :return: list of ChunkReport in chunk order
+    """
+    reports = {}
+    inflight = []
+    bodies = enumerate(bodies)
+    exhausted = False
+    poller = limpoll.PollScheduler(float('inf'))
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while True:
+            while not exhausted and len(inflight) < max_in_flight:
+                try:
+                    i, (body, rows, cells) = next(bodies)
+                except StopIteration:
+                    exhausted = True
+                    break
+                inflight.append(_Job(i, rows, cells, pool.submit(submit_chunk, body)))
+
+            if len(inflight) == 0:
+                break
+
+            # collect finished submissions, then poll every outstanding job id together
+            for job in [x for x in inflight if x.jobid is None and x.submitted.done()]:
+                try:
+                    job.jobid, intStatus = job.submitted.result()
+                    if job.jobid is None:
+                        reports[job.chunk] = job.report(intStatus, error=Exception('Upload not accepted: intStatus {}'.format(intStatus)))
+                except Exception as e:
+                    reports[job.chunk] = job.report(error=e)
+
+            polling = [x for x in inflight if x.jobid is not None and x.chunk not in reports]
+            for job, (code, msg, error) in zip(polling, pool.map(_poll, [x.jobid for x in polling])):
+                if code in done_codes:
+                    reports[job.chunk] = job.report(code, msg)
+                elif error is not None and not _transient(error):
+                    reports[job.chunk] = job.report(code, msg, error)
+                elif job.elapsed > deadline:
+                    reports[job.chunk] = job.report(code, msg, error or limpoll.PollTimeout('jobid {} not done after {}s'.format(job.jobid, deadline)))
+
+            remaining = [x for x in inflight if x.chunk not in reports]
+            if len(remaining) < len(inflight):
+                poller = limpoll.PollScheduler(float('inf'))
+            else:
+                posting = [x.submitted for x in inflight if x.jobid is None]
+                if len(posting) > 0:
+                    wait(posting, timeout=poller.next_delay(), return_when=FIRST_COMPLETED)
+                else:
+                    poller.wait()
+            inflight = remaining
+
+    return finish_reports([reports[i] for i in sorted(reports)], errors)
+
+
+def finish_reports(reports, errors='raise'):
+    """
+    Log and record the ChunkReports of an upload, raising LimUploadError if any failed and errors is 'raise'
+    """
+    for x in reports:
+        logging.debug('Chunk {} jobid {}: {} rows, code {} in {:.2f}s'.format(x.chunk, x.jobid, x.rows, x.code, x.latency))
+        limmetrics.observe('upload.chunk', x.latency)
+        if x.error is None:
+            limmetrics.count('upload.cells', x.cells)
+        else:
+            limmetrics.count('upload.chunk.errors')
+    if errors == 'raise' and any(x.error is not None for x in reports):
+        raise LimUploadError(reports)
+    return reports
 
-    msg = ''
-    for chunk in chunks(df, chunksize):
-        msg = upload_chunk(chunk, dfmeta)
 
-    return msg
+def upload_series(df, dfmeta, max_cells=None, max_bytes=None, max_in_flight=4, deadline=limpoll.deadline, errors='raise'):
+    """
+    Upload a frame (columns being treepaths) through upload_pipeline, in chunks sized by their number of
+    non-null cells and estimated XML bytes
+    :param max_cells: non-null cells per request, defaults to upload_chunk_cells
+    :param max_bytes: estimated XML bytes per request, defaults to upload_chunk_bytes
+    :return: list of ChunkReport
+    """
+    return upload_pipeline(frame_bodies(df, dfmeta, max_cells, max_bytes), max_in_flight=max_in_flight, deadline=deadline, errors=errors)
+
+
+def frame_bodies(df, dfmeta, max_cells=None, max_bytes=None):
+    """
+    Upload bodies of a frame, built lazily chunk by chunk
+    :return: generator of (xml bytes, rows, cells)
+    """
+    bounds = chunk_bounds(df, dfmeta, max_cells, max_bytes)
+    logging.info('Uploading {} rows x {} columns in {} chunk(s)'.format(len(df), len(df.columns), len(bounds)))
+    for start, end in bounds:
+        chunk = df.iloc[start:end]
+        with limmetrics.span('upload.build_xml'):
+            body = build_upload_xml(chunk, dfmeta)
+        yield body, len(chunk), int(chunk.count().sum())
+
+
+record_columns = ['date', 'treepath', 'value']
+record_block = 10000
+
+
+def iter_frames(items, block=record_block):
+    """
+    Frames from a mix of dataframes and records. Records are (date, treepath, value) tuples or dicts with
+    those keys, pivoted block rows at a time; within a block the last value of a (date, treepath) wins.
+    """
+    records = []
+
+    def pivot():
+        frame = pd.DataFrame.from_records(records, columns=record_columns) if not isinstance(records[0], dict) \
+            else pd.DataFrame(records, columns=record_columns)
+        del records[:]
+        frame = frame.drop_duplicates(['date', 'treepath'], keep='last')
+        return frame.pivot(index='date', columns='treepath', values='value')
+
+    for item in items:
+        if isinstance(item, pd.DataFrame):
+            if records:
+                yield pivot()
+            yield item
+        else:
+            records.append(item)
+            if len(records) >= block:
+                yield pivot()
+    if records:
+        yield pivot()
+
+
+def iter_chunk_xml(pieces, dfmeta):
+    yield b'<ExcelData><Rows>'
+    start = 1
+    for piece, cells in pieces:
+        for x in iter_upload_rows(piece, dfmeta, start=start):
+            yield x
+        start += cells
+    yield b'</Rows></ExcelData>'
+
+
+def stream_bodies(items, dfmeta, max_cells=None, max_bytes=None):
+    """
+    Cut a lazy sequence of frames or records into upload chunks. Slices of consecutive frames are packed
+    into the same chunk while it stays within budget, and each body is a generator of XML blocks, built
+    as the request is sent, so only the frames of the chunks in flight are held.
+    :return: iterator of (body generator, rows, cells)
+    """
+    max_cells = upload_chunk_cells if max_cells is None else max_cells
+    max_bytes = upload_chunk_bytes if max_bytes is None else max_bytes
+
+    pending, rows, cells, nbytes = [], 0, 0, 0
+    for frame in iter_frames(items):
+        if len(frame) == 0:
+            continue
+        for start, end, piece_cells, piece_bytes in chunk_sizes(frame, dfmeta, max_cells, max_bytes):
+            if pending and (cells + piece_cells > max_cells or nbytes + piece_bytes > max_bytes):
+                yield iter_chunk_xml(pending, dfmeta), rows, cells
+                pending, rows, cells, nbytes = [], 0, 0, 0
+            pending.append((frame.iloc[start:end], piece_cells))
+            rows, cells, nbytes = rows + end - start, cells + piece_cells, nbytes + piece_bytes
+    if pending:
+        yield iter_chunk_xml(pending, dfmeta), rows, cells
+
+
+def upload_stream(items, dfmeta, max_cells=None, max_bytes=None, max_in_flight=4, deadline=limpoll.deadline, errors='raise'):
+    """
+    Upload data that need not fit in memory, e.g. frames read from a file one row group at a time. items is
+    consumed lazily and every request body is sent with chunked transfer encoding as it is generated.
+    :param items: iterable of dataframes (columns being treepaths) and/or (date, treepath, value) records
+    :param dfmeta: dict with an optional description
+    :return: list of ChunkReport
+    """
+    return upload_pipeline(stream_bodies(items, dfmeta, max_cells, max_bytes),
+                           max_in_flight=max_in_flight, deadline=deadline, errors=errors)
@@ -0,0 +1,332 @@
+"""
+Local stand-in for a LIM server, for offline tests and benchmarks.
+
+Implements the datarequests (with 100/130/200 status and request id polling), schema relations
+and upload/jobreport endpoints. Prices are generated deterministically from the show label and
+date, uploaded values are stored and served back by later queries. Payload size follows the
+generated history (start, end) and the number of labels shown; forward_curve queries return
+curve_months month starts from the current month.
+"""
+import re
+import bisect
+import time
+import threading
+import zlib
+from datetime import datetime, date, timedelta
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+
+month_codes = 'FGHJKMNQUVXZ'
+_rollover = re.compile(r'^(\w+)\(ROLLOVER_DATE = "(\d+) days before expiration day",'
+                       r'ROLLOVER_POLICY = "(?:(\d+) nearby )?actual prices"\)$')
+
+
+def _price(label, dates):
+    base = 20 + zlib.crc32(label.encode()) % 500
+    days = (dates - np.datetime64('1990-01-01', 'D')).astype(np.int64)
+    return np.round(base + 10 * np.sin(days / 50.0) + days * 0.001, 2)
+
+
+def _parse_date(text):
+    text = text.strip()
+    if re.match(r'^\d{4}$', text):
+        return date(int(text), 12, 31)
+    for fmt in ('%m/%d/%Y', '%Y-%m-%d', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(text)
+
+
+def parse_query(text):
+    """
+    Split a query into show labels, the expression each label prices (with LET names replaced by
+    their definitions) and after/before date bounds
+    :param text:
+    :return: (labels, expressions, after, before)
+    """
+    m = re.search(r'\bshow\b(.*?)(\bwhen\b|$)', text, re.I | re.S)
+    shows = m.group(1) if m else ''
+    pairs = re.findall(r'([^\s:]+)\s*:\s*(.*?)\s*(?=[^\s:]+\s*:|$)', shows, re.S)
+    labels = [x[0] for x in pairs]
+    m = re.search(r'\blet\b(.*?)\bshow\b', text, re.I | re.S)
+    lets = dict(re.findall(r'^\s*(?:ATTR\s+)?(\w+)\s*=\s*(.*?)\s*$', m.group(1), re.I | re.M)) if m else {}
+    expressions = [lets.get(x[1], x[1]) for x in pairs]
+
+    after, before = None, None
+    for op, val in re.findall(r'date is (after|before)\s+([0-9/\-]+)', text, re.I):
+        if op.lower() == 'after':
+            after = _parse_date(val)
+        else:
+            before = date(int(val), 1, 1) if re.match(r'^\d{4}$', val) else _parse_date(val)
+    return labels, expressions, after, before
+
+
+class MockLimServer(object):
+    """
+    Threaded HTTP server speaking enough of the LIM REST api for lim and limuploader.
+
+    :param latency: seconds slept before every response
+    :param pending_polls: number of status 200 (not complete) responses before a data request completes
+    :param upload_polls: number of pending job reports before an upload completes
+    :param start: first business day of generated history
+    :param end: last business day of generated history
+    :param contracts: {root symbol: (first year, last year)} served by the schema relations endpoint
+    :param curve_months: number of monthly points in a forward curve
+    :param row_latency: seconds slept per row of a completed data request, as a server spends longer on longer histories
+    """
+
+    def __init__(self, latency=0.0, pending_polls=0, upload_polls=0, start='2015-01-01', end='2020-12-31',
+                 contracts=None, curve_months=24, row_latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.pending_polls = pending_polls
+        self.upload_polls = upload_polls
+        self.curve_months = curve_months
+        self.dates = pd.bdate_range(start, end).values.astype('datetime64[D]')
+        self.contracts = contracts if contracts is not None else {'FB': (2015, 2022), 'FP': (2015, 2022)}
+        self.uploads = {}
+        self.requests = []
+        self.queries = []
+        self.failures = {}  # query text or other request path substring -> number of requests still to fail with a 503
+        self._pending = {}
+        self._jobs = {}
+        self._ids = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def failing(self, text):
+        """
+        Whether a request on text should fail, counting it against failures
+        """
+        with self._lock:
+            matches = [k for k, v in self.failures.items() if v > 0 and k in text]
+            for k in matches:
+                self.failures[k] -= 1
+        return len(matches) > 0
+
+    def frame(self, text):
+        labels, expressions, after, before = parse_query(text)
+        dates = self.dates
+        if 'forward_curve' in text.lower():
+            first = pd.Timestamp.now().to_period('M').to_timestamp()
+            dates = pd.date_range(first, periods=self.curve_months, freq='MS').values.astype('datetime64[D]')
+        if after is not None:
+            dates = dates[dates > np.datetime64(after, 'D')]
+        if before is not None:
+            dates = dates[dates < np.datetime64(before, 'D')]
+        cols = []
+        for expression in expressions:
+            if expression in self.uploads:
+                s = pd.Series(self.uploads[expression])
+                s.index = pd.to_datetime(s.index).values.astype('datetime64[D]')
+                cols.append(s.reindex(dates).values)
+            else:
+                m = _rollover.match(expression)
+                if m is not None:
+                    cols.append(self.rollover(m.group(1), int(m.group(2)), int(m.group(3) or 1), dates))
+                else:
+                    cols.append(_price(expression, dates))
+        values = np.column_stack(cols) if cols else np.empty((len(dates), 0))
+        return labels, dates, values
+
+    def datarequest_xml(self, reqid, text):
+        labels, dates, values = self.frame(text)
+        if self.row_latency:
+            time.sleep(len(dates) * self.row_latency)
+        if len(labels) == 0 or len(dates) == 0:
+            return '<DataRequest id="{}" status="130" statusMsg="No data"/>'.format(reqid)
+
+        out = ['<DataRequest id="{}" status="100" statusMsg="Complete"><Reports><Report>'.format(reqid)]
+        out.extend('<ColumnHeadings>{}</ColumnHeadings>'.format(escape(x)) for x in labels)
+        out.append('<Rows>')
+        for d, row in zip(dates.astype(str), values):
+            out.append('<Row><RowDates>{}T00:00:00</RowDates>'.format(d))
+            out.extend('<Values>{}</Values>'.format('NaN' if np.isnan(v) else repr(float(v))) for v in row)
+            out.append('</Row>')
+        out.append('</Rows></Report></Reports></DataRequest>')
+        return ''.join(out)
+
+    def contract_dates(self, symbol):
+        """
+        :return: list of (name, start date, expiry) of the monthly contracts of symbol
+        """
+        first, last = self.contracts.get(symbol, (None, None))
+        if first is None:
+            return []
+        return [('{}_{}{}'.format(symbol, year, code), date(year - 3, 1, 1), date(year, i + 1, 1) - timedelta(days=10))
+                for year in range(first, last + 1) for i, code in enumerate(month_codes)]
+
+    def rollover(self, symbol, days, nearby, dates):
+        """
+        Continuous series of the nearby'th contract, rolling days business days before the endDate of its
+        date range, the same proxy for expiry limroll uses
+        """
+        contracts = sorted(self.contract_dates(symbol), key=lambda x: x[2])
+        rolls = [np.busday_offset(np.datetime64(x[2], 'D'), -days, roll='backward') for x in contracts]
+        prices = dict((x[0], _price(x[0], dates)) for x in contracts)
+        out = np.full(len(dates), np.nan)
+        for j, d in enumerate(dates):
+            # contracts not yet rolled out of on d, the nearby'th of them is the one priced
+            k = bisect.bisect_right(rolls, d) + nearby - 1
+            if k < len(contracts):
+                out[j] = prices[contracts[k][0]][j]
+        return out
+
+    def relations_xml(self, symbol):
+        first, last = self.contracts.get(symbol, (None, None))
+        out = ['<Relations><Relation name="{0}" type="FUTURES"><Children>'.format(symbol)]
+        if first is not None:
+            for name, start, expiry in self.contract_dates(symbol):
+                out.append('<Relation name="{0}" type="FUTURES_CONTRACT" startDate="{1}" endDate="{2}"/>'.format(
+                    name, start.isoformat(), expiry.isoformat()))
+            out.append('<Relation name="{0}_{1}_Q1" type="FUTURES_CONTRACT"/>'.format(symbol, last))
+        out.append('</Children></Relation></Relations>')
+        return ''.join(out)
+
+    def upload(self, body):
+        root = etree.fromstring(body)
+        for row in root.iter('Row'):
+            cols = {x.attrib['num']: x.text for x in row.iter('Col')}
+            symbol = cols['1'].split(':')[-1]
+            d = date(1899, 12, 30) + timedelta(days=int(cols['3']))
+            self.uploads.setdefault(symbol, {})[d] = float(cols['4'])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            data = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                data.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(data)
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def _send(self, code, text):
+        body = text.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        mock = self.mock
+        url = urlparse(self.path)
+        body = self._body() if method == 'POST' else b''
+        mock.requests.append((method, url.path))
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        if method == 'POST' and url.path == '/rs/api/datarequests':
+            text = etree.fromstring(body).findtext('Query/Text')
+            mock.queries.append(text)
+            if mock.failing(text):
+                return self._send(503, 'Service unavailable')
+            return self._datarequest(mock.next_id(), text)
+
+        if mock.failing(url.path):
+            return self._send(503, 'Service unavailable')
+
+        m = re.match(r'^/rs/api/datarequests/(\d+)$', url.path)
+        if method == 'GET' and m:
+            reqid = int(m.group(1))
+            if reqid not in mock._pending:
+                return self._send(404, 'Unknown request id {}'.format(reqid))
+            return self._datarequest(reqid, None)
+
+        m = re.match(r'^/rs/api/schema/relations/([^/]+)$', url.path)
+        if method == 'GET' and m:
+            symbol = m.group(1)
+            if symbol not in mock.contracts:
+                return self._send(404, 'Unknown symbol {}'.format(symbol))
+            return self._send(200, mock.relations_xml(symbol))
+
+        if method == 'POST' and url.path == '/rs/upload':
+            if 'username' not in parse_qs(url.query):
+                return self._send(400, 'username required')
+            mock.upload(body)
+            jobid = mock.next_id()
+            mock._jobs[jobid] = mock.upload_polls
+            return self._send(200, '<response intStatus="202" jobID="{}"/>'.format(jobid))
+
+        m = re.match(r'^/rs/upload/jobreport/(\d+)$', url.path)
+        if method == 'GET' and m:
+            jobid = int(m.group(1))
+            remaining = mock._jobs.get(jobid, 0)
+            mock._jobs[jobid] = remaining - 1
+            code, msg = ('100', 'Running') if remaining > 0 else ('200', 'Job {} complete'.format(jobid))
+            return self._send(200, '<jobreport><status><code>{}</code><message>{}</message></status></jobreport>'.format(code, msg))
+
+        self._send(404, 'Not found: {}'.format(url.path))
+
+    def _datarequest(self, reqid, text):
+        mock = self.mock
+        with mock._lock:
+            if text is not None:
+                mock._pending[reqid] = [text, mock.pending_polls]
+            entry = mock._pending[reqid]
+            entry[1] -= 1
+            pending = entry[1] >= 0
+        if pending:
+            return self._send(200, '<DataRequest id="{}" status="200" statusMsg="Not complete"/>'.format(reqid))
+        if 'badsymbol' in entry[0].lower():
+            return self._send(200, '<DataRequest id="{}" status="300" statusMsg="Unknown symbol"/>'.format(reqid))
+        return self._send(200, mock.datarequest_xml(reqid, entry[0]))
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
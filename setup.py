@@ -55,6 +55,9 @@ setup(
     extras_require={
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'parquet': ['pyarrow'],
+        'otel': ['opentelemetry-api'],
+        'async': ['aiohttp'],
     },
 
     install_requires=[],
@@ -1,10 +1,29 @@
-import pandas as pd, os
+import pandas as pd
+import tempfile
 from lim import lim
+from lim import limpoll
+from lim import limparser
+from lim import limcache
+from lim import limsession
+from lim import limroll
 import unittest
+from lxml import etree
 
 
 class TestLim(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(cls.tmp.name))
+        limcache.set_curve_store(limcache.CurveStore(cls.tmp.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        limcache.set_contract_index(None)
+        limcache.set_curve_store(None)
+        cls.tmp.cleanup()
+
     def test_lim_query(self):
         q = 'Show \r\nFB: FB FP: FP when date is after 2019'
         res = lim.query(q)
@@ -12,6 +31,31 @@ class TestLim(unittest.TestCase):
         self.assertIn('FB', res.columns)
         self.assertIn('FP', res.columns)
 
+    def test_query_poll_stats(self):
+        poller = limpoll.PollScheduler(deadline=60)
+        res = lim.query('Show \r\nFB: FB when date is after 2019', poller=poller)
+        self.assertIn('FB', res.columns)
+        self.assertGreaterEqual(poller.polls, 0)
+        self.assertGreater(poller.elapsed, 0)
+
+    def test_poll_scheduler(self):
+        poller = limpoll.PollScheduler(deadline=0.05, initial=0.01, factor=2, cap=0.04, jitter=0)
+        self.assertAlmostEqual(poller.next_delay(), 0.01)
+        self.assertAlmostEqual(poller.next_delay(), 0.02)
+        self.assertLessEqual(poller.next_delay(), 0.04)
+        self.assertEqual(poller.polls, 3)
+        with self.assertRaises(limpoll.PollTimeout):
+            while True:
+                poller.wait()
+
+    def test_query_many(self):
+        queries = ['Show \r\nFB: FB when date is after 2019', 'Show \r\nFP: FP when date is after 2019', 'Show \r\nXX: NOTASYMBOL']
+        res = lim.query_many(queries, max_workers=2)
+        self.assertEqual(len(res), 3)
+        self.assertIn('FB', res[0].columns)
+        self.assertIn('FP', res[1].columns)
+        self.assertIsInstance(res[2], Exception)
+
     def test_extneded_query(self):
         q = '''
         LET
@@ -35,6 +79,20 @@ class TestLim(unittest.TestCase):
         self.assertEqual(res['GO']['2020-01-02'], 608.5)
         self.assertEqual(res['Brent']['2020-01-02'], 65.56)
 
+    def test_series_batches(self):
+        symbols = ['FB_2020J', 'FP_2020J', 'FB_2020Z', 'FP_2020Z']
+        res = lim.series(symbols, batch_size=2)
+        self.assertEqual(list(res.columns), symbols)
+        pd.testing.assert_frame_equal(res, lim.series(symbols))
+
+        with self.assertRaises(lim.LimBatchError) as cm:
+            lim.series(symbols + ['NOTASYMBOL'], batch_size=2)
+        self.assertEqual(list(cm.exception.errors.keys()), [('NOTASYMBOL',)])
+        self.assertEqual(list(cm.exception.results.columns), symbols)
+
+        res = lim.series(symbols + ['NOTASYMBOL'], batch_size=2, errors='ignore')
+        self.assertEqual(list(res.columns), symbols)
+
     def test_series2(self):
         res = lim.series('PA0002779.6.2')
         self.assertEqual(res['PA0002779.6.2']['2020-01-02'], 479.75)
@@ -67,31 +125,30 @@ class TestLim(unittest.TestCase):
         self.assertEqual(res['M1'][pd.to_datetime('2020-01-02')], 66.25)
         self.assertEqual(res['M12'][pd.to_datetime('2020-01-02')], 60.94)
 
+    def test_local_rollover(self):
+        # the local roll engine against LIM's own, with endDate standing in for the expiration day the
+        # roll dates may be off by a few days, away from them the series agree exactly
+        diff = limroll.compare_rollover('FB', ['M1', 'M2'], '5 days before expiration day', after_date=2019,
+                                        skip_rolls=5)
+        self.assertGreater(len(diff), 200)
+        self.assertEqual(float(diff.abs().max().max()), 0.0)
+
     def test_query_cache(self):
-        dirname, filename = os.path.split(os.path.abspath(__file__))
         q = 'Show \r\nFB: FB FP: FP'
-
-        rf = lim.query_hash(q)
-        test_out_loc = os.path.join(dirname, rf)
-        if os.path.exists(test_out_loc):
-            os.remove(test_out_loc)
-
-        res = lim.query(q, cache_inc=True)
-
-        self.assertTrue(os.path.exists(test_out_loc))
-        res = lim.query(q, cache_inc=True)
-        self.assertTrue(os.path.exists(test_out_loc))
-
-        df = pd.read_hdf(rf, mode='r')
-        self.assertIn('FB', df.columns)
-        self.assertEqual(df.iloc[-1].name, res.iloc[-1].name)
-
-        if os.path.exists(test_out_loc):
-            os.remove(test_out_loc)
+        with tempfile.TemporaryDirectory() as root:
+            limcache.set_backend(limcache.SQLiteCache(root))
+            try:
+                res = lim.query(q, cache_inc=True)
+                self.assertIsNotNone(limcache.get_backend().last_date(lim.query_hash(q, limsession.get_session().server)))
+                res = lim.query(q, cache_inc=True)
+
+                df = limcache.get_backend().read(lim.query_hash(q, limsession.get_session().server))
+                self.assertIn('FB', df.columns)
+                self.assertEqual(df.iloc[-1].name, res.iloc[-1].name)
+            finally:
+                limcache.set_backend(None)
 
     def test_query_cache2(self):
-        dirname, filename = os.path.split(os.path.abspath(__file__))
-
         q = '''
         LET
         FP = FP(ROLLOVER_DATE = "5 days before expiration day",ROLLOVER_POLICY = "actual prices")
@@ -101,23 +158,40 @@ class TestLim(unittest.TestCase):
         FP: FP
         FP_02: FP_M2
         '''
-        rf = lim.query_hash(q)
-        test_out_loc = os.path.join(dirname, rf)
-        if os.path.exists(test_out_loc):
-            os.remove(test_out_loc)
-
-        res = lim.query(q, cache_inc=True)
-
-        self.assertTrue(os.path.exists(test_out_loc))
-        res = lim.query(q, cache_inc=True)
-        self.assertTrue(os.path.exists(test_out_loc))
-
-        df = pd.read_hdf(rf, mode='r')
-        self.assertIn('FP', df.columns)
-        self.assertEqual(df.iloc[-1].name, res.iloc[-1].name)
-
-        if os.path.exists(test_out_loc):
-            os.remove(test_out_loc)
+        with tempfile.TemporaryDirectory() as root:
+            backend = limcache.SQLiteCache(root)
+            res = lim.query_cached(q, backend=backend)
+            res = lim.query_cached(q, backend=backend)
+
+            df = backend.read(lim.query_hash(q, limsession.get_session().server))
+            self.assertIn('FP', df.columns)
+            self.assertEqual(df.iloc[-1].name, res.iloc[-1].name)
+
+            res = lim.query_cached(q, start='2020-01-01', end='2020-01-31', backend=backend)
+            self.assertEqual(res.index[0].month, 1)
+            self.assertEqual(res.index[-1].month, 1)
+
+    def test_parse_datarequest(self):
+        xml = (b'<DataRequest id="1" status="100"><Reports><Report>'
+               b'<ColumnHeadings>FB</ColumnHeadings><ColumnHeadings>FP</ColumnHeadings>'
+               b'<Rows><Row><RowDates>2020-01-02T00:00:00</RowDates><Values>65.56</Values><Values>608.5</Values></Row>'
+               b'<Row><RowDates>2020-01-03T00:00:00</RowDates><Values>66.25</Values><Values>x</Values></Row></Rows>'
+               b'</Report></Reports></DataRequest>')
+        parser = limparser.parse_datarequest(xml[i:i + 16] for i in range(0, len(xml), 16))
+        self.assertEqual(parser.status, 100)
+        res = parser.dataframe()
+        self.assertEqual(list(res.columns), ['FB', 'FP'])
+        self.assertEqual(res['FP']['2020-01-02'], 608.5)
+        self.assertEqual(res['FB']['2020-01-03'], 66.25)
+        self.assertTrue(pd.isna(res['FP']['2020-01-03']))
+
+        tree = lim.build_dataframe(etree.fromstring(xml)[0])
+        pd.testing.assert_frame_equal(tree, res)
+
+        pending = limparser.parse_datarequest([b'<DataRequest id="7" status="200"/>'])
+        self.assertIsNone(pending._values)
+        with self.assertRaises(ValueError):
+            limparser.parse_datarequest([xml.replace(b'<Values>x</Values>', b'')]).dataframe()
 
     def test_pra_symbol(self):
         self.assertFalse(lim.check_pra_symbol('FB'))
@@ -0,0 +1,111 @@
+import time
+import threading
+import unittest
+from lim import lim
+from lim import limadmit
+from lim import limsession
+from lim.mockserver import MockLimServer
+
+
+class TestLimAdmit(unittest.TestCase):
+
+    def test_lanes(self):
+        admission = limadmit.Admission(max_in_flight=1)
+        admission.acquire()
+        order = []
+
+        def request(name):
+            admission.acquire(name)
+            order.append(name)
+            admission.release(True)
+
+        threads = []
+        for name in ['upload', 'batch', 'interactive']:
+            threads.append(threading.Thread(target=request, args=(name,)))
+            threads[-1].start()
+            time.sleep(0.05)
+        admission.release(True)
+        for x in threads:
+            x.join()
+        self.assertEqual(order, ['interactive', 'batch', 'upload'])
+        stats = admission.stats()
+        self.assertEqual(stats['upload.admitted'], 1)
+        self.assertGreater(stats['upload.wait_p50'], stats['interactive.wait_p50'])
+
+        admission.acquire()
+        admission.queue_timeout = 0.05
+        with self.assertRaises(limadmit.LimRejected):
+            admission.acquire('batch')
+        self.assertEqual(admission.stats()['batch.rejected'], 1)
+        self.assertEqual(admission.stats()['waiting'], 0)
+
+        with limadmit.lane('upload'):
+            self.assertEqual(limadmit.bind(limadmit.current_lane)(), 'upload')
+        self.assertEqual(limadmit.current_lane(), 'interactive')
+
+    def test_rate(self):
+        admission = limadmit.Admission(rate=50, burst=5)
+        start = time.monotonic()
+        for _ in range(15):
+            admission.release(True, admission.acquire())
+        # the burst goes at once, the other 10 at 50 a second
+        self.assertGreater(time.monotonic() - start, 0.18)
+
+    def test_breaker(self):
+        breaker = limadmit.CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(limadmit.CircuitOpen):
+            breaker.allow()
+
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        with self.assertRaises(limadmit.CircuitOpen):
+            breaker.allow()  # one trial at a time
+        breaker.record(False, True)
+        self.assertEqual((breaker.state, breaker.opens), ('open', 2))
+
+        time.sleep(0.1)
+        breaker.record(True, breaker.allow())
+        self.assertEqual(breaker.state, 'closed')
+        self.assertFalse(breaker.allow())
+
+    def test_server(self):
+        server = MockLimServer().start()
+        limsession.set_session(limsession.LimSession(server.url, 'user', 'password'))
+        admission = limadmit.configure(server.url, failure_threshold=2, reset_timeout=60)
+        try:
+            server.failures['FB'] = 2
+            for _ in range(2):
+                with self.assertRaises(limadmit.LimHTTPError) as e:
+                    lim.query('Show \r\nFB: FB')
+                self.assertEqual(e.exception.status, 503)
+                self.assertTrue(e.exception.transient)
+
+            queries = len(server.queries)
+            with self.assertRaises(limadmit.CircuitOpen):
+                lim.query('Show \r\nFP: FP')
+            self.assertEqual(len(server.queries), queries)
+            self.assertEqual(admission.stats()['short_circuited'], 1)
+
+            admission.breaker.reset_timeout = 0
+            self.assertEqual(list(lim.query('Show \r\nFP: FP').columns), ['FP'])
+            self.assertEqual(admission.stats()['state'], 'closed')
+
+            # a streamed reply holds its slot until closed
+            session = limsession.get_session()
+            resp = session.get(session.url('/rs/api/schema/relations/FB'), stream=True)
+            self.assertEqual(admission.stats()['in_flight'], 1)
+            with resp:
+                resp.content
+            self.assertEqual(admission.stats()['in_flight'], 0)
+        finally:
+            limsession.set_session(None)
+            limadmit.reset(server.url)
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
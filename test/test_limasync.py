@@ -0,0 +1,123 @@
+import asyncio
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+import pandas as pd
+from lim import lim
+from lim import limcache
+from lim import limpoll
+from lim import limsession
+from lim import limuploader
+from lim import limasync
+from lim import limadmit
+from lim.mockserver import MockLimServer
+
+
+@unittest.skipUnless(importlib.util.find_spec('aiohttp'), 'needs aiohttp')
+class TestLimAsync(unittest.IsolatedAsyncioTestCase):
+    """
+    The asyncio client against the local mock server, compared with the blocking calls
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockLimServer(pending_polls=1, upload_polls=1).start()
+        limsession.set_session(limsession.LimSession(cls.server.url, 'user', 'password'))
+        cls.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(cls.tmp.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        cls.server.stop()
+        cls.tmp.cleanup()
+
+    async def asyncTearDown(self):
+        await limasync.close_sessions()
+
+    async def test_admission(self):
+        admission = limadmit.configure(self.server.url, max_in_flight=1)
+        try:
+            queries = ['Show \r\nFB: FB when date is after {}'.format(2010 + i) for i in range(4)]
+            res = await limasync.aquery_many(queries)
+            self.assertTrue(all(isinstance(x, pd.DataFrame) for x in res))
+            stats = admission.stats()
+            self.assertGreaterEqual(stats['interactive.admitted'], 4)
+            self.assertEqual((stats['in_flight'], stats['waiting']), (0, 0))
+            self.assertGreater(stats['interactive.wait_p95'], 0)
+        finally:
+            limadmit.reset(self.server.url)
+
+        # coroutines queue by lane like threads, each task in its own lane
+        admission = limadmit.Admission(max_in_flight=1)
+        admission.acquire()
+        order = []
+
+        async def request(name):
+            with limadmit.lane(name):
+                await admission.acquire_async()
+                order.append(name)
+                admission.release(True)
+
+        tasks = []
+        for name in ['upload', 'batch', 'interactive']:
+            tasks.append(asyncio.ensure_future(request(name)))
+            await asyncio.sleep(0.01)
+        admission.release(True)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ['interactive', 'batch', 'upload'])
+
+    async def test_aquery(self):
+        q = 'Show \r\nFB: FB\r\nFP: FP when date is after 2019'
+        poller = limpoll.PollScheduler()
+        res = await limasync.aquery(q, poller=poller)
+        self.assertEqual(poller.polls, 1)
+        pd.testing.assert_frame_equal(res, lim.query(q))
+        with self.assertRaises(Exception):
+            await limasync.aquery('Show \r\nXX: BADSYMBOL')
+
+    async def test_aseries(self):
+        symbols = ['FB_2020J', 'FP_2020J', 'FB_2020Z', 'FP_2020Z', 'AAGXJ00']
+        res = await limasync.aseries(symbols, batch_size=2)
+        pd.testing.assert_frame_equal(res, lim.series(symbols))
+        results = await asyncio.gather(*[limasync.aseries('FB') for _ in range(50)])
+        self.assertTrue(all(x.equals(results[0]) for x in results))
+
+    async def test_curve_rollover_contracts(self):
+        pd.testing.assert_frame_equal(await limasync.acurve({'FB': 'Brent'}), lim.curve({'FB': 'Brent'}))
+        pd.testing.assert_frame_equal(await limasync.acontinuous_futures_rollover('FB', months=['M1', 'M2'], after_date=2019),
+                                      lim.continuous_futures_rollover('FB', months=['M1', 'M2'], after_date=2019))
+        res = await limasync.afutures_contracts('FB', 2019, 2020)
+        pd.testing.assert_frame_equal(res, lim.futures_contracts('FB', 2019, 2020))
+
+    async def test_cancel(self):
+        with MockLimServer(pending_polls=1000) as server:
+            async with limasync.AsyncLimSession(server.url, 'user', 'password') as session:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(limasync.aquery('Show \r\nFB: FB', session=session), 0.5)
+                with self.assertRaises(limpoll.PollTimeout):
+                    await limasync.aquery('Show \r\nFB: FB', deadline=0.3, session=session)
+
+    async def test_aupload_series(self):
+        idx = pd.bdate_range('2019-01-01', periods=30)
+        df = pd.DataFrame(np.round(np.random.rand(30, 2), 4), index=idx, columns=['TopRelation:Test:AUP1', 'TopRelation:Test:AUP2'])
+        admission = limadmit.configure(self.server.url)
+        try:
+            reports = await limasync.aupload_series(df, {'description': 'desc'}, max_cells=20, max_in_flight=2)
+            stats = admission.stats()
+        finally:
+            limadmit.reset(self.server.url)
+        self.assertEqual([x.chunk for x in reports], [0, 1, 2])
+        # submissions and status polls, the lane of the caller is left alone
+        self.assertGreaterEqual(stats['upload.admitted'], 6)
+        self.assertEqual(stats['interactive.admitted'], 0)
+        self.assertEqual(limadmit.current_lane(), 'interactive')
+        self.assertTrue(all(x.code in limuploader.done_codes for x in reports))
+        res = await limasync.aseries(['AUP1', 'AUP2'])
+        np.testing.assert_allclose(res.loc[idx].values, df.values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from lim import limcache
+import unittest
+
+
+def frame(start, periods, columns=('FB', 'FP'), offset=0.0):
+    index = pd.bdate_range(start, periods=periods)
+    data = {c: np.arange(periods, dtype=float) + i * 100 + offset for i, c in enumerate(columns)}
+    return pd.DataFrame(data, index=index)
+
+
+class BackendTests(object):
+
+    def backend(self, root):
+        raise NotImplementedError
+
+    def test_append_read(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = self.backend(root)
+            self.assertIsNone(cache.read('k'))
+            self.assertIsNone(cache.last_date('k'))
+
+            first = frame('2020-01-01', 20)
+            cache.append('k', first)
+            pd.testing.assert_frame_equal(cache.read('k'), first, check_freq=False, check_index_type=False)
+
+            # overlapping tail with a revised value and a new column
+            tail = frame('2020-01-24', 10, columns=('FB', 'FP', 'FG'), offset=0.5)
+            cache.append('k', tail)
+            res = cache.read('k')
+            self.assertEqual(list(res.columns), ['FB', 'FP', 'FG'])
+            self.assertEqual(res.index[-1], tail.index[-1])
+            self.assertEqual(cache.last_date('k'), tail.index[-1])
+            self.assertEqual(res['FB'][tail.index[0]], tail['FB'].iloc[0])
+            self.assertEqual(res['FB'][first.index[0]], first['FB'].iloc[0])
+            self.assertTrue(np.isnan(res['FG'][first.index[0]]))
+            self.assertEqual(len(res), len(first.index.union(tail.index)))
+
+    def test_date_range(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = self.backend(root)
+            cache.append('k', frame('2019-01-01', 300))
+            cache.append('k', frame('2020-03-01', 100))
+            res = cache.read('k', start='2020-01-01', end='2020-01-31')
+            self.assertEqual(res.index[0], pd.Timestamp('2020-01-01'))
+            self.assertEqual(res.index[-1], pd.Timestamp('2020-01-31'))
+
+            cache.delete('k')
+            self.assertIsNone(cache.read('k'))
+
+    def test_concurrent_append(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = self.backend(root)
+
+            def worker(i):
+                with cache.lock('k'):
+                    cache.append('k', frame('2020-01-01', 50, columns=('C{}'.format(i),)))
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+            [t.start() for t in threads]
+            [t.join() for t in threads]
+            res = cache.read('k')
+            self.assertEqual(sorted(res.columns), sorted('C{}'.format(i) for i in range(8)))
+            self.assertEqual(len(res), 50)
+
+
+class TestSQLiteCache(BackendTests, unittest.TestCase):
+
+    def backend(self, root):
+        return limcache.SQLiteCache(root)
+
+
+@unittest.skipIf(not limcache.has_pyarrow(), 'pyarrow not installed')
+class TestParquetCache(BackendTests, unittest.TestCase):
+
+    def backend(self, root):
+        return limcache.ParquetCache(root)
+
+    def test_compact(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = self.backend(root)
+            cache.append('k', frame('2020-01-01', 20))
+            cache.append('k', frame('2020-01-20', 20, offset=0.5))
+            before = cache.read('k')
+            cache.compact('k')
+            self.assertEqual(len(os.listdir(os.path.join(root, 'k'))), 1)
+            pd.testing.assert_frame_equal(cache.read('k'), before)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_lru_budget(self):
+        df = frame('2020-01-01', 100)
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        cache = limcache.ResultCache(max_bytes=size * 2, ttl=60)
+        cache.put('a', df)
+        cache.put('b', df)
+        self.assertTrue(cache.get('a')[0])  # a is now most recently used
+        cache.put('c', df)
+        self.assertFalse(cache.get('b')[0])
+        self.assertTrue(cache.get('a')[0])
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], size * 2)
+
+    def test_ttl_and_copy(self):
+        cache = limcache.ResultCache(ttl=60)
+        cache.put('a', frame('2020-01-01', 5))
+        found, res = cache.get('a')
+        res['FB'] = 0
+        self.assertEqual(cache.get('a')[1]['FB'].iloc[-1], 4)
+
+        cache.put('b', 1, ttl=0)
+        self.assertFalse(cache.get('b')[0])
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_single_flight(self):
+        cache = limcache.ResultCache()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return frame('2020-01-01', 5)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_call('q', fetch))) for i in range(5)]
+        [t.start() for t in threads]
+        while cache.stats()['misses'] < 5:
+            pass
+        release.set()
+        [t.join() for t in threads]
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(cache.stats()['collapsed'], 4)
+
+        cache.get_or_call('q', fetch)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_normalize_query(self):
+        self.assertEqual(limcache.normalize_query('Show \r\nFB:  FB\n'), 'Show FB: FB')
+
+
+class TestFileLock(unittest.TestCase):
+
+    def test_timeout(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'x.lock')
+            with limcache.FileLock(path):
+                with self.assertRaises(TimeoutError):
+                    limcache.FileLock(path, timeout=0.1).acquire()
+
+
+
+class TestContractIndex(unittest.TestCase):
+
+    def test_store_lookup(self):
+        contracts = [('FB_2019Z', '2016-01-01', '2019-10-31'), ('FB_2020F', None, None), ('FB_2020_Q1', None, None)]
+        with tempfile.TemporaryDirectory() as root:
+            index = limcache.ContractIndex(root, ttl=60)
+            self.assertFalse(index.fresh('srv', 'FB'))
+            index.store('srv', 'FB', contracts)
+            self.assertTrue(index.fresh('srv', 'FB'))
+            self.assertEqual(index.contracts('srv', 'FB'), ['FB_2019Z', 'FB_2020F', 'FB_2020_Q1'])
+            self.assertEqual(index.contracts('srv', 'FB', monthly=True), ['FB_2019Z', 'FB_2020F'])
+            self.assertEqual(index.contracts('srv', 'FB', start_year=2020), ['FB_2020F'])
+            self.assertEqual(index.contracts('other', 'FB'), [])
+
+            meta = limcache.ContractIndex(root).metadata('srv', 'FB')
+            self.assertEqual(list(meta['month'][:2]), ['Z', 'F'])
+            self.assertEqual(meta['end_date'][0], pd.Timestamp('2019-10-31'))
+
+            index.ttl = 0
+            self.assertFalse(index.fresh('srv', 'FB'))
+            index.invalidate('srv', 'FB')
+            self.assertIsNone(index.fetched('srv', 'FB'))
+            self.assertEqual(index.contracts('srv', 'FB'), [])
+
+    def test_parse_contract(self):
+        self.assertEqual(limcache.parse_contract('FB_2020Z'), (2020, 'Z'))
+        self.assertEqual(limcache.parse_contract('FB_2020_Q1'), (None, None))
+
+
+
+class TestCurveStore(unittest.TestCase):
+
+    def test_store_read(self):
+        dates = pd.to_datetime(['2020-03-16', '2020-03-17', '2020-03-18'])
+        curve = pd.Series([60.0, np.nan, 61.5], index=pd.date_range('2020-04-01', periods=3, freq='MS'))
+        with tempfile.TemporaryDirectory() as root:
+            store = limcache.CurveStore(root)
+            self.assertEqual(store.missing('srv', 'FB', 'Close', dates), list(dates))
+            store.store('srv', 'FB', 'Close', {dates[0]: curve, dates[1]: None})
+            self.assertEqual(store.missing('srv', 'FB', 'Close', dates), [dates[2]])
+            self.assertEqual(store.missing('srv', 'FB', 'Settle', dates), list(dates))
+
+            res = store.read('srv', 'FB', 'Close', dates)
+            self.assertEqual(list(res.columns), [dates[0]])
+            self.assertEqual(res[dates[0]].to_dict(), curve.dropna().to_dict())
+
+            store.invalidate(symbol='FB')
+            self.assertEqual(len(store.read('srv', 'FB', 'Close', dates)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
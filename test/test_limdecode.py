@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+import pandas as pd
+from lim import lim
+from lim import limdecode
+from lim import limparser
+from lim import limsession
+from lim.mockserver import MockLimServer
+
+
+class TestLimDecode(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockLimServer().start()
+        limsession.set_session(limsession.LimSession(cls.server.url, 'user', 'password'))
+        cls.decoder = limdecode.ProcessDecoder(1, threshold=64 * 1024)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.decoder.close()
+        limsession.set_session(None)
+        cls.server.stop()
+
+    def test_decode(self):
+        body = self.server.datarequest_xml(1, 'Show \nFB: FB\nFP: FP\n').encode()
+        reply = self.decoder.parse([body[i:i + 1000] for i in range(0, len(body), 1000)])
+        self.assertIsInstance(reply, limdecode.DecodedReply)
+        df = reply.dataframe()
+        self.assertTrue(np.shares_memory(df.to_numpy(), reply.values()))
+        pd.testing.assert_frame_equal(df, limparser.parse_datarequest([body]).dataframe())
+
+        small = self.decoder.parse([b'<DataRequest id="7" status="200" statusMsg="Not complete"/>'])
+        self.assertIsInstance(small, limparser.DataRequestParser)
+        empty = self.decoder.decode(self.server.datarequest_xml(2, 'Show \nFB: FB\nWHEN date is after 2030').encode())
+        self.assertEqual((empty.status, empty.dataframe()), (130, None))
+
+    def test_query(self):
+        symbols = ['FB', 'FP', 'AAGXJ00']
+        expected = lim.series(symbols)
+        limdecode.decoder = self.decoder
+        try:
+            pd.testing.assert_frame_equal(lim.series(symbols), expected)
+        finally:
+            limdecode.decoder = None
+
+
+if __name__ == '__main__':
+    unittest.main()
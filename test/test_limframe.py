@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+import pandas as pd
+from lim import limframe
+
+
+def strip():
+    index = pd.bdate_range('2020-01-01', periods=6)
+    return pd.DataFrame({'FB_2020F': [1.0, 2.0, 3.0, np.nan, np.nan, np.nan],
+                         'FB_2020G': [np.nan, 12.0, 13.0, 14.0, np.nan, np.nan],
+                         'FB_2020H': [np.nan, np.nan, np.nan, 24.0, 25.0, 26.5]}, index=index)
+
+
+class TestCompactFrame(unittest.TestCase):
+
+    def test_round_trip(self):
+        df = strip()
+        compact = limframe.CompactFrame.from_frame(df)
+        self.assertEqual(len(compact), 9)
+        self.assertEqual(list(compact.offsets), [0, 3, 6, 9])
+        pd.testing.assert_frame_equal(compact.to_wide(), df, check_freq=False, check_index_type=False)
+        pd.testing.assert_series_equal(compact['FB_2020G'], df['FB_2020G'].dropna(), check_freq=False, check_index_type=False)
+
+        long = compact.to_long()
+        self.assertEqual(list(long.columns), ['date', 'symbol', 'value'])
+        self.assertEqual(list(long['symbol'].cat.categories), list(df.columns))
+        self.assertEqual(long['value'].sum(), df.sum().sum())
+
+    def test_concat_rename(self):
+        df = strip()
+        parts = [limframe.CompactFrame.from_frame(df[['FB_2020F']]), limframe.CompactFrame.from_frame(df[['FB_2020G', 'FB_2020H']])]
+        compact = limframe.CompactFrame.concat(parts).rename({'FB_2020F': 'F'})
+        self.assertEqual(list(compact.symbols), ['F', 'FB_2020G', 'FB_2020H'])
+        pd.testing.assert_frame_equal(compact.to_wide(), df.rename(columns={'FB_2020F': 'F'}), check_freq=False, check_index_type=False)
+        with self.assertRaises(ValueError):
+            limframe.CompactFrame.concat(parts + parts)
+
+    def test_convert(self):
+        df = strip()
+        self.assertIs(limframe.convert(df), df)
+        self.assertEqual(limframe.convert(df, 'wide', np.float32).dtypes.unique().tolist(), [np.float32])
+        compact = limframe.convert(df, 'compact', np.float32)
+        self.assertEqual(compact.values.dtype, np.float32)
+        self.assertLess(compact.memory_usage(), df.memory_usage().sum())
+        sparse = limframe.convert(df, 'sparse')
+        self.assertAlmostEqual(sparse['FB_2020H'].sparse.density, 0.5)
+        pd.testing.assert_frame_equal(limframe.convert(compact, 'long'), compact.to_long())
+        with self.assertRaises(ValueError):
+            limframe.convert(df, 'tall')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from lim import lim
+from lim import limmetrics
+from lim import limsession
+from lim.mockserver import MockLimServer
+
+
+class TestLimMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        limmetrics.disable()
+
+    def test_disabled(self):
+        self.assertFalse(limmetrics.enabled())
+        self.assertIs(limmetrics.span('query'), limmetrics.span('upload.chunk'))
+        limmetrics.count('query.polls')
+
+    def test_memory_collector(self):
+        collector = limmetrics.enable()
+        for x in range(1, 101):
+            limmetrics.observe('phase', x / 1000.0)
+        with self.assertRaises(ValueError):
+            with limmetrics.span('phase', status='bad'):
+                raise ValueError()
+        limmetrics.count('polls', 3)
+        limmetrics.count('polls', 2)
+
+        stats = collector.summary()['spans'][('phase', ())]
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['p50'], 0.0505)
+        self.assertAlmostEqual(stats['max'], 0.1)
+        self.assertEqual(collector.counter('polls'), 5)
+        self.assertEqual(collector.counter('phase.errors', status='bad'), 1)
+        self.assertEqual(len(collector.durations('phase', status='bad')), 1)
+
+        text = collector.prometheus()
+        self.assertIn('# TYPE lim_phase_seconds summary', text)
+        self.assertIn('lim_phase_seconds_count 100', text)
+        self.assertIn('lim_phase_seconds{status="bad",quantile="0.5"}', text)
+        self.assertIn('lim_polls_total 5', text)
+
+    def test_query_spans(self):
+        collector = limmetrics.enable()
+        with MockLimServer(pending_polls=2) as server:
+            limsession.set_session(limsession.LimSession(server.url, 'user', 'password'))
+            try:
+                lim.query('Show \r\nFB: FB when date is after 2019')
+            finally:
+                limsession.set_session(None)
+
+        self.assertEqual(len(collector.durations('query')), 1)
+        self.assertEqual(len(collector.durations('datarequest.request')), 3)
+        self.assertEqual(len(collector.durations('build_dataframe')), 1)
+        self.assertEqual(collector.counter('datarequest.pending'), 2)
+        self.assertEqual(collector.counter('query.polls'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
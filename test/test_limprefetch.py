@@ -0,0 +1,95 @@
+import time
+import tempfile
+import unittest
+import pandas as pd
+from lim import lim
+from lim import limcache
+from lim import limprefetch
+from lim import limsession
+from lim.mockserver import MockLimServer
+
+
+class TestLimPrefetch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockLimServer().start()
+        limsession.set_session(limsession.LimSession(cls.server.url, 'user', 'password'))
+        cls.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(cls.tmp.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        limcache.disable_result_cache()
+        cls.server.stop()
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        limcache.disable_result_cache()
+
+    def test_warm(self):
+        expected = lim.series(['FB', 'FP'])
+        curve = lim.curve('FB')
+        prefetcher = limprefetch.Prefetcher(max_workers=2, backend=limcache.SQLiteCache(self.tmp.name))
+        prefetcher.add_series(['FB', 'FP'])
+        prefetcher.add_curve('FB')
+        prefetcher.add_contracts('FB', 2019, 2020)
+        prefetcher.refresh_all()
+
+        queries = len(self.server.queries)
+        pd.testing.assert_frame_equal(lim.series(['FB', 'FP']), expected, check_freq=False, check_index_type=False)
+        pd.testing.assert_frame_equal(lim.curve('FB'), curve)
+        self.assertEqual(len(lim.futures_contracts('FB', 2019, 2020).columns), 24)
+        self.assertEqual(len(self.server.queries), queries)
+
+        # the second refresh only asks for the last few days
+        prefetcher.refresh_all()
+        self.assertIn('date is after', self.server.queries[-1])
+
+        status = prefetcher.status()
+        self.assertEqual(list(status['kind']), ['series', 'curve', 'contracts'])
+        self.assertTrue((status['refreshes'] == 2).all())
+        self.assertEqual(status.loc['FB,FP', 'data_date'], expected.index[-1])
+        self.assertGreater(status.loc['FB,FP', 'lag'], 0)
+        self.assertTrue(status['curve' == status['kind']]['lag'].isna().all())
+
+    def test_concurrent_warm(self):
+        prefetcher = limprefetch.Prefetcher(max_workers=4)
+        cache = limcache.result_cache
+        self.assertEqual(cache.ttl, limcache.ResultCache().ttl)
+        for x in ['FB', 'FP', 'FB_2020Z', 'FP_2020Z']:
+            prefetcher.add_curve(x)
+        prefetcher.refresh_all()
+        self.assertIs(limcache.result_cache, cache)
+        self.assertEqual(cache.stats()['entries'], 4)
+
+    def test_refreshes(self):
+        with tempfile.TemporaryDirectory() as root:
+            prefetcher = limprefetch.Prefetcher(backend=limcache.SQLiteCache(root))
+            entry = prefetcher.add_series(['FB'])
+            for _ in range(4):
+                queries = len(self.server.queries)
+                prefetcher.refresh_all()
+                self.assertEqual(len(self.server.queries) - queries, 1)
+            self.assertEqual(entry.refreshes, 4)
+
+    def test_schedule(self):
+        prefetcher = limprefetch.Prefetcher(backend=limcache.SQLiteCache(self.tmp.name))
+        entry = prefetcher.add_query('Show \r\nXX: BADSYMBOL', every=0.2)
+        with prefetcher:
+            time.sleep(limprefetch.tick * 1.5)
+        self.assertGreaterEqual(entry.failures, 1)
+        self.assertEqual(entry.refreshes, 0)
+        self.assertIsNotNone(prefetcher.status().loc[entry.name, 'error'])
+
+        entry = limprefetch.Entry('query', 'daily', None, at=['06:00', '18:30'])
+        entry.schedule(pd.Timestamp('2020-01-02 12:00').to_pydatetime())
+        self.assertEqual(entry.due, pd.Timestamp('2020-01-02 18:30').to_pydatetime())
+        entry.schedule(pd.Timestamp('2020-01-02 19:00').to_pydatetime())
+        self.assertEqual(entry.due, pd.Timestamp('2020-01-03 06:00').to_pydatetime())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+from datetime import date
+import numpy as np
+import pandas as pd
+from lim import limcache
+from lim import limroll
+from lim import limsession
+from lim.mockserver import MockLimServer
+
+
+class TestLimRoll(unittest.TestCase):
+
+    def test_continuous(self):
+        index = pd.bdate_range('2020-01-01', '2020-03-31')
+        prices = pd.DataFrame({'A': 1.0, 'B': 2.0, 'C': 3.0}, index=index)
+        expiries = pd.Series(pd.to_datetime(['2020-03-20', '2020-01-20', '2020-02-20']), index=['C', 'A', 'B'])
+        res = limroll.continuous(prices, expiries, ['M1', 'M2'], '2 days before expiration day')
+        self.assertEqual(res.loc['2020-01-15', 'M1'], 1.0)
+        self.assertEqual(res.loc['2020-01-16', 'M1'], 2.0)  # two business days before the 20th
+        self.assertEqual(res.loc['2020-01-16', 'M2'], 3.0)
+        self.assertTrue(np.isnan(res.loc['2020-02-18', 'M2']))
+        self.assertEqual(res.index[-1], pd.Timestamp('2020-03-17'))
+        self.assertEqual(limroll.parse_rollover_date('expiration day'), 0)
+        with self.assertRaises(ValueError):
+            limroll.parse_rollover_date('last business day of the month')
+
+    def test_against_server(self):
+        # MockLimServer.rollover rolls on the same endDate rule, so this checks the plumbing and the
+        # stitching against an independent per-date implementation, not LIM's calendar: see test_lim
+        with MockLimServer(end='2024-12-31', contracts={'FB': (2015, 2028)}) as server, tempfile.TemporaryDirectory() as tmp:
+            limsession.set_session(limsession.LimSession(server.url, 'user', 'password'))
+            limcache.set_contract_index(limcache.ContractIndex(tmp))
+            try:
+                for rule in ('5 days before expiration day', '1 days before expiration day'):
+                    diff = limroll.compare_rollover('FB', ['M1', 'M3', 'M12'], rule, 2019)
+                    self.assertGreater(len(diff), 1000)
+                    self.assertEqual(float(diff.abs().max().max()), 0.0)
+                    away = limroll.compare_rollover('FB', ['M1', 'M3', 'M12'], rule, 2019, skip_rolls=2)
+                    self.assertLessEqual(len(away), len(diff) - 5 * 12 * 5)  # five days around each monthly roll, five years
+                    self.assertTrue(away.index.isin(diff.index).all())
+                prices, expiries = limroll.contract_data('FB', 2019, date.today().year + 3)
+                queries = len(server.queries)
+                sweep = limroll.roll_sweep(prices, expiries, ['{} days before expiration day'.format(x) for x in range(10)], ['M1', 'M2'])
+                self.assertEqual(len(sweep), 10)
+                self.assertEqual(len(server.queries), queries)
+            finally:
+                limsession.set_session(None)
+                limcache.set_contract_index(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
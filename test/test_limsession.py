@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+from lim import limsession
+
+
+class TestLimSession(unittest.TestCase):
+
+    def tearDown(self):
+        limsession.use_profile(None)
+        limsession.set_session(None, 'test')
+        limsession.set_session(None, 'other')
+        limsession._profiles.pop('test', None)
+
+    def test_profiles(self):
+        limsession.add_profile('test', 'http://test-server/', 'user', 'password', pool_maxsize=2)
+        session = limsession.get_session('test')
+        self.assertEqual(session.url('/rs'), 'http://test-server/rs')
+        self.assertIs(limsession.get_session('test'), session)
+
+        env = {'LIMSERVER_OTHER': 'http://other-server', 'LIMUSERNAME_OTHER': 'u', 'LIMPASSWORD_OTHER': 'p'}
+        with mock.patch.dict(os.environ, env):
+            previous = limsession.use_profile('other')
+            self.assertEqual(limsession.get_session().server, 'http://other-server')
+            self.assertEqual(limsession.get_session().username, 'u')
+        limsession.use_profile(previous)
+        self.assertIsNot(limsession.get_session('other'), session)
+
+    def test_import_is_lazy(self):
+        # importing must not need LIM credentials nor load pandas, lxml or requests
+        code = ('import sys, lim.lim, lim.limuploader;'
+                'q = lim.lim.build_series_query(["FB"]);'
+                'print(sorted(m for m in ("pandas", "numpy", "lxml.etree", "requests") if m in sys.modules))')
+        env = dict((k, v) for k, v in os.environ.items() if not k.startswith('LIM'))
+        out = subprocess.check_output([sys.executable, '-c', code], env=env, cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(out.strip(), b'[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import pandas as pd
 from lim import limuploader
 from lim import lim
 import unittest
+from lxml import etree
 from random import random
 from datetime import datetime
 
@@ -19,11 +20,59 @@ class TestLimUploader(unittest.TestCase):
             'description': 'desc'
         }
 
-        limuploader.upload_series(df, dfmeta)
+        reports = limuploader.upload_series(df, dfmeta)
+        self.assertEqual(len(reports), 1)
+        self.assertIn(reports[0].code, limuploader.done_codes)
+        self.assertEqual(reports[0].cells, 2)
+        self.assertIsNone(reports[0].error)
         df = lim.series(['SPOTPRICE', 'SPOTPRICE2'])
         self.assertAlmostEquals(df.loc[dn]['SPOTPRICE'], r1, 2)
         self.assertAlmostEquals(df.loc[dn]['SPOTPRICE2'], r2, 2)
 
+    def test_build_upload_xml(self):
+        columns = ['TopRelation:Test:A;TopColumn:Price:Settle', 'TopRelation:Test:B&C']
+        df = pd.DataFrame({columns[0]: [1.5, None], columns[1]: [2.0, 3.25]},
+                          index=pd.to_datetime(['2020-01-02', '2020-01-03']))
+        root = etree.fromstring(limuploader.build_upload_xml(df, {'description': 'desc'}))
+        rows = [[c.text for c in r.iter('Col')] for r in root.iter('Row')]
+        self.assertEqual([r.attrib['num'] for r in root.iter('Row')], ['1', '2', '3'])
+        self.assertEqual(rows, [
+            ['TopRelation:Test:A', 'TopColumn:Price:Settle', '43832', '1.5', 'desc'],
+            ['TopRelation:Test:B&C', limuploader.default_column, '43832', '2.0', 'desc'],
+            ['TopRelation:Test:B&C', limuploader.default_column, '43833', '3.25', 'desc'],
+        ])
+
+    def test_chunk_bounds(self):
+        df = pd.DataFrame({'TopRelation:Test:A': [1.0, None, 3.0, None, 5.0], 'TopRelation:Test:B': [1.0, None, None, 4.0, 5.0]},
+                          index=pd.bdate_range('2020-01-01', periods=5))
+        self.assertEqual(limuploader.chunk_bounds(df, {}, max_cells=2), [(0, 2), (2, 4), (4, 5)])
+        self.assertEqual(limuploader.chunk_bounds(df, {}, max_cells=1), [(0, 1), (1, 3), (3, 4), (4, 5)])
+        self.assertEqual(limuploader.chunk_bounds(df, {}, max_cells=100), [(0, 5)])
+        per_cell = limuploader.cell_bytes(df, {})[0]
+        self.assertEqual(limuploader.chunk_bounds(df, {}, max_bytes=per_cell * 3), [(0, 3), (3, 5)])
+
+    def test_stream_bodies(self):
+        index = pd.bdate_range('2020-01-01', periods=6)
+        df = pd.DataFrame({'TopRelation:Test:A': [1.0, 2.0, None, 4.0, 5.0, 6.0], 'TopRelation:Test:B': [1.5] * 6}, index=index)
+        bodies = list(limuploader.stream_bodies(frames_of(df), {'description': 'desc'}, max_cells=100))
+        self.assertEqual(len(bodies), 1)
+        body, rows, cells = bodies[0]
+        self.assertEqual((rows, cells), (6, 11))
+        self.assertEqual(b''.join(body), limuploader.build_upload_xml(df, {'description': 'desc'}))
+
+        bodies = list(limuploader.stream_bodies(frames_of(df), {}, max_cells=4))
+        self.assertEqual([(rows, cells) for _, rows, cells in bodies], [(2, 4), (2, 3), (2, 4)])
+
+        records = [(d, c, v) for c in df.columns for d, v in df[c].dropna().items()]
+        body, rows, cells = next(limuploader.stream_bodies(iter(records), {'description': 'desc'}))
+        self.assertEqual((rows, cells), (6, 11))
+        self.assertEqual(b''.join(body), limuploader.build_upload_xml(df, {'description': 'desc'}))
+
+
+def frames_of(df, size=2):
+    for i in range(0, len(df), size):
+        yield df.iloc[i:i + size]
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,297 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from lim import lim
+from lim import limadmit
+from lim import limcache
+from lim import limframe
+from lim import limplanner
+from lim import limpoll
+from lim import limsession
+from lim import limuploader
+from lim.mockserver import MockLimServer
+
+
+class TestMockServer(unittest.TestCase):
+    """
+    The lim and limuploader flows end to end against the local mock server, no LIM credentials needed
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockLimServer(pending_polls=1, upload_polls=1).start()
+        limsession.set_session(limsession.LimSession(cls.server.url, 'user', 'password'))
+        cls.tmp = tempfile.TemporaryDirectory()
+        limcache.set_contract_index(limcache.ContractIndex(cls.tmp.name))
+
+    @classmethod
+    def tearDownClass(cls):
+        limsession.set_session(None)
+        limcache.set_contract_index(None)
+        cls.server.stop()
+        cls.tmp.cleanup()
+
+    def test_query(self):
+        poller = limpoll.PollScheduler(deadline=10, initial=0.01)
+        res = lim.query('Show \r\nFB: FB FP: FP when date is after 2019', poller=poller)
+        self.assertEqual(list(res.columns), ['FB', 'FP'])
+        self.assertEqual(res.index[0], pd.Timestamp('2020-01-01'))
+        self.assertEqual(poller.polls, 1)
+
+        # the old positional tries is ignored rather than taken for cache_inc
+        with self.assertWarns(DeprecationWarning):
+            pd.testing.assert_frame_equal(lim.query('Show \r\nFB: FB FP: FP when date is after 2019', None, 10), res)
+
+    def test_query_errors(self):
+        self.assertIsNone(lim.query('Show \r\nFB: FB when date is after 2030'))
+        with self.assertRaises(Exception):
+            lim.query('Show \r\nXX: BADSYMBOL')
+
+    def test_query_many(self):
+        res = lim.query_many(['Show \r\nFB: FB', 'Show \r\nFP: FP', 'Show \r\nXX: BADSYMBOL'], max_workers=2)
+        self.assertIn('FB', res[0].columns)
+        self.assertIn('FP', res[1].columns)
+        self.assertIsInstance(res[2], Exception)
+
+    def test_profiles_cache(self):
+        other = MockLimServer().start()
+        limsession.set_session(limsession.LimSession(other.url, 'user', 'password'), 'other')
+        limcache.enable_result_cache()
+        q = 'Show \r\nFB: FB when date is after 2019'
+        try:
+            with tempfile.TemporaryDirectory() as root:
+                backend = limcache.SQLiteCache(root)
+                lim.query(q)
+                lim.query_cached(q, backend=backend)
+                previous = limsession.use_profile('other')
+                try:
+                    lim.query(q)
+                    self.assertEqual(len(other.queries), 1)
+                    lim.query_cached(q, backend=backend)
+                finally:
+                    limsession.use_profile(previous)
+                for url in (self.server.url, other.url):
+                    self.assertIsNotNone(backend.last_date(lim.query_hash(q, url)))
+        finally:
+            limcache.disable_result_cache()
+            limsession.set_session(None, 'other')
+            other.stop()
+
+    def test_series(self):
+        symbols = ['FB_2020J', 'FP_2020J', 'FB_2020Z', 'FP_2020Z', 'AAGXJ00']
+        res = lim.series(symbols, batch_size=2)
+        self.assertEqual(list(res.columns), symbols)
+        pd.testing.assert_frame_equal(res, lim.series(symbols))
+
+    def test_series_sharded(self):
+        symbols = ['FB', 'FP', 'AAGXJ00']
+        expected = lim.series(symbols, start='2016-03-01', end='2019-06-30')
+        self.assertEqual((expected.index[0], expected.index[-1]), (pd.Timestamp('2016-03-01'), pd.Timestamp('2019-06-28')))
+        self.server.failures['before 01/01/2018'] = 2
+        res = lim.series(symbols, batch_size=2, start='2016-03-01', end='2019-06-30', shard_years=1)
+        pd.testing.assert_frame_equal(res, expected, check_freq=False)
+        self.assertEqual(self.server.failures['before 01/01/2018'], 0)
+
+        self.server.failures['before 01/01/2018'] = 10
+        with self.assertRaises(lim.LimBatchError):
+            lim.series(symbols, start='2016-03-01', shard_years=1)
+        self.server.failures.clear()
+
+        res = lim.continuous_futures_rollover('FB', after_date=2016, shard_years=2)
+        pd.testing.assert_frame_equal(res, lim.continuous_futures_rollover('FB', after_date=2016), check_freq=False)
+
+    def test_series_compact(self):
+        symbols = ['FB_2020J', 'FP_2020J', 'FB_2020Z', 'FP_2020Z']
+        res = lim.series(symbols, batch_size=2, format='compact')
+        self.assertIsInstance(res, limframe.CompactFrame)
+        pd.testing.assert_frame_equal(res.to_wide(), lim.series(symbols), check_index_type=False, check_freq=False)
+
+    def test_coalescing(self):
+        calls = [
+            lambda: lim.series(['FB', 'FP']),
+            lambda: lim.series(['FP', 'AAGXJ00']),
+            lambda: lim.series('BADSYMBOL'),
+            lambda: lim.continuous_futures_rollover('FB', months=['M1', 'M2'], after_date=2019),
+            lambda: lim.continuous_futures_rollover('FP', months=['M1'], after_date=2019),
+            lambda: lim.curve(['FB', 'FP']),
+            lambda: lim.curve('FB'),
+        ]
+        expected = [run_or_error(x) for x in calls]
+        coalescer = limplanner.enable(window=0.2)
+        try:
+            with ThreadPoolExecutor(len(calls)) as pool:
+                results = list(pool.map(run_or_error, calls))
+        finally:
+            limplanner.disable()
+        for res, exp in zip(results[:2] + results[3:], expected[:2] + expected[3:]):
+            pd.testing.assert_frame_equal(res, exp)
+        self.assertIsInstance(results[2], Exception)
+        stats = coalescer.stats()
+        self.assertEqual(stats['requests'], len(calls))
+        self.assertEqual(stats['merged'], 4)
+        self.assertEqual(stats['fallbacks'], 1)
+        # one per WHEN clause, plus the three series retried one by one after BADSYMBOL failed their merge
+        self.assertEqual(stats['datarequests'], 1 + 3 + 1 + 1)
+
+    def test_merge(self):
+        rollover = [lim.build_continuous_futures_rollover_query(x, months=['M1'], after_date=2019) for x in ('FB', 'FB', 'FP')]
+        text, mappings = limplanner.merge([limplanner.parse_query(x) for x in rollover])
+        self.assertEqual(text.count('ROLLOVER_DATE'), 2)
+        self.assertEqual([dict(x) for x in mappings], [{'M1': 'QPS1'}, {'M1': 'QPS1'}, {'M1': 'QPS2'}])
+        self.assertIsNone(limplanner.parse_query('Show \r\nFB: FB FP: FP when date is after 2019'))
+
+        # LET names that are also symbols are sent as they are
+        extended = '''
+        LET
+        FP = FP(ROLLOVER_DATE = "5 days before expiration day",ROLLOVER_POLICY = "actual prices")
+        FP_M2 = FP(ROLLOVER_DATE = "5 days before expiration day",ROLLOVER_POLICY = "2 nearby actual prices")
+
+        SHOW
+        FP: FP
+        FP_02: FP_M2
+        '''
+        self.assertIsNone(limplanner.parse_query(extended))
+        spread = limplanner.parse_query('LET\nA = FB(ROLLOVER_POLICY = "actual prices")\nB = A - FP\nSHOW\nS: B\n')
+        text, _ = limplanner.merge([spread])
+        self.assertIn('QPL2 = QPL1 - FP', text)
+
+    def test_curve(self):
+        res = lim.curve({'FB': 'Brent'})
+        self.assertEqual(list(res.columns), ['Brent'])
+        self.assertEqual(len(res), self.server.curve_months)
+
+    def test_curve_cached(self):
+        dates = list(pd.bdate_range('2020-03-02', periods=5))
+        with tempfile.TemporaryDirectory() as root:
+            store = limcache.CurveStore(root)
+            queries = len(self.server.queries)
+            res = lim.curve_cached('FB', curve_dates=dates, store=store, batch_size=2)
+            self.assertEqual(len(self.server.queries) - queries, 3)
+            pd.testing.assert_frame_equal(res, lim.curve('FB', curve_dates=dates), check_index_type=False)
+
+            queries = len(self.server.queries)
+            more = dates + [pd.Timestamp('2020-03-09')]
+            res = lim.curve_cached('FB', curve_dates=more, store=store)
+            self.assertEqual(len(self.server.queries) - queries, 1)
+            self.assertEqual(list(res.columns), [x.strftime('%Y/%m/%d') for x in more])
+
+            res = lim.curve_cached({'FB': 'Brent', 'FP': 'GO'}, curve_dates=dates[0], store=store)
+            self.assertEqual(list(res.columns), ['Brent', 'GO'])
+            self.assertEqual(len(self.server.queries) - queries, 2)
+
+    def test_curve_cached_missing(self):
+        dates = list(pd.bdate_range('2020-04-01', periods=3))
+        late = dates[1].strftime('%Y/%m/%d')
+        query_many = lim.query_many
+
+        def without_late(*args, **kwargs):
+            return [x.drop(columns=late) for x in query_many(*args, **kwargs)]
+
+        with tempfile.TemporaryDirectory() as root:
+            store = limcache.CurveStore(root)
+            with mock.patch.object(lim, 'query_many', side_effect=without_late):
+                res = lim.curve_cached('FB', curve_dates=dates, store=store)
+            self.assertNotIn(late, res.columns)
+            self.assertEqual(store.missing(self.server.url, 'FB', 'Close', dates), [dates[1]])
+
+            queries = len(self.server.queries)
+            res = lim.curve_cached('FB', curve_dates=dates, store=store)
+            self.assertEqual(len(self.server.queries) - queries, 1)
+            self.assertIn(late, res.columns)
+
+    def test_contracts(self):
+        res = lim.get_symbol_contract_list('FB', monthly_contracts_only=True)
+        self.assertIn('FB_2020Z', res)
+        self.assertIn('FB_2015F', res)
+        self.assertNotIn('FB_2022_Q1', res)
+        self.assertIn('FB_2022_Q1', lim.get_symbol_contract_list('FB'))
+
+        meta = lim.contract_metadata('FB').set_index('name')
+        self.assertEqual(meta.loc['FB_2020Z', 'year'], 2020)
+        self.assertEqual(meta.loc['FB_2020Z', 'month'], 'Z')
+        self.assertEqual(meta.loc['FB_2020Z', 'end_date'], pd.Timestamp('2020-11-21'))
+
+    def test_prefetch_contracts(self):
+        lim.invalidate_contracts()
+        requests = len(self.server.requests)
+        res = lim.prefetch_contracts(['FB', 'FP', 'NOTAROOT'], max_workers=3)
+        self.assertEqual(res[:2], [97, 97])
+        self.assertIsInstance(res[2], Exception)
+        self.assertEqual(len(self.server.requests) - requests, 3)
+
+        lim.get_symbol_contract_list('FP')
+        lim.prefetch_contracts(['FB', 'FP'])
+        self.assertEqual(len(self.server.requests) - requests, 3)
+
+        res = lim.futures_contracts('FB', 2020, 2020)
+        self.assertEqual(list(res.columns), ['FB_2020{}'.format(x) for x in 'FGHJKMNQUVXZ'])
+        # every call gets its own frame, from the server unless the result cache is on
+        res.iloc[:] = -1
+        queries = len(self.server.queries)
+        self.assertFalse((lim.futures_contracts('FB', 2020, 2020) == -1).any().any())
+        self.assertEqual(len(self.server.queries), queries + 1)
+
+    def test_query_cached(self):
+        q = 'Show \r\nFB: FB'
+        with tempfile.TemporaryDirectory() as root:
+            backend = limcache.SQLiteCache(root)
+            first = lim.query_cached(q, backend=backend)
+            second = lim.query_cached(q, backend=backend)
+            pd.testing.assert_frame_equal(first, second)
+            self.assertIn('date is after', self.server.queries[-1])
+
+    def test_upload(self):
+        idx = pd.bdate_range('2019-01-01', periods=30)
+        df = pd.DataFrame(np.round(np.random.rand(30, 2), 4), index=idx, columns=['TopRelation:Test:UP1', 'TopRelation:Test:UP2'])
+        reports = limuploader.upload_series(df, {'description': 'desc'}, max_cells=20)
+        self.assertEqual(len(reports), 3)
+        self.assertTrue(all(x.code in limuploader.done_codes for x in reports))
+
+        frames = (df.iloc[i:i + 7].rename(columns=lambda x: x + '0') for i in range(0, 30, 7))
+        reports = limuploader.upload_stream(frames, {}, max_cells=40)
+        self.assertEqual(sum(x.cells for x in reports), 60)
+
+        res = lim.series(['UP1', 'UP2', 'UP10', 'UP20'])
+        np.testing.assert_allclose(res.loc[idx, ['UP1', 'UP2']].values, df.values)
+        np.testing.assert_allclose(res.loc[idx, ['UP10', 'UP20']].values, df.values)
+
+    def test_upload_status_errors(self):
+        idx = pd.bdate_range('2019-01-01', periods=10)
+        df = pd.DataFrame(np.ones((10, 2)), index=idx, columns=['TopRelation:Test:UP3', 'TopRelation:Test:UP4'])
+        # a 503 on one status poll is polled again, the other jobs carry on
+        self.server.failures['/rs/upload/jobreport'] = 1
+        reports = limuploader.upload_series(df, {}, max_cells=8)
+        self.assertEqual(len(reports), 3)
+        self.assertTrue(all(x.code in limuploader.done_codes and x.error is None for x in reports))
+        self.assertEqual(self.server.failures['/rs/upload/jobreport'], 0)
+
+        # upload_chunk polls the same way: a 503 is polled again, a 400 ends the upload
+        self.server.failures['/rs/upload/jobreport'] = 1
+        self.assertIsNotNone(limuploader.upload_chunk(df.iloc[:5], {}))
+        self.assertEqual(self.server.failures['/rs/upload/jobreport'], 0)
+        with mock.patch.object(limuploader, 'check_upload_status', side_effect=limadmit.LimHTTPError(400, 'bad jobid')):
+            with self.assertRaises(limadmit.LimHTTPError):
+                limuploader.upload_chunk(df.iloc[5:], {})
+
+        # a report without a status counts as pending until the deadline, for its own job only
+        bodies = [(limuploader.build_upload_xml(df.iloc[i:i + 5], {}), 5, 10) for i in (0, 5)]
+        statuses = {'1': None, '2': ('200', 'done')}
+        with mock.patch.object(limuploader, 'submit_chunk', side_effect=[('1', '202'), ('2', '202')]), \
+                mock.patch.object(limuploader, 'check_upload_status', side_effect=lambda jobid: statuses[jobid]):
+            reports = limuploader.upload_pipeline(bodies, deadline=0.5, errors='ignore')
+        self.assertIsInstance(reports[0].error, limpoll.PollTimeout)
+        self.assertEqual((reports[1].code, reports[1].error), ('200', None))
+
+
+def run_or_error(call):
+    try:
+        return call()
+    except Exception as e:
+        return e
+
+
+if __name__ == '__main__':
+    unittest.main()